@@ -0,0 +1,87 @@
+"""GetTask latency during a ListTasks overload, with and without admission control.
+
+Starts a server (python -m taskmanager.server) holding --tasks tasks, then
+drives it in open loop with taskmanager.loadgen at a rate whose ListTasks
+share alone is more than the server can serve. Without admission control
+every call queues behind the list calls and GetTask latency climbs with
+them; with it the excess ListTasks calls are rejected with
+RESOURCE_EXHAUSTED and GetTask stays fast. Prints per-method latency and
+status codes for each server configuration.
+
+Usage: python benchmarks/admission.py [--tasks 5000] [--rps 200]
+       [--list-share 0.2] [--duration 10]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+import grpc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIGURATIONS = (
+    ('off', ('--max-concurrency', '0')),
+    ('fixed', ('--fixed-limits',)),
+    ('adaptive', ()),
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(store_path, flags):
+    target = f'127.0.0.1:{free_port()}'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'taskmanager.server', '--address', target, '--store', store_path,
+         '--metrics-address', '', '--response-cache-mb', '0', *flags],
+        cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+    )
+    with grpc.insecure_channel(target) as channel:
+        grpc.channel_ready_future(channel).result(timeout=30)
+    return process, target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--rps', type=float, default=200)
+    parser.add_argument('--list-share', type=float, default=0.2, help='fraction of calls that are ListTasks')
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    mix = f'GetTask={1 - args.list_share},ListTasks={args.list_share}'
+    print(f'{args.rps:g} calls/s, {args.list_share:.0%} ListTasks of {args.tasks} tasks')
+    print(f'{"admission":>10} {"method":>10} {"p50 ms":>9} {"p99 ms":>9} {"status codes"}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_path = os.path.join(tmp_dir, 'tasks.json')
+        for name, flags in CONFIGURATIONS:
+            process, target = start_server(store_path, flags)
+            try:
+                # loadgen adds the tasks the first time; the store is kept for the others
+                output = subprocess.run(
+                    [sys.executable, '-m', 'taskmanager.loadgen', '--target', target, '--mix', mix,
+                     '--tasks', str(args.tasks), '--rps', str(args.rps), '--duration', str(args.duration),
+                     '--warmup', '2', '--seed', '1'],
+                    cwd=REPO_ROOT, check=True, capture_output=True, text=True
+                ).stdout
+            finally:
+                process.terminate()
+                process.wait()
+            report = json.loads(output)
+            for method in ('GetTask', 'ListTasks'):
+                stats = report['methods'].get(method)
+                if stats is None:
+                    continue
+                latency = stats['latency_ms']
+                codes = ', '.join(f'{code} {count}' for code, count in sorted(stats['status_codes'].items()))
+                print(f'{name:>10} {method:>10} {latency["p50"]:>9.1f} {latency["p99"]:>9.1f} {codes}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Tasks/sec for a loop of AddTask calls versus batched adds.
+
+Usage: python benchmarks/batch_add.py [--tasks 5000] [--batch-size 500]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from common import ServerThread
+
+import grpc
+
+from taskmanager.batching import TaskBatcher, import_tasks
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+
+def make_tasks(count, label):
+    return (taskmanager_pb2.Task(title=f'{label} {i}', description='Benchmark task', status='Not Started')
+            for i in range(count))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='batch-bench-')
+    try:
+        with ServerThread(os.path.join(tmp_dir, 'tasks.json')) as server:
+            with grpc.insecure_channel(server.target) as channel:
+                stub = taskmanager_pb2_grpc.TaskManagerStub(channel)
+
+                def add_loop():
+                    for task in make_tasks(args.tasks, 'loop'):
+                        stub.AddTask(task)
+
+                def batched():
+                    with TaskBatcher(stub, batch_size=args.batch_size) as batcher:
+                        for task in make_tasks(args.tasks, 'batch'):
+                            batcher.add(task)
+
+                def streamed():
+                    import_tasks(stub, make_tasks(args.tasks, 'import'), batch_size=args.batch_size)
+
+                print(f'{"method":>16} {"tasks/s":>10}')
+                for name, fn in (('AddTask loop', add_loop), ('BatchAddTasks', batched), ('ImportTasks', streamed)):
+                    elapsed = timed(fn)
+                    print(f'{name:>16} {args.tasks / elapsed:>10.0f}')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Throughput and peak memory of python -m taskmanager.bulk.
+
+For each size, writes a JSONL file of that many tasks, imports it into a
+fresh server (python -m taskmanager.server) and exports the store again,
+running the bulk tool as a subprocess each time. Prints tasks per second,
+the tool's CPU time and its peak RSS; the RSS should stay about the same
+however big the file is, since both directions stream. The server is
+usually the bottleneck, so its CPU time is printed too.
+
+Usage: python benchmarks/bulk.py [--sizes 100000,400000]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import grpc
+
+from compression import STATUSES, WORDS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_tasks(path, count, rng):
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(count):
+            f.write(json.dumps({
+                'title': ' '.join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize(),
+                'description': ' '.join(rng.choices(WORDS, k=rng.randint(10, 40))),
+                'status': rng.choice(STATUSES),
+                'createdAt': '2024-01-02T03:04:05.678Z',
+            }) + '\n')
+
+
+def run_tool(*args):
+    """(seconds, CPU seconds, peak RSS in MB) of one bulk tool run."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'taskmanager.bulk', *args], cwd=REPO_ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f'taskmanager.bulk {args[0]} exited with {process.returncode}')
+    return elapsed, usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024
+
+
+def server_cpu(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rpartition(')')[2].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100000,400000', help='comma-separated task counts')
+    args = parser.parse_args()
+
+    print(f'{"tasks":>8} {"command":>7} {"seconds":>8} {"tasks/s":>8} {"tool CPU s":>11} {"tool MB":>8} '
+          f'{"server CPU s":>13}')
+    for size in (int(size) for size in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, 'tasks.jsonl')
+            write_tasks(source, size, random.Random(size))
+            target = f'127.0.0.1:{free_port()}'
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'taskmanager.server', '--address', target,
+                 '--store', os.path.join(tmp_dir, 'store.json'), '--metrics-address', ''],
+                cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+            )
+            try:
+                with grpc.insecure_channel(target) as channel:
+                    grpc.channel_ready_future(channel).result(timeout=30)
+                for command, path in (('import', source), ('export', os.path.join(tmp_dir, 'export.jsonl'))):
+                    before = server_cpu(server.pid) if os.path.exists('/proc') else 0.0
+                    seconds, cpu, rss = run_tool(command, path, '--target', target)
+                    used = server_cpu(server.pid) - before if os.path.exists('/proc') else float('nan')
+                    print(f'{size:>8} {command:>7} {seconds:>8.1f} {size / seconds:>8.0f} {cpu:>11.1f} '
+                          f'{rss:>8.0f} {used:>13.1f}')
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Startup cost of the Tk client (main.py).
+
+Imports: runs python -X importtime in fresh processes and reports the
+import time spent before the first frame (importing main) and after it
+(the modules main.py imports once the window is up), with the slowest
+top-level imports of each.
+
+Wall clock (needs a display): starts a server with --tasks tasks, then
+launches main.py against it several times with a cold and a warm task
+cache, and reports the median time from launch to the first painted frame,
+to the cached tasks being shown and to the listing from the server being
+complete.
+
+Usage: python benchmarks/client_startup.py [--runs 5] [--tasks 5000]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ServerThread
+
+import grpc
+
+from taskmanager.batching import import_tasks
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MILESTONES = ('first-frame', 'cached', 'listed')
+DEFERRED = 'import main; main.import_cache_modules(); main.import_rpc_modules()'
+
+
+def import_times(code):
+    """(total seconds, {top-level module: cumulative seconds}) for running code."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPO_ROOT,
+                            check=True, capture_output=True, text=True).stderr
+    total = 0
+    top = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        # Nested imports are indented under the module that caused them
+        if not name[1:].startswith(' '):
+            top[name.strip()] = int(cumulative_us) / 1e6
+    return total / 1e6, top
+
+
+def median_import_times(code, runs):
+    results = [import_times(code) for _ in range(runs)]
+    top = {name: statistics.median(result[1].get(name, 0) for result in results) for name in results[-1][1]}
+    return statistics.median(result[0] for result in results), top
+
+
+def report_imports(runs):
+    # One untimed run so every .pyc is written and cached by the OS
+    import_times(DEFERRED)
+    before, before_top = median_import_times('import main', runs)
+    total, total_top = median_import_times(DEFERRED, runs)
+    after_top = {name: seconds for name, seconds in total_top.items() if name not in before_top}
+    for label, seconds, top in (('before the first frame', before, before_top),
+                                ('after the first frame', total - before, after_top)):
+        slowest = sorted(top.items(), key=lambda item: -item[1])[:5]
+        print(f'Imports {label}: {seconds * 1000:.0f} ms; slowest: '
+              + ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in slowest))
+
+
+def launch(target, cache_path):
+    """Seconds from launching main.py to each milestone it reports."""
+    env = dict(os.environ, TASKMANAGER_TARGET=target, TASKMANAGER_CACHE=cache_path,
+               TASKMANAGER_STARTUP_PROBE=MILESTONES[-1])
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'main.py')], env=env,
+                               stdout=subprocess.PIPE, text=True)
+    reached = {}
+    for line in process.stdout:
+        reached[line.strip()] = time.perf_counter() - start
+    process.wait()
+    return reached
+
+
+def report_wall_clock(runs, tasks):
+    with tempfile.TemporaryDirectory() as tmp_dir, ServerThread(os.path.join(tmp_dir, 'tasks.json')) as server:
+        with grpc.insecure_channel(server.target) as channel:
+            import_tasks(taskmanager_pb2_grpc.TaskManagerStub(channel),
+                         (taskmanager_pb2.Task(title=f'Task {i}', description='x' * 100, status='Not Started')
+                          for i in range(tasks)))
+        cache_path = os.path.join(tmp_dir, 'tasks.cache')
+        print(f'{"cache":>6} ' + ' '.join(f'{name + " ms":>15}' for name in MILESTONES))
+        for label in ('cold', 'warm'):
+            results = []
+            for _ in range(runs):
+                if label == 'cold' and os.path.exists(cache_path):
+                    os.remove(cache_path)
+                results.append(launch(server.target, cache_path))
+            print(f'{label:>6} ' + ' '.join(
+                f'{statistics.median(result.get(name, float("nan")) for result in results) * 1000:>15.0f}'
+                for name in MILESTONES
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--tasks', type=int, default=5000)
+    args = parser.parse_args()
+
+    report_imports(args.runs)
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        print('No display; skipping the wall-clock measurements')
+        return
+    report_wall_clock(args.runs, args.tasks)
+
+
+if __name__ == '__main__':
+    main()
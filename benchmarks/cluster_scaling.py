@@ -0,0 +1,92 @@
+"""Read throughput of the multi-process server by number of workers.
+
+For each worker count, starts python -m taskmanager.cluster on a free
+port, preloads it, then runs several load generator processes against it
+at once (one process cannot saturate more than a core either) and sums
+their throughput. Scaling is bounded by the cores available to both the
+workers and the load generators.
+
+Usage: python benchmarks/cluster_scaling.py [--workers 1,2,4] [--clients 4] [--tasks 5000]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import common  # noqa: F401 (puts the repo on sys.path)
+
+import grpc
+
+from taskmanager.batching import import_tasks
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure(workers, clients, tasks, mix, duration, concurrency):
+    target = f'127.0.0.1:{free_port()}'
+    with tempfile.TemporaryDirectory() as tmp:
+        cluster = subprocess.Popen(
+            [sys.executable, '-m', 'taskmanager.cluster', '--workers', str(workers), '--address', target,
+             '--store', os.path.join(tmp, 'tasks.json'), '--metrics-address', ''],
+            cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        )
+        try:
+            with grpc.insecure_channel(target) as channel:
+                grpc.channel_ready_future(channel).result(timeout=30)
+                stub = taskmanager_pb2_grpc.TaskManagerStub(channel)
+                import_tasks(stub, (taskmanager_pb2.Task(title=f'Task {i}', description='x' * 100, status='To Do')
+                                    for i in range(tasks)))
+            # Let the replicas catch up with the preload before measuring
+            time.sleep(1)
+            generators = [
+                subprocess.Popen(
+                    [sys.executable, '-m', 'taskmanager.loadgen', '--target', target, '--mix', mix,
+                     '--tasks', '0', '--concurrency', str(concurrency), '--duration', str(duration),
+                     '--warmup', '2', '--seed', str(i)],
+                    cwd=REPO_ROOT, stdout=subprocess.PIPE
+                )
+                for i in range(clients)
+            ]
+            reports = [json.loads(generator.communicate()[0]) for generator in generators]
+        finally:
+            cluster.terminate()
+            cluster.wait()
+    throughput = sum(report['throughput_rps'] for report in reports)
+    p99 = max(report['latency_ms']['p99'] for report in reports)
+    errors = sum(report['errors'] for report in reports)
+    return throughput, p99, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--clients', type=int, default=4, help='load generator processes')
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--mix', default='GetTask=90,ListTasks=10')
+    parser.add_argument('--concurrency', type=int, default=16, help='requests in flight per load generator')
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPU(s), {args.clients} load generator(s), {args.tasks} tasks, mix {args.mix}')
+    print(f'{"workers":>8} {"req/s":>10} {"p99 ms":>10} {"errors":>8}')
+    for workers in [int(value) for value in args.workers.split(',')]:
+        throughput, p99, errors = measure(workers, args.clients, args.tasks, args.mix,
+                                          args.duration, args.concurrency)
+        print(f'{workers:>8} {throughput:>10.0f} {p99:>10.1f} {errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Shared helpers for the benchmark scripts."""
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskmanager.response_cache import ResponseCache
+from taskmanager.server import create_server
+from taskmanager.store import TaskStore
+
+
+class ServerThread:
+    """Runs a TaskManager server on an ephemeral port in a background thread."""
+
+    def __init__(self, store_path, interceptors=(), cache_bytes=0, **store_options):
+        self.store_path = store_path
+        self.interceptors = interceptors
+        self.cache_bytes = cache_bytes
+        self.store_options = store_options
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _start(self):
+        self.store = TaskStore(self.store_path, **self.store_options)
+        self.store.load()
+        self.cache = ResponseCache(self.store.changes, self.cache_bytes) if self.cache_bytes else None
+        self.server, self.port = await create_server(self.store, 'localhost:0', self.interceptors, self.cache)
+        await self.server.start()
+
+    async def _stop(self):
+        await self.server.stop(None)
+        await self.store.close()
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    @property
+    def target(self):
+        return f'localhost:{self.port}'
@@ -0,0 +1,169 @@
+"""Bytes and latency of ListTasks with and without compression.
+
+For each TaskList size, loads a server with that many tasks and calls
+ListTasks through a local proxy that throttles the link (bandwidth and a
+one-way delay, like a modest WAN connection) and counts the bytes it
+carries, with the client asking for no compression, gzip and deflate.
+Prints the bytes per call on the wire and the median latency over the
+throttled link and over a direct loopback connection, where compression
+only costs CPU. A GetTask row shows that small messages skip compression.
+
+Usage: python benchmarks/compression.py [--sizes 10,100,1000,10000]
+       [--mbps 20] [--delay-ms 10] [--calls 20] [--min-bytes 1024]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from common import ServerThread
+
+import grpc
+
+from taskmanager.batching import import_tasks
+from taskmanager.client import Client
+from taskmanager.compression import ALGORITHMS, CompressionInterceptor
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+WORDS = ('review', 'draft', 'release', 'notes', 'fix', 'login', 'page', 'update', 'report', 'weekly', 'sync',
+         'with', 'team', 'about', 'the', 'budget', 'plan', 'for', 'next', 'quarter', 'deploy', 'server',
+         'database', 'migration', 'customer', 'feedback', 'design', 'mockups', 'write', 'tests')
+STATUSES = ('Not Started', 'In Progress', 'Completed')
+
+
+def sample_tasks(count, rng):
+    for _ in range(count):
+        yield taskmanager_pb2.Task(
+            title=' '.join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize(),
+            description=' '.join(rng.choices(WORDS, k=rng.randint(10, 40))),
+            status=rng.choice(STATUSES),
+        )
+
+
+class ThrottledLink:
+    """A TCP proxy to target that limits bandwidth and delays every chunk.
+
+    Runs its own event loop in a background thread. bytes_down counts what
+    the server sent back.
+    """
+
+    def __init__(self, target, bytes_per_second, delay):
+        self.host, _, port = target.rpartition(':')
+        self.target_port = int(port)
+        self.bytes_per_second = bytes_per_second
+        self.delay = delay
+        self.bytes_down = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._connect, '127.0.0.1', 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _connect(self, client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(self.host, self.target_port)
+        await asyncio.gather(self._pipe(client_reader, server_writer, False),
+                             self._pipe(server_reader, client_writer, True),
+                             return_exceptions=True)
+
+    async def _pipe(self, reader, writer, down):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                if data is None:
+                    break
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                writer.write(data)
+                await writer.drain()
+
+        delivering = asyncio.create_task(deliver())
+        # When the link is next free to send
+        free = 0.0
+        try:
+            while data := await reader.read(65536):
+                if down:
+                    self.bytes_down += len(data)
+                free = max(free, loop.time()) + len(data) / self.bytes_per_second
+                queue.put_nowait((free + self.delay, data))
+        finally:
+            queue.put_nowait((0.0, None))
+            await delivering
+            writer.close()
+
+    @property
+    def target(self):
+        return f'127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def measure(target, compression, call, calls, link=None):
+    """(median seconds, bytes sent back per call) for calls of call(client)."""
+    with Client(target, pool_size=1, hedge_delay=None, compression=compression) as client:
+        call(client)
+        before = link.bytes_down if link else 0
+        latencies = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            call(client)
+            latencies.append(time.perf_counter() - start)
+        per_call = (link.bytes_down - before) / calls if link else 0
+    return statistics.median(latencies), per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000', help='comma-separated task counts')
+    parser.add_argument('--mbps', type=float, default=20, help='throttled link bandwidth in megabits per second')
+    parser.add_argument('--delay-ms', type=float, default=10, help='one-way delay of the throttled link')
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--min-bytes', type=int, default=1024, help="the server's compression threshold")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    options = (None, *ALGORITHMS)
+    interceptor = CompressionInterceptor(tuple(ALGORITHMS), args.min_bytes)
+    print(f'Throttled link: {args.mbps:g} Mbit/s, {args.delay_ms:g} ms each way')
+    print(f'{"call":>14} {"compression":>11} {"bytes/call":>11} {"throttled ms":>13} {"loopback ms":>12}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            with ServerThread(os.path.join(tmp_dir, f'tasks-{size}.json'), interceptors=[interceptor]) as server, \
+                    ThrottledLink(server.target, args.mbps * 1e6 / 8, args.delay_ms / 1000) as link:
+                with grpc.insecure_channel(server.target) as channel:
+                    stub = taskmanager_pb2_grpc.TaskManagerStub(channel)
+                    import_tasks(stub, sample_tasks(size, random.Random(size)))
+                    task_id = stub.ListTasks(taskmanager_pb2.Empty()).tasks[0].id
+                calls = [(f'ListTasks {size}', lambda client: client.ListTasks(taskmanager_pb2.Empty()))]
+                if size == sizes[0]:
+                    calls.append(('GetTask', lambda client: client.GetTask(taskmanager_pb2.TaskRequest(taskId=task_id))))
+                for label, call in calls:
+                    for compression in options:
+                        throttled, per_call = measure(link.target, compression, call, args.calls, link)
+                        loopback, _ = measure(server.target, compression, call, args.calls)
+                        print(f'{label:>14} {compression or "none":>11} {per_call:>11.0f} '
+                              f'{throttled * 1000:>13.1f} {loopback * 1000:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
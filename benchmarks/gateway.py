@@ -0,0 +1,173 @@
+"""The Python HTTP/JSON gateway against the Express proxy in client.js.
+
+Starts a server (python -m taskmanager.server) holding --tasks tasks, then
+the gateway (python -m taskmanager.gateway) and, if node is installed, the
+Express proxy (node client.js) in front of it. Each is driven by
+--connections keep-alive HTTP connections sending requests back to back
+for --duration seconds, like browsers that accept gzip:
+
+- list: GET /api/tasks, as on a first page load;
+- poll: GET /api/tasks with the If-None-Match of the last response, as a
+  polling browser revalidating an unchanged list;
+- get:  GET /api/tasks/<id>.
+
+Prints requests per second, latency and the body bytes per response.
+
+Usage: python benchmarks/gateway.py [--tasks 2000] [--connections 8] [--duration 5]
+"""
+import argparse
+import asyncio
+import collections
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import grpc
+
+from compression import sample_tasks
+
+from taskmanager.batching import import_tasks
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ('list', 'poll', 'get')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_http(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{process.args[0]} exited with {process.returncode}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/tasks/-', timeout=1)
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'nothing answering on port {port}')
+
+
+async def request(reader, writer, path, headers):
+    """(status, response headers, body) of one GET on a keep-alive connection."""
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept-Encoding: gzip\r\n{headers}\r\n'.encode('latin-1'))
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while (line := await reader.readline()).strip():
+        name, _, value = line.decode('latin-1').partition(':')
+        response_headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(response_headers.get('content-length', 0)))
+    return status, response_headers, body
+
+
+async def drive(port, scenario, task_ids, connections, duration):
+    latencies = []
+    received = []
+    statuses = collections.Counter()
+    stop = time.perf_counter() + duration
+
+    async def connection(seed):
+        rng = random.Random(seed)
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        etag = None
+        try:
+            while time.perf_counter() < stop:
+                path, headers = '/api/tasks', ''
+                if scenario == 'get':
+                    path = f'/api/tasks/{rng.choice(task_ids)}'
+                elif scenario == 'poll' and etag:
+                    headers = f'If-None-Match: {etag}\r\n'
+                start = time.perf_counter()
+                status, response_headers, body = await request(reader, writer, path, headers)
+                latencies.append(time.perf_counter() - start)
+                received.append(len(body))
+                statuses[status] += 1
+                etag = response_headers.get('etag', etag)
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(connection(seed) for seed in range(connections)))
+    return latencies, received, statuses
+
+
+def start(command, port, env=None):
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        wait_for_http(port, process)
+    except BaseException:
+        process.terminate()
+        raise
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        target = f'127.0.0.1:{free_port()}'
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'taskmanager.server', '--address', target, '--store',
+             os.path.join(tmp_dir, 'tasks.json'), '--metrics-address', ''],
+            cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        )
+        processes = [server]
+        try:
+            with grpc.insecure_channel(target) as channel:
+                grpc.channel_ready_future(channel).result(timeout=30)
+                stub = taskmanager_pb2_grpc.TaskManagerStub(channel)
+                import_tasks(stub, sample_tasks(args.tasks, random.Random(1)))
+                task_ids = [task.id for task in stub.ListTasks(taskmanager_pb2.Empty()).tasks]
+
+            gateways = []
+            port = free_port()
+            processes.append(start([sys.executable, '-m', 'taskmanager.gateway', '--address', f'127.0.0.1:{port}',
+                                    '--target', target], port))
+            gateways.append(('python', port))
+            if shutil.which('node') and os.path.isdir(os.path.join(REPO_ROOT, 'node_modules', 'express')):
+                port = free_port()
+                env = dict(os.environ, PORT=str(port), TASKMANAGER_TARGET=target)
+                processes.append(start(['node', 'client.js'], port, env))
+                gateways.append(('express', port))
+            else:
+                print('node or node_modules missing; skipping the Express proxy')
+
+            print(f'{args.tasks} tasks, {args.connections} connections, {args.duration:g} s per run')
+            print(f'{"scenario":>8} {"gateway":>8} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"bytes/resp":>11} '
+                  f'status codes')
+            for scenario in SCENARIOS:
+                for name, port in gateways:
+                    latencies, received, statuses = asyncio.run(
+                        drive(port, scenario, task_ids, args.connections, args.duration))
+                    latencies.sort()
+                    codes = ', '.join(f'{status} {count}' for status, count in sorted(statuses.items()))
+                    print(f'{scenario:>8} {name:>8} {len(latencies) / args.duration:>8.0f} '
+                          f'{statistics.median(latencies) * 1000:>8.2f} '
+                          f'{latencies[len(latencies) * 99 // 100] * 1000:>8.2f} '
+                          f'{statistics.mean(received):>11.0f} {codes}')
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""GetTask tail latency with and without hedging.
+
+Runs a server that stalls a small fraction of GetTask calls (as a GC
+pause, a slow disk or a busy neighbour would), then drives GetTask-only
+load with taskmanager.loadgen processes with hedging off, with a fixed
+delay and with the automatic p95 delay, and prints latency percentiles
+and how many extra requests hedging cost.
+
+Usage: python benchmarks/hedging.py [--duration 10] [--concurrency 8]
+       [--slow-fraction 0.02] [--slow-ms 100]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from common import ServerThread
+
+import grpc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StallInterceptor(grpc.aio.ServerInterceptor):
+    """Delays a random fraction of GetTask calls by delay seconds."""
+
+    def __init__(self, fraction, delay):
+        self.fraction = fraction
+        self.delay = delay
+        self.rng = random.Random(1)
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or not handler_call_details.method.endswith('/GetTask'):
+            return handler
+        behavior = handler.unary_unary
+
+        async def stalled(request, context):
+            if self.rng.random() < self.fraction:
+                await asyncio.sleep(self.delay)
+            return await behavior(request, context)
+
+        return handler._replace(unary_unary=stalled)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--slow-fraction', type=float, default=0.02)
+    parser.add_argument('--slow-ms', type=float, default=100)
+    args = parser.parse_args()
+
+    interceptor = StallInterceptor(args.slow_fraction, args.slow_ms / 1000)
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            ServerThread(os.path.join(tmp_dir, 'tasks.json'), interceptors=[interceptor]) as server:
+        print(f'{args.slow_fraction:.0%} of GetTask calls stalled by {args.slow_ms:g} ms')
+        print(f'{"hedging":>10} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8} {"hedges":>8} {"won":>6}')
+        for name, hedge in (('off', ()), ('10 ms', ('--hedge-delay-ms', '10')), ('auto', ('--hedge-delay-ms', 'auto'))):
+            # The load generator runs in its own process: grpc.aio doesn't
+            # support a second event loop next to the server's
+            output = subprocess.run(
+                [sys.executable, '-m', 'taskmanager.loadgen', '--target', server.target, '--mix', 'GetTask=1',
+                 '--tasks', '1000', '--concurrency', str(args.concurrency), '--duration', str(args.duration),
+                 '--warmup', '1', '--seed', '1', '--channels', '2', *hedge],
+                cwd=REPO_ROOT, check=True, capture_output=True, text=True
+            ).stdout
+            report = json.loads(output)
+            latency = report['latency_ms']
+            hedging = report.get('hedging', {'sent': 0, 'won': 0})
+            print(f'{name:>10} {latency["p50"]:>8.2f} {latency["p95"]:>8.2f} {latency["p99"]:>8.2f} '
+                  f'{latency["max"]:>8.2f} {hedging["sent"] / report["requests"]:>8.1%} {hedging["won"]:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Cost of the metrics interceptors.
+
+Times a server method handler called directly with and without
+ServerMetricsInterceptor's wrapping (no network, so the difference is the
+interceptor's own cost), then GetTask round trips against a server with
+and without the server interceptor and through a channel with and without
+ClientMetricsInterceptor (and with a no-op client interceptor, since
+grpc.intercept_channel has a cost of its own).
+
+Usage: python benchmarks/metrics_overhead.py [--calls 200000] [--rpcs 5000]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from common import ServerThread
+
+import grpc
+
+from taskmanager.metrics import ClientMetricsInterceptor, ServerMetricsInterceptor
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+
+class NoopClientInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """Baseline for the cost of grpc.intercept_channel itself."""
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return continuation(client_call_details, request)
+
+
+class FakeContext:
+    def code(self):
+        return None
+
+
+async def handler_overhead(calls):
+    async def get_task(request, context):
+        return taskmanager_pb2.TaskResponse(message='Task found')
+
+    handler = grpc.unary_unary_rpc_method_handler(
+        get_task,
+        request_deserializer=taskmanager_pb2.TaskRequest.FromString,
+        response_serializer=taskmanager_pb2.TaskResponse.SerializeToString
+    )
+    interceptor = ServerMetricsInterceptor()
+    wrapped = interceptor._wrap(handler, interceptor.metrics.method('/taskmanager.TaskManager/GetTask'))
+    data = taskmanager_pb2.TaskRequest(taskId='0123456789abcdef').SerializeToString()
+    context = FakeContext()
+
+    async def run(h):
+        start = time.perf_counter()
+        for _ in range(calls):
+            response = await h.unary_unary(h.request_deserializer(data), context)
+            h.response_serializer(response)
+        return (time.perf_counter() - start) / calls * 1e9
+
+    await run(handler)  # Warm up
+    return await run(handler), await run(wrapped)
+
+
+def round_trips(target, rpcs, interceptor=None):
+    channel = grpc.insecure_channel(target)
+    if interceptor is not None:
+        channel = grpc.intercept_channel(channel, interceptor)
+    with channel:
+        stub = taskmanager_pb2_grpc.TaskManagerStub(channel)
+        task_id = stub.AddTask(taskmanager_pb2.Task(title='Benchmark task')).task.id
+        request = taskmanager_pb2.TaskRequest(taskId=task_id)
+        for _ in range(200):
+            stub.GetTask(request)
+        start = time.perf_counter()
+        for _ in range(rpcs):
+            stub.GetTask(request)
+        return (time.perf_counter() - start) / rpcs * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--rpcs', type=int, default=5000)
+    args = parser.parse_args()
+
+    plain, wrapped = asyncio.run(handler_overhead(args.calls))
+    print(f'handler only: {plain:.0f} ns plain, {wrapped:.0f} ns wrapped, +{wrapped - plain:.0f} ns per call')
+
+    tmp_dir = tempfile.mkdtemp(prefix='metrics-bench-')
+    try:
+        results = {}
+        for name, interceptors in (('plain', ()), ('server metrics', (ServerMetricsInterceptor(),))):
+            with ServerThread(os.path.join(tmp_dir, f'{len(results)}.json'), interceptors=interceptors) as server:
+                results[name] = round_trips(server.target, args.rpcs)
+                if not interceptors:
+                    results['no-op client'] = round_trips(server.target, args.rpcs, NoopClientInterceptor())
+                    results['client metrics'] = round_trips(server.target, args.rpcs, ClientMetricsInterceptor())
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    base = results['plain']
+    print(f'GetTask round trip ({args.rpcs} sequential calls):')
+    for name, micros in results.items():
+        print(f'  {name:>14}: {micros:7.1f} us/call ({micros - base:+.1f} us)')
+
+
+if __name__ == '__main__':
+    main()
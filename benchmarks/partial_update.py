@@ -0,0 +1,57 @@
+"""Bytes per status change: full-task UpdateTask versus an update_mask.
+
+Adds tasks with long descriptions, then changes each one's status, once
+by resending the whole task and once with update_mask=status, reporting
+request bytes on the wire and journal bytes written per update.
+
+Usage: python benchmarks/partial_update.py [--tasks 500] [--description-bytes 4096]
+"""
+import argparse
+import os
+import tempfile
+
+from common import ServerThread
+
+import grpc
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=500)
+    parser.add_argument('--description-bytes', type=int, default=4096)
+    args = parser.parse_args()
+
+    description = 'x' * args.description_bytes
+    print(f'{"update":>12} {"request B":>10} {"journal B":>10}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for masked in (False, True):
+            path = os.path.join(tmp_dir, f'{masked}.json')
+            with ServerThread(path) as server:
+                with grpc.insecure_channel(f'localhost:{server.port}') as channel:
+                    stub = taskmanager_pb2_grpc.TaskManagerStub(channel)
+                    tasks = [stub.AddTask(taskmanager_pb2.Task(title=f'Task {i}', description=description)).task
+                             for i in range(args.tasks)]
+                    journal_before = server.store._journal.size
+                    sent = 0
+                    for task in tasks:
+                        if masked:
+                            request = taskmanager_pb2.UpdateTaskRequest(
+                                taskId=task.id, task=taskmanager_pb2.Task(status='Completed')
+                            )
+                            request.update_mask.paths.append('status')
+                        else:
+                            request = taskmanager_pb2.UpdateTaskRequest(taskId=task.id, task=taskmanager_pb2.Task(
+                                title=task.title, description=task.description, status='Completed'
+                            ))
+                        sent += request.ByteSize()
+                        stub.UpdateTask(request)
+                    written = server.store._journal.size - journal_before
+            print(f'{"update_mask" if masked else "full task":>12} {sent / args.tasks:>10.0f} '
+                  f'{written / args.tasks:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
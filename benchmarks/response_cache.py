@@ -0,0 +1,83 @@
+"""GetTask and ListTasks latency with and without the response cache.
+
+Loads a store, then times repeated ListTasks and GetTask calls against a
+server without a cache and one with it, first with no writes in between
+(every cacheable call after the first is a hit) and then with an
+UpdateTask every few reads, which invalidates the listing and the updated
+task's entry.
+
+Usage: python benchmarks/response_cache.py [--tasks 5000] [--calls 200] [--write-every 10]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import ServerThread
+
+import grpc
+
+from taskmanager.batching import import_tasks
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+
+def timed(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def run(stub, ids, calls, write_every):
+    rng = random.Random(1)
+    hot = ids[:20]
+
+    def maybe_write(i):
+        if write_every and i % write_every == write_every - 1:
+            stub.UpdateTask(taskmanager_pb2.UpdateTaskRequest(
+                taskId=rng.choice(hot), task=taskmanager_pb2.Task(title=f'Edited {i}')
+            ))
+
+    def list_tasks(i):
+        stub.ListTasks(taskmanager_pb2.Empty())
+        maybe_write(i)
+
+    def get_task(i):
+        stub.GetTask(taskmanager_pb2.TaskRequest(taskId=rng.choice(hot)))
+        maybe_write(i)
+
+    return timed(list_tasks, calls), timed(get_task, calls * 10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--write-every', type=int, default=10, help='reads between updates in the second run')
+    args = parser.parse_args()
+
+    print(f'{args.tasks} tasks; ms per call (GetTask over 20 hot tasks)')
+    print(f'{"cache":>6} {"writes":>14} {"ListTasks":>10} {"GetTask":>8}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for cache_bytes in (0, 64 * 2**20):
+            path = os.path.join(tmp_dir, f'{cache_bytes}.json')
+            with ServerThread(path, cache_bytes=cache_bytes) as server:
+                with grpc.insecure_channel(f'localhost:{server.port}') as channel:
+                    stub = taskmanager_pb2_grpc.TaskManagerStub(channel)
+                    import_tasks(stub, (taskmanager_pb2.Task(title=f'Task {i}', description='x' * 100)
+                                        for i in range(args.tasks)))
+                    ids = [task.id for task in stub.ListTasks(taskmanager_pb2.Empty()).tasks]
+                    for write_every in (0, args.write_every):
+                        list_ms, get_ms = run(stub, ids, args.calls, write_every)
+                        writes = f'1 per {write_every} reads' if write_every else 'none'
+                        print(f'{"on" if cache_bytes else "off":>6} {writes:>14} {list_ms:>10.2f} {get_ms:>8.3f}')
+                if server.cache is not None:
+                    cache = server.cache
+                    print(f'cache: {cache.hits} hits, {cache.misses} misses, {cache.invalidations} invalidations')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Refresh cost with and without the client task cache.
+
+Loads a store, then compares a full StreamTasks listing with revalidating
+a TaskCache (if_changed_since) when nothing changed and after a few edits,
+reporting bytes received and wall time. Also times starting from the cache
+file instead of the server.
+
+Usage: python benchmarks/revalidate.py [--tasks 50000] [--changes 20]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from common import ServerThread
+
+import grpc
+
+from taskmanager.batching import import_tasks
+from taskmanager.cache import TaskCache
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+
+def refresh(stub, cache):
+    start = time.perf_counter()
+    received = 0
+    for page in stub.StreamTasks(cache.begin_refresh()):
+        received += page.ByteSize()
+        cache.apply_page(page)
+    cache.finish_refresh()
+    return received, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--changes', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='revalidate-bench-')
+    try:
+        with ServerThread(os.path.join(tmp_dir, 'tasks.json')) as server:
+            with grpc.insecure_channel(server.target) as channel:
+                stub = taskmanager_pb2_grpc.TaskManagerStub(channel)
+                import_tasks(stub, (taskmanager_pb2.Task(title=f'Task {i}', description='Benchmark task')
+                                    for i in range(args.tasks)))
+
+                cache = TaskCache(os.path.join(tmp_dir, 'tasks.cache'))
+                rows = [('full listing', refresh(stub, cache))]
+                rows.append(('not modified', refresh(stub, cache)))
+                for task_id in list(cache.tasks)[:args.changes]:
+                    stub.UpdateTask(taskmanager_pb2.UpdateTaskRequest(
+                        taskId=task_id, task=taskmanager_pb2.Task(status='Completed')))
+                rows.append((f'{args.changes} changed', refresh(stub, cache)))
+
+                cache.save()
+                start = time.perf_counter()
+                TaskCache(cache.path).load()
+                load_time = time.perf_counter() - start
+
+        print(f'{args.tasks} tasks')
+        print(f'  {"refresh":>14} {"bytes":>12} {"ms":>9}')
+        for name, (received, elapsed) in rows:
+            print(f'  {name:>14} {received:>12} {elapsed * 1000:>9.1f}')
+        print(f'  cache file: {os.path.getsize(cache.path)} bytes, loaded in {load_time * 1000:.1f} ms')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""SearchTasks latency against the inverted index at different store sizes.
+
+Builds a SearchIndex over synthetic tasks whose words follow a Zipf-like
+distribution, then times common, rare, multi-word and prefix queries.
+
+Usage: python benchmarks/search.py [--tasks 100000 300000] [--queries 200]
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskmanager.search import SearchIndex
+
+import taskmanager_pb2
+
+VOCABULARY_SIZE = 20000
+
+
+def make_vocabulary(rng):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(VOCABULARY_SIZE)]
+
+
+def make_tasks(count, vocabulary, rng):
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    total = cum_weights[-1]
+
+    def words(k):
+        return ' '.join(vocabulary[bisect.bisect(cum_weights, rng.random() * total)] for _ in range(k))
+
+    for i in range(count):
+        title = words(4)
+        description = words(20)
+        yield taskmanager_pb2.Task(id=f'{i:08x}', title=title, description=description)
+
+
+def time_queries(index, queries, limit):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, limit)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, nargs='+', default=[100000, 300000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    mid = vocabulary[100:2000]
+    rare = vocabulary[5000:]
+    query_sets = {
+        'rare word': [rng.choice(rare) for _ in range(args.queries)],
+        'mid word': [rng.choice(mid) for _ in range(args.queries)],
+        'two words': [f'{rng.choice(mid)} {rng.choice(rare)}' for _ in range(args.queries)],
+        'prefix': [rng.choice(mid)[:3] for _ in range(args.queries)],
+        'top-10 word': [rng.choice(vocabulary[:10]) for _ in range(args.queries)],
+    }
+
+    for count in args.tasks:
+        index = SearchIndex()
+        start = time.perf_counter()
+        index.rebuild(make_tasks(count, vocabulary, rng))
+        print(f'{count} tasks indexed in {time.perf_counter() - start:.1f}s')
+        print(f'  {"query":>12} {"p50 ms":>8} {"p99 ms":>8}')
+        for name, queries in query_sets.items():
+            p50, p99 = time_queries(index, queries, args.limit)
+            print(f'  {name:>12} {p50:>8.2f} {p99:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Cold start, memory and point reads: tasks.json versus the binary task file.
+
+Writes the same tasks in both snapshot formats, then for each one starts a
+fresh process that loads a TaskStore and reports the load time, resident
+memory after loading, and the mean time of store.get() for random ids.
+
+Usage: python benchmarks/store_formats.py [--tasks 1000000] [--reads 10000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskmanager.store import TaskStore, write_json_tasks
+from taskmanager.taskfile import write_task_file
+
+import taskmanager_pb2
+
+
+def resident_kib():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(path, reads):
+    """Runs in the child process; prints a JSON result."""
+    baseline = resident_kib()
+    start = time.perf_counter()
+    store = TaskStore(path)
+    store.load(readonly=True)
+    load_seconds = time.perf_counter() - start
+    rss_mib = (resident_kib() - baseline) / 1024
+    ids = [f'{i:08x}-0000-4000-8000-000000000000' for i in random.Random(1).choices(range(len(store)), k=reads)]
+    start = time.perf_counter()
+    for task_id in ids:
+        store.get(task_id)
+    get_us = (time.perf_counter() - start) / reads * 1e6
+    print(json.dumps({'load_s': load_seconds, 'rss_mib': rss_mib, 'get_us': get_us}))
+
+
+def seed(directory, count):
+    tasks = [
+        taskmanager_pb2.Task(
+            id=f'{i:08x}-0000-4000-8000-000000000000', title=f'Task {i}',
+            description='Seeded by benchmarks/store_formats.py', status=('To Do', 'In Progress', 'Done')[i % 3],
+            createdAt='2025-01-01T00:00:00.000Z'
+        )
+        for i in range(count)
+    ]
+    json_path = os.path.join(directory, 'tasks.json')
+    binary_path = os.path.join(directory, 'tasks.db')
+    write_json_tasks(json_path, {
+        task.id: {name: getattr(task, name) for name in ('id', 'title', 'description', 'status', 'createdAt')}
+        for task in tasks
+    })
+    write_task_file(binary_path, ((task.id, task.SerializeToString()) for task in tasks))
+    return json_path, binary_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--reads', type=int, default=10000)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args.measure, args.reads)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f'Writing {args.tasks} tasks in both formats...')
+        paths = seed(tmp_dir, args.tasks)
+        print(f'{"format":>8} {"file MiB":>10} {"load s":>8} {"RSS MiB":>9} {"get µs":>8}')
+        for name, path in zip(('json', 'binary'), paths):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--measure', path, '--reads', str(args.reads)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output)
+            print(f'{name:>8} {os.path.getsize(path) / 2**20:>10.1f} {result["load_s"]:>8.2f} '
+                  f'{result["rss_mib"]:>9.1f} {result["get_us"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
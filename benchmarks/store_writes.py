@@ -0,0 +1,91 @@
+"""Write throughput of TaskStore as the store grows.
+
+Preloads stores of increasing size, then runs concurrent AddTask/UpdateTask
+mutations against each and prints writes/sec. With the journal, throughput
+should stay flat as the store grows. For comparison it also times one
+full rewrite of tasks.json at each size, which is what every write used to
+cost.
+
+Usage: python benchmarks/store_writes.py [--sizes 1000 10000 100000] [--writes 5000]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskmanager.store import TaskStore, task_to_dict, write_json_tasks
+
+import taskmanager_pb2
+
+
+def seed(path, count):
+    tasks = {}
+    for i in range(count):
+        task_id = f'{i:08x}-0000-4000-8000-000000000000'
+        tasks[task_id] = {
+            'id': task_id,
+            'title': f'Task {i}',
+            'description': 'Seeded by benchmarks/store_writes.py',
+            'status': 'Not Started',
+            'createdAt': '2025-01-01T00:00:00.000Z',
+        }
+    write_json_tasks(path, tasks)
+
+
+async def run_writes(store, writes, concurrency):
+    ids = []
+
+    async def worker(n):
+        for i in range(n):
+            if ids and i % 2:
+                await store.update(ids[-1], taskmanager_pb2.Task(status='In Progress'))
+            else:
+                task = await store.add(taskmanager_pb2.Task(title=f'bench {i}', description='x' * 64))
+                ids.append(task.id)
+
+    per_worker = writes // concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    return per_worker * concurrency / (time.perf_counter() - start)
+
+
+async def bench_size(size, writes, concurrency):
+    tmp_dir = tempfile.mkdtemp(prefix='taskstore-bench-')
+    try:
+        path = os.path.join(tmp_dir, 'tasks.json')
+        seed(path, size)
+        store = TaskStore(path)
+        store.load()
+
+        start = time.perf_counter()
+        snapshot = {task_id: task_to_dict(task) for task_id, task in store._tasks.items()}
+        write_json_tasks(path + '.rewrite', snapshot)
+        rewrite_rate = 1 / (time.perf_counter() - start)
+
+        journal_rate = await run_writes(store, writes, concurrency)
+        await store.close()
+        return journal_rate, rewrite_rate
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--writes', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+
+    print(f'{"tasks":>10} {"journal writes/s":>18} {"full rewrite writes/s":>22}')
+    for size in args.sizes:
+        journal_rate, rewrite_rate = asyncio.run(bench_size(size, args.writes, args.concurrency))
+        print(f'{size:>10} {journal_rate:>18.0f} {rewrite_rate:>22.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Bytes per task: TaskRecord versus protobuf messages and tasks.json dicts.
+
+Each representation is built in a fresh process, held in an id -> task
+dict as the store does, and measured as the growth in resident memory
+divided by the number of tasks. Title and description strings are
+distinct per task, so the figures include them.
+
+Usage: python benchmarks/task_memory.py [--tasks 1000000]
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskmanager.records import TaskRecord
+
+import taskmanager_pb2
+
+STATUSES = ('Not Started', 'In Progress', 'Completed', 'pending')
+
+
+def resident_bytes():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def fields(i):
+    # Fresh strings per task, as parsing JSON produces, including the status
+    status = STATUSES[i % len(STATUSES)].encode().decode()
+    created = f'2025-01-01T00:{i // 60000 % 60:02d}:{i // 1000 % 60:02d}.{i % 1000:03d}Z'
+    return f'{i:08x}-0000-4000-8000-000000000000', f'Task {i}', f'Description of task {i}', status, created
+
+
+def build(kind, count):
+    tasks = {}
+    for i in range(count):
+        task_id, title, description, status, created = fields(i)
+        if kind == 'dict':
+            tasks[task_id] = {'id': task_id, 'title': title, 'description': description,
+                              'status': status, 'createdAt': created}
+        elif kind == 'protobuf':
+            tasks[task_id] = taskmanager_pb2.Task(id=task_id, title=title, description=description,
+                                                  status=status, createdAt=created)
+        else:
+            tasks[task_id] = TaskRecord.from_fields(task_id, title, description, status, created)
+    return tasks
+
+
+def measure(kind, count):
+    gc.collect()
+    baseline = resident_bytes()
+    tasks = build(kind, count)
+    gc.collect()
+    print(json.dumps({'bytes_per_task': (resident_bytes() - baseline) / len(tasks)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args.measure, args.tasks)
+        return
+
+    print(f'{args.tasks} tasks')
+    print(f'{"representation":>16} {"bytes/task":>11}')
+    results = {}
+    for kind in ('dict', 'protobuf', 'record'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--measure', kind, '--tasks', str(args.tasks)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[kind] = json.loads(output)['bytes_per_task']
+        print(f'{kind:>16} {results[kind]:>11.0f}')
+    print(f'TaskRecord uses {results["record"] / results["dict"]:.0%} of a dict '
+          f'and {results["record"] / results["protobuf"]:.0%} of a protobuf message')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Task list rendering: one Treeview item per task vs the virtualized view.
+
+Times loading N tasks into a plain ttk.Treeview against loading them into a
+TaskListModel rendered through VirtualTreeview, plus scrolling and
+filtering. Needs a display (run under xvfb-run on a headless machine).
+
+Usage: python benchmarks/tree_render.py [--tasks 10000 100000]
+"""
+import argparse
+import os
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from taskmanager.virtual_list import TaskListModel, VirtualTreeview
+
+import taskmanager_pb2
+
+COLUMNS = ("ID", "Title", "Description", "Status")
+STATUSES = ("Pending", "In Progress", "Completed")
+
+
+def make_tasks(count):
+    return [taskmanager_pb2.Task(id=f'{i:08x}', title=f'Task {i}', description=f'Description of task {i}',
+                                 status=STATUSES[i % len(STATUSES)])
+            for i in range(count)]
+
+
+def make_tree(root):
+    frame = ttk.Frame(root)
+    frame.pack(fill=tk.BOTH, expand=True)
+    scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    tree = ttk.Treeview(frame, columns=COLUMNS, show="headings", height=20)
+    tree.pack(fill=tk.BOTH, expand=True)
+    root.update()
+    return frame, tree, scrollbar
+
+
+def timed(root, action):
+    start = time.perf_counter()
+    action()
+    root.update()
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_plain(root, tasks):
+    frame, tree, _ = make_tree(root)
+
+    def load():
+        for task in tasks:
+            tree.insert("", tk.END, iid=task.id, values=(task.id, task.title, task.description, task.status))
+
+    def scroll():
+        for _ in range(50):
+            tree.yview_scroll(20, "units")
+
+    def filter_completed():
+        tree.delete(*tree.get_children())
+        for task in tasks:
+            if task.status == "Completed":
+                tree.insert("", tk.END, iid=task.id, values=(task.id, task.title, task.description, task.status))
+
+    results = timed(root, load), timed(root, scroll), timed(root, filter_completed)
+    frame.destroy()
+    return results
+
+
+def bench_virtual(root, tasks):
+    frame, tree, scrollbar = make_tree(root)
+    model = TaskListModel()
+    view = VirtualTreeview(tree, scrollbar, model)
+
+    def load():
+        model.replace_all(tasks)
+        view.render()
+
+    def scroll():
+        for _ in range(50):
+            view.scroll(20)
+
+    def filter_completed():
+        model.set_filter(lambda row: row[3] == "Completed")
+        view.top = 0
+        view.render()
+
+    results = timed(root, load), timed(root, scroll), timed(root, filter_completed)
+    frame.destroy()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f'No display available ({e}); try xvfb-run')
+    root.geometry("800x700")
+
+    print(f'{"tasks":>8} {"view":>8} {"load ms":>10} {"scroll ms":>10} {"filter ms":>10}')
+    for count in args.tasks:
+        tasks = make_tasks(count)
+        for name, bench in (('plain', bench_plain), ('virtual', bench_virtual)):
+            load, scroll, filtered = bench(root, tasks)
+            print(f'{count:>8} {name:>8} {load:>10.1f} {scroll:>10.1f} {filtered:>10.1f}')
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -19,10 +19,54 @@ const packageDefinition = protoLoader.loadSync(PROTO_PATH, {
 });
 const taskProto = grpc.loadPackageDefinition(packageDefinition);
 const client = new taskProto.taskmanager.TaskManager(
-    '127.0.0.1:50051',
+    process.env.TASKMANAGER_TARGET || '127.0.0.1:50051',
     grpc.credentials.createInsecure()
 );
 
+// Automatic batching: addTask calls made within BATCH_WINDOW_MS of each other
+// go to the server as a single BatchAddTasks RPC. Servers without batch
+// support get one AddTask per task instead.
+const BATCH_WINDOW_MS = 5;
+const MAX_BATCH_SIZE = 500;
+let pendingAdds = [];
+let batchTimer = null;
+
+function flushAdds() {
+    const batch = pendingAdds;
+    pendingAdds = [];
+    clearTimeout(batchTimer);
+    batchTimer = null;
+
+    client.batchAddTasks({ tasks: batch.map(item => item.task) }, (err, response) => {
+        if (err && err.code === grpc.status.UNIMPLEMENTED) {
+            batch.forEach(item => client.addTask(item.task, item.callback));
+            return;
+        }
+        if (err) {
+            batch.forEach(item => item.callback(err));
+            return;
+        }
+        const results = new Map(response.results.map(result => [result.index, result]));
+        batch.forEach((item, index) => {
+            const result = results.get(index);
+            if (result && result.success) {
+                item.callback(null, { task: result.task, message: 'Task added successfully' });
+            } else {
+                item.callback(new Error(result ? result.message : 'Missing batch result'));
+            }
+        });
+    });
+}
+
+function addTaskBatched(task, callback) {
+    pendingAdds.push({ task, callback });
+    if (pendingAdds.length >= MAX_BATCH_SIZE) {
+        flushAdds();
+    } else if (!batchTimer) {
+        batchTimer = setTimeout(flushAdds, BATCH_WINDOW_MS);
+    }
+}
+
 // API Routes
 app.get('/api/tasks', (req, res) => {
     client.listTasks({}, (err, response) => {
@@ -35,7 +79,7 @@ app.get('/api/tasks', (req, res) => {
 });
 
 app.post('/api/tasks', (req, res) => {
-    client.addTask(req.body, (err, response) => {
+    addTaskBatched(req.body, (err, response) => {
         if (err) {
             console.error('Error adding task:', err);
             return res.status(500).json({ error: 'Failed to add task' });
@@ -44,6 +88,16 @@ app.post('/api/tasks', (req, res) => {
     });
 });
 
+app.post('/api/tasks/batch', (req, res) => {
+    client.batchAddTasks({ tasks: req.body.tasks || [] }, (err, response) => {
+        if (err) {
+            console.error('Error adding tasks:', err);
+            return res.status(500).json({ error: 'Failed to add tasks' });
+        }
+        res.json(response);
+    });
+});
+
 app.get('/api/tasks/:id', (req, res) => {
     client.getTask({ taskId: req.params.id }, (err, response) => {
         if (err) {
@@ -92,7 +146,7 @@ app.get('/', (req, res) => {
 });
 
 // Start the server
-const PORT = 8080;
+const PORT = process.env.PORT || 8080;
 app.listen(PORT, () => {
     console.log(`Web server running at http://localhost:${PORT}`);
 });
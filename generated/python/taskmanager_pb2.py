@@ -22,29 +22,54 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11taskmanager.proto\x12\x0btaskmanager\"\x1d\n\x0bTaskRequest\x12\x0e\n\x06taskId\x18\x01 \x01(\t\"Y\n\x04Task\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x0e\n\x06status\x18\x04 \x01(\t\x12\x11\n\tcreatedAt\x18\x05 \x01(\t\"@\n\x0cTaskResponse\x12\x1f\n\x04task\x18\x01 \x01(\x0b\x32\x11.taskmanager.Task\x12\x0f\n\x07message\x18\x02 \x01(\t\"\x07\n\x05\x45mpty\",\n\x08TaskList\x12 \n\x05tasks\x18\x01 \x03(\x0b\x32\x11.taskmanager.Task\"2\n\x0e\x44\x65leteResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"D\n\x11UpdateTaskRequest\x12\x0e\n\x06taskId\x18\x01 \x01(\t\x12\x1f\n\x04task\x18\x02 \x01(\x0b\x32\x11.taskmanager.Task2\xcc\x02\n\x0bTaskManager\x12>\n\x07GetTask\x12\x18.taskmanager.TaskRequest\x1a\x19.taskmanager.TaskResponse\x12\x37\n\x07\x41\x64\x64Task\x12\x11.taskmanager.Task\x1a\x19.taskmanager.TaskResponse\x12\x36\n\tListTasks\x12\x12.taskmanager.Empty\x1a\x15.taskmanager.TaskList\x12\x43\n\nDeleteTask\x12\x18.taskmanager.TaskRequest\x1a\x1b.taskmanager.DeleteResponse\x12G\n\nUpdateTask\x12\x1e.taskmanager.UpdateTaskRequest\x1a\x19.taskmanager.TaskResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11taskmanager.proto\x12\x0btaskmanager\x1a google/protobuf/field_mask.proto\"Q\n\x0bTaskRequest\x12\x0e\n\x06taskId\x18\x01 \x01(\t\x12\x18\n\x10if_changed_since\x18\x02 \x01(\x03\x12\x18\n\x10\x65xpected_version\x18\x03 \x01(\x03\"j\n\x04Task\x12\n\n\x02id\x18\x01 \x01(\t\x12\r\n\x05title\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x0e\n\x06status\x18\x04 \x01(\t\x12\x11\n\tcreatedAt\x18\x05 \x01(\t\x12\x0f\n\x07version\x18\x06 \x01(\x03\"h\n\x0cTaskResponse\x12\x1f\n\x04task\x18\x01 \x01(\x0b\x32\x11.taskmanager.Task\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x10\n\x08revision\x18\x03 \x01(\x03\x12\x14\n\x0cnot_modified\x18\x04 \x01(\x08\"\x07\n\x05\x45mpty\">\n\x08TaskList\x12 \n\x05tasks\x18\x01 \x03(\x0b\x32\x11.taskmanager.Task\x12\x10\n\x08revision\x18\x02 \x01(\x03\"2\n\x0e\x44\x65leteResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\x8f\x01\n\x11UpdateTaskRequest\x12\x0e\n\x06taskId\x18\x01 \x01(\t\x12\x1f\n\x04task\x18\x02 \x01(\x0b\x32\x11.taskmanager.Task\x12\x18\n\x10\x65xpected_version\x18\x03 \x01(\x03\x12/\n\x0bupdate_mask\x18\x04 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\"\x83\x01\n\x10ListTasksRequest\x12\x11\n\tpage_size\x18\x01 \x01(\x05\x12\x12\n\npage_token\x18\x02 \x01(\t\x12.\n\nfield_mask\x18\x03 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x12\x18\n\x10if_changed_since\x18\x04 \x01(\x03\"\x91\x01\n\x08TaskPage\x12 \n\x05tasks\x18\x01 \x03(\x0b\x32\x11.taskmanager.Task\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t\x12\x10\n\x08revision\x18\x03 \x01(\x03\x12\x14\n\x0cnot_modified\x18\x04 \x01(\x08\x12\r\n\x05\x64\x65lta\x18\x05 \x01(\x08\x12\x13\n\x0b\x64\x65leted_ids\x18\x06 \x03(\t\"8\n\x14\x42\x61tchAddTasksRequest\x12 \n\x05tasks\x18\x01 \x03(\x0b\x32\x11.taskmanager.Task\"K\n\x17\x42\x61tchUpdateTasksRequest\x12\x30\n\x08requests\x18\x01 \x03(\x0b\x32\x1e.taskmanager.UpdateTaskRequest\"*\n\x17\x42\x61tchDeleteTasksRequest\x12\x0f\n\x07taskIds\x18\x01 \x03(\t\"m\n\x0b\x42\x61tchResult\x12\r\n\x05index\x18\x01 \x01(\x05\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x1f\n\x04task\x18\x03 \x01(\x0b\x32\x11.taskmanager.Task\x12\x0f\n\x07message\x18\x04 \x01(\t\x12\x0c\n\x04\x63ode\x18\x05 \x01(\x05\"]\n\rBatchResponse\x12)\n\x07results\x18\x01 \x03(\x0b\x32\x18.taskmanager.BatchResult\x12\x11\n\tsucceeded\x18\x02 \x01(\x05\x12\x0e\n\x06\x66\x61iled\x18\x03 \x01(\x05\"+\n\x11WatchTasksRequest\x12\x16\n\x0esince_revision\x18\x01 \x01(\x03\"\xc6\x01\n\tTaskEvent\x12)\n\x04type\x18\x01 \x01(\x0e\x32\x1b.taskmanager.TaskEvent.Type\x12\x1f\n\x04task\x18\x02 \x01(\x0b\x32\x11.taskmanager.Task\x12\x10\n\x08revision\x18\x03 \x01(\x03\x12\x18\n\x10last_in_revision\x18\x04 \x01(\x08\"A\n\x04Type\x12\x14\n\x10TYPE_UNSPECIFIED\x10\x00\x12\t\n\x05\x41\x44\x44\x45\x44\x10\x01\x12\x0b\n\x07UPDATED\x10\x02\x12\x0b\n\x07\x44\x45LETED\x10\x03\"a\n\x11QueryTasksRequest\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x15\n\rcreated_after\x18\x02 \x01(\t\x12\x16\n\x0e\x63reated_before\x18\x03 \x01(\t\x12\r\n\x05limit\x18\x04 \x01(\x05\"B\n\x12SearchTasksRequest\x12\r\n\x05query\x18\x01 \x01(\t\x12\r\n\x05limit\x18\x02 \x01(\x05\x12\x0e\n\x06status\x18\x03 \x01(\t2\xb3\x07\n\x0bTaskManager\x12>\n\x07GetTask\x12\x18.taskmanager.TaskRequest\x1a\x19.taskmanager.TaskResponse\x12\x37\n\x07\x41\x64\x64Task\x12\x11.taskmanager.Task\x1a\x19.taskmanager.TaskResponse\x12\x36\n\tListTasks\x12\x12.taskmanager.Empty\x1a\x15.taskmanager.TaskList\x12\x43\n\nDeleteTask\x12\x18.taskmanager.TaskRequest\x1a\x1b.taskmanager.DeleteResponse\x12G\n\nUpdateTask\x12\x1e.taskmanager.UpdateTaskRequest\x1a\x19.taskmanager.TaskResponse\x12\x45\n\x0bStreamTasks\x12\x1d.taskmanager.ListTasksRequest\x1a\x15.taskmanager.TaskPage0\x01\x12N\n\rBatchAddTasks\x12!.taskmanager.BatchAddTasksRequest\x1a\x1a.taskmanager.BatchResponse\x12T\n\x10\x42\x61tchUpdateTasks\x12$.taskmanager.BatchUpdateTasksRequest\x1a\x1a.taskmanager.BatchResponse\x12T\n\x10\x42\x61tchDeleteTasks\x12$.taskmanager.BatchDeleteTasksRequest\x1a\x1a.taskmanager.BatchResponse\x12N\n\x0bImportTasks\x12!.taskmanager.BatchAddTasksRequest\x1a\x1a.taskmanager.BatchResponse(\x01\x12\x46\n\nWatchTasks\x12\x1e.taskmanager.WatchTasksRequest\x1a\x16.taskmanager.TaskEvent0\x01\x12\x43\n\nQueryTasks\x12\x1e.taskmanager.QueryTasksRequest\x1a\x15.taskmanager.TaskList\x12\x45\n\x0bSearchTasks\x12\x1f.taskmanager.SearchTasksRequest\x1a\x15.taskmanager.TaskListb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'taskmanager_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_TASKREQUEST']._serialized_start=34
-  _globals['_TASKREQUEST']._serialized_end=63
-  _globals['_TASK']._serialized_start=65
-  _globals['_TASK']._serialized_end=154
-  _globals['_TASKRESPONSE']._serialized_start=156
-  _globals['_TASKRESPONSE']._serialized_end=220
-  _globals['_EMPTY']._serialized_start=222
-  _globals['_EMPTY']._serialized_end=229
-  _globals['_TASKLIST']._serialized_start=231
-  _globals['_TASKLIST']._serialized_end=275
-  _globals['_DELETERESPONSE']._serialized_start=277
-  _globals['_DELETERESPONSE']._serialized_end=327
-  _globals['_UPDATETASKREQUEST']._serialized_start=329
-  _globals['_UPDATETASKREQUEST']._serialized_end=397
-  _globals['_TASKMANAGER']._serialized_start=400
-  _globals['_TASKMANAGER']._serialized_end=732
+  _globals['_TASKREQUEST']._serialized_start=68
+  _globals['_TASKREQUEST']._serialized_end=149
+  _globals['_TASK']._serialized_start=151
+  _globals['_TASK']._serialized_end=257
+  _globals['_TASKRESPONSE']._serialized_start=259
+  _globals['_TASKRESPONSE']._serialized_end=363
+  _globals['_EMPTY']._serialized_start=365
+  _globals['_EMPTY']._serialized_end=372
+  _globals['_TASKLIST']._serialized_start=374
+  _globals['_TASKLIST']._serialized_end=436
+  _globals['_DELETERESPONSE']._serialized_start=438
+  _globals['_DELETERESPONSE']._serialized_end=488
+  _globals['_UPDATETASKREQUEST']._serialized_start=491
+  _globals['_UPDATETASKREQUEST']._serialized_end=634
+  _globals['_LISTTASKSREQUEST']._serialized_start=637
+  _globals['_LISTTASKSREQUEST']._serialized_end=768
+  _globals['_TASKPAGE']._serialized_start=771
+  _globals['_TASKPAGE']._serialized_end=916
+  _globals['_BATCHADDTASKSREQUEST']._serialized_start=918
+  _globals['_BATCHADDTASKSREQUEST']._serialized_end=974
+  _globals['_BATCHUPDATETASKSREQUEST']._serialized_start=976
+  _globals['_BATCHUPDATETASKSREQUEST']._serialized_end=1051
+  _globals['_BATCHDELETETASKSREQUEST']._serialized_start=1053
+  _globals['_BATCHDELETETASKSREQUEST']._serialized_end=1095
+  _globals['_BATCHRESULT']._serialized_start=1097
+  _globals['_BATCHRESULT']._serialized_end=1206
+  _globals['_BATCHRESPONSE']._serialized_start=1208
+  _globals['_BATCHRESPONSE']._serialized_end=1301
+  _globals['_WATCHTASKSREQUEST']._serialized_start=1303
+  _globals['_WATCHTASKSREQUEST']._serialized_end=1346
+  _globals['_TASKEVENT']._serialized_start=1349
+  _globals['_TASKEVENT']._serialized_end=1547
+  _globals['_TASKEVENT_TYPE']._serialized_start=1482
+  _globals['_TASKEVENT_TYPE']._serialized_end=1547
+  _globals['_QUERYTASKSREQUEST']._serialized_start=1549
+  _globals['_QUERYTASKSREQUEST']._serialized_end=1646
+  _globals['_SEARCHTASKSREQUEST']._serialized_start=1648
+  _globals['_SEARCHTASKSREQUEST']._serialized_end=1714
+  _globals['_TASKMANAGER']._serialized_start=1717
+  _globals['_TASKMANAGER']._serialized_end=2664
 # @@protoc_insertion_point(module_scope)
@@ -60,6 +60,46 @@ class TaskManagerStub(object):
                 request_serializer=taskmanager__pb2.UpdateTaskRequest.SerializeToString,
                 response_deserializer=taskmanager__pb2.TaskResponse.FromString,
                 _registered_method=True)
+        self.StreamTasks = channel.unary_stream(
+                '/taskmanager.TaskManager/StreamTasks',
+                request_serializer=taskmanager__pb2.ListTasksRequest.SerializeToString,
+                response_deserializer=taskmanager__pb2.TaskPage.FromString,
+                _registered_method=True)
+        self.BatchAddTasks = channel.unary_unary(
+                '/taskmanager.TaskManager/BatchAddTasks',
+                request_serializer=taskmanager__pb2.BatchAddTasksRequest.SerializeToString,
+                response_deserializer=taskmanager__pb2.BatchResponse.FromString,
+                _registered_method=True)
+        self.BatchUpdateTasks = channel.unary_unary(
+                '/taskmanager.TaskManager/BatchUpdateTasks',
+                request_serializer=taskmanager__pb2.BatchUpdateTasksRequest.SerializeToString,
+                response_deserializer=taskmanager__pb2.BatchResponse.FromString,
+                _registered_method=True)
+        self.BatchDeleteTasks = channel.unary_unary(
+                '/taskmanager.TaskManager/BatchDeleteTasks',
+                request_serializer=taskmanager__pb2.BatchDeleteTasksRequest.SerializeToString,
+                response_deserializer=taskmanager__pb2.BatchResponse.FromString,
+                _registered_method=True)
+        self.ImportTasks = channel.stream_unary(
+                '/taskmanager.TaskManager/ImportTasks',
+                request_serializer=taskmanager__pb2.BatchAddTasksRequest.SerializeToString,
+                response_deserializer=taskmanager__pb2.BatchResponse.FromString,
+                _registered_method=True)
+        self.WatchTasks = channel.unary_stream(
+                '/taskmanager.TaskManager/WatchTasks',
+                request_serializer=taskmanager__pb2.WatchTasksRequest.SerializeToString,
+                response_deserializer=taskmanager__pb2.TaskEvent.FromString,
+                _registered_method=True)
+        self.QueryTasks = channel.unary_unary(
+                '/taskmanager.TaskManager/QueryTasks',
+                request_serializer=taskmanager__pb2.QueryTasksRequest.SerializeToString,
+                response_deserializer=taskmanager__pb2.TaskList.FromString,
+                _registered_method=True)
+        self.SearchTasks = channel.unary_unary(
+                '/taskmanager.TaskManager/SearchTasks',
+                request_serializer=taskmanager__pb2.SearchTasksRequest.SerializeToString,
+                response_deserializer=taskmanager__pb2.TaskList.FromString,
+                _registered_method=True)
 
 
 class TaskManagerServicer(object):
@@ -96,6 +136,62 @@ class TaskManagerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StreamTasks(self, request, context):
+        """Streams tasks in id order, a chunk at a time
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchAddTasks(self, request, context):
+        """Batch mutations are applied as one storage transaction each
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchUpdateTasks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchDeleteTasks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ImportTasks(self, request_iterator, context):
+        """Bulk import; each streamed message is applied as one batch and only
+        failed items are reported back. Unlike AddTask, a createdAt set on an
+        imported task is kept
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchTasks(self, request, context):
+        """Streams change events after since_revision, then live changes
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def QueryTasks(self, request, context):
+        """Tasks matching a status and/or createdAt range, in createdAt order
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SearchTasks(self, request, context):
+        """Ranked full-text search over title and description
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_TaskManagerServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -124,6 +220,46 @@ def add_TaskManagerServicer_to_server(servicer, server):
                     request_deserializer=taskmanager__pb2.UpdateTaskRequest.FromString,
                     response_serializer=taskmanager__pb2.TaskResponse.SerializeToString,
             ),
+            'StreamTasks': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamTasks,
+                    request_deserializer=taskmanager__pb2.ListTasksRequest.FromString,
+                    response_serializer=taskmanager__pb2.TaskPage.SerializeToString,
+            ),
+            'BatchAddTasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchAddTasks,
+                    request_deserializer=taskmanager__pb2.BatchAddTasksRequest.FromString,
+                    response_serializer=taskmanager__pb2.BatchResponse.SerializeToString,
+            ),
+            'BatchUpdateTasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchUpdateTasks,
+                    request_deserializer=taskmanager__pb2.BatchUpdateTasksRequest.FromString,
+                    response_serializer=taskmanager__pb2.BatchResponse.SerializeToString,
+            ),
+            'BatchDeleteTasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchDeleteTasks,
+                    request_deserializer=taskmanager__pb2.BatchDeleteTasksRequest.FromString,
+                    response_serializer=taskmanager__pb2.BatchResponse.SerializeToString,
+            ),
+            'ImportTasks': grpc.stream_unary_rpc_method_handler(
+                    servicer.ImportTasks,
+                    request_deserializer=taskmanager__pb2.BatchAddTasksRequest.FromString,
+                    response_serializer=taskmanager__pb2.BatchResponse.SerializeToString,
+            ),
+            'WatchTasks': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchTasks,
+                    request_deserializer=taskmanager__pb2.WatchTasksRequest.FromString,
+                    response_serializer=taskmanager__pb2.TaskEvent.SerializeToString,
+            ),
+            'QueryTasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.QueryTasks,
+                    request_deserializer=taskmanager__pb2.QueryTasksRequest.FromString,
+                    response_serializer=taskmanager__pb2.TaskList.SerializeToString,
+            ),
+            'SearchTasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.SearchTasks,
+                    request_deserializer=taskmanager__pb2.SearchTasksRequest.FromString,
+                    response_serializer=taskmanager__pb2.TaskList.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'taskmanager.TaskManager', rpc_method_handlers)
@@ -270,3 +406,219 @@ class TaskManager(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def StreamTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/taskmanager.TaskManager/StreamTasks',
+            taskmanager__pb2.ListTasksRequest.SerializeToString,
+            taskmanager__pb2.TaskPage.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchAddTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/taskmanager.TaskManager/BatchAddTasks',
+            taskmanager__pb2.BatchAddTasksRequest.SerializeToString,
+            taskmanager__pb2.BatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchUpdateTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/taskmanager.TaskManager/BatchUpdateTasks',
+            taskmanager__pb2.BatchUpdateTasksRequest.SerializeToString,
+            taskmanager__pb2.BatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchDeleteTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/taskmanager.TaskManager/BatchDeleteTasks',
+            taskmanager__pb2.BatchDeleteTasksRequest.SerializeToString,
+            taskmanager__pb2.BatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ImportTasks(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/taskmanager.TaskManager/ImportTasks',
+            taskmanager__pb2.BatchAddTasksRequest.SerializeToString,
+            taskmanager__pb2.BatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/taskmanager.TaskManager/WatchTasks',
+            taskmanager__pb2.WatchTasksRequest.SerializeToString,
+            taskmanager__pb2.TaskEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def QueryTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/taskmanager.TaskManager/QueryTasks',
+            taskmanager__pb2.QueryTasksRequest.SerializeToString,
+            taskmanager__pb2.TaskList.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SearchTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/taskmanager.TaskManager/SearchTasks',
+            taskmanager__pb2.SearchTasksRequest.SerializeToString,
+            taskmanager__pb2.TaskList.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
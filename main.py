@@ -1,25 +1,57 @@
 import tkinter as tk
-from tkinter import messagebox
-import grpc
-from datetime import datetime
+from tkinter import messagebox, filedialog
+import importlib.util
+import json
+import queue
 import sys
 import os
+import threading
+import time
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from ttkbootstrap.scrolled import ScrolledText
 
-# Add the generated directory to Python's path
-current_dir = os.path.dirname(os.path.abspath(__file__))
-generated_path = os.path.join(current_dir, 'generated', 'python')
-sys.path.append(generated_path)
+# Importing the taskmanager package puts generated/python on sys.path
+from taskmanager.virtual_list import TaskListModel, VirtualTreeview
 
-try:
-    import taskmanager_pb2
-    import taskmanager_pb2_grpc
-except ImportError:
+if importlib.util.find_spec("taskmanager_pb2") is None:
     print("Error: Could not import gRPC generated files. Please ensure they exist in the generated/python directory.")
     sys.exit(1)
 
+# grpc and the generated modules take a few hundred milliseconds to import,
+# so they are imported once the window has been painted
+grpc = taskmanager_pb2 = TaskBatcher = TaskCache = Client = RequestExecutor = None
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+SERVER_TARGET = os.environ.get("TASKMANAGER_TARGET", "localhost:50051")
+# Debounce for the search box, and how many ranked matches to show
+SEARCH_DELAY_MS = 250
+SEARCH_LIMIT = 200
+# Tasks as of the last session, shown before the server answers and then
+# revalidated by revision
+CACHE_PATH = os.environ.get("TASKMANAGER_CACHE", os.path.join(current_dir, ".tasks.cache"))
+# How long to wait for the connection before saying the server is
+# unreachable; waiting then continues
+CONNECT_TIMEOUT = 3.0
+# Set by benchmarks/client_startup.py: startup milestones are printed as
+# they are reached, and the client exits at the one named
+STARTUP_PROBE = os.environ.get("TASKMANAGER_STARTUP_PROBE")
+
+
+def import_cache_modules():
+    global taskmanager_pb2, TaskCache
+    import taskmanager_pb2
+    from taskmanager.cache import TaskCache
+
+
+def import_rpc_modules():
+    global grpc, TaskBatcher, Client, RequestExecutor
+    import grpc
+    from taskmanager.batching import TaskBatcher
+    from taskmanager.client import Client
+    from taskmanager.executor import RequestExecutor
+
+
 class TaskManagerClient:
     def __init__(self):
         self.root = ttk.Window(
@@ -31,16 +63,77 @@ class TaskManagerClient:
         )
         self.root.place_window_center()
         
+        # Change events from the WatchTasks thread, applied on the Tk thread
+        self.events = queue.Queue()
+        self.watching = False
+        # Cleared when the server doesn't implement WatchTasks (e.g. the
+        # sharding router); writes then reload the list themselves
+        self.watch_supported = True
+        # Pending debounced search (a root.after id), and the ids of the
+        # last search's matches in rank order, or None when not searching
+        self.search_after_id = None
+        self.search_ids = None
+        # (task id, version) of the task loaded into the form, so an update
+        # or delete fails instead of overwriting someone else's change
+        self.editing = None
+        # channel_ready_future of the connection being waited for
+        self.connecting = None
+        
+        self.create_widgets()
+        self.setup_styles()
+        
+        # Paint the window before the slower imports, then show the tasks
+        # cached by the last session while the connection comes up
+        self.root.update()
+        self.milestone("first-frame")
+        import_cache_modules()
+        self.cache = TaskCache(CACHE_PATH)
+        self.show_cached_tasks()
+        self.milestone("cached")
+        
+        import_rpc_modules()
+        # Runs RPCs in the background so the window keeps painting while
+        # the server works; results come back on the Tk thread
+        self.executor = RequestExecutor(self.root)
         try:
-            self.channel = grpc.insecure_channel('localhost:50051')
-            self.stub = taskmanager_pb2_grpc.TaskManagerStub(self.channel)
+            # Reads retry and wait out a server restart; GetTask is hedged
+            self.client = Client(SERVER_TARGET)
         except Exception as e:
             messagebox.showerror("Connection Error", f"Failed to connect to gRPC server: {str(e)}")
             self.root.destroy()
             return
+        self.wait_for_server()
         
-        self.create_widgets()
-        self.setup_styles()
+        # The WatchTasks thread starts once the first refresh has completed
+        self.root.after(100, self.process_events)
+
+    def milestone(self, name):
+        if STARTUP_PROBE:
+            print(name, flush=True)
+            if name == STARTUP_PROBE:
+                self.root.after_idle(self.root.destroy)
+
+    def show_cached_tasks(self):
+        if self.cache.load():
+            self.model.replace_all(self.cache.tasks.values())
+            self.view.render()
+            self.status_var.set(f"Showing {self.model.total} cached task(s)")
+
+    def wait_for_server(self, ready=None):
+        # The first listing starts once the channel has connected, so an
+        # unreachable server leaves the cached tasks on screen rather than
+        # raising an error
+        if ready is None:
+            ready = self.connecting = self.client.ready_future()
+            self.status_var.set(f"Connecting to {SERVER_TARGET}...")
+        
+        def on_error(e):
+            self.status_var.set(f"Waiting for the server at {SERVER_TARGET}; "
+                                f"showing {self.model.total} cached task(s)")
+            self.wait_for_server(ready)
+        
+        self.executor.submit(ready.result, CONNECT_TIMEOUT, on_done=lambda _: self.list_tasks(),
+                             on_error=on_error, key="connect")
 
     def setup_styles(self):
         # Configure treeview style
@@ -133,12 +226,21 @@ class TaskManagerClient:
             width=15
         ).pack(side=LEFT, padx=(0, 10))
         
+        ttk.Button(
+            btn_frame, 
+            text="Import...",
+            command=self.import_tasks,
+            bootstyle="secondary-outline",
+            width=15
+        ).pack(side=LEFT, padx=(0, 10))
+        
         # Search frame
         search_frame = ttk.Frame(main_frame)
         search_frame.pack(fill=X, pady=(10, 5))
         
         ttk.Label(search_frame, text="Search:").pack(side=LEFT, padx=(0, 5))
         self.search_var = tk.StringVar()
+        # Searching runs on the server; filter_tasks debounces keystrokes
         self.search_var.trace("w", lambda name, index, mode: self.filter_tasks())
         
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=30)
@@ -175,7 +277,6 @@ class TaskManagerClient:
             show="headings",
             height=10,
             bootstyle="default",
-            yscrollcommand=tree_scroll_y.set,
             xscrollcommand=tree_scroll_x.set
         )
         
@@ -192,11 +293,22 @@ class TaskManagerClient:
         
         # Pack the Treeview and configure scrollbars
         self.tree.pack(fill=BOTH, expand=YES)
-        tree_scroll_y.config(command=self.tree.yview)
         tree_scroll_x.config(command=self.tree.xview)
         
-        # Bind select event
-        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        # Configure tag styles
+        self.tree.tag_configure("completed", background="#e8f0fe")
+        self.tree.tag_configure("in_progress", background="#fff8e1")
+        
+        # The Treeview only holds the visible rows; every task lives in the
+        # model, and the view drives the vertical scrollbar and selection
+        self.model = TaskListModel()
+        self.view = VirtualTreeview(
+            self.tree,
+            tree_scroll_y,
+            self.model,
+            tags_for=lambda row: self.status_tags(row[3]),
+            on_select=self.on_tree_select
+        )
         
         # Status bar at the bottom
         self.status_var = tk.StringVar()
@@ -209,14 +321,11 @@ class TaskManagerClient:
             padding=(10, 2)
         )
         status_bar.pack(side=BOTTOM, fill=X)
-        
-        # Initially populate the task list
-        self.list_tasks()
 
-    def on_tree_select(self, event):
-        selected_item = self.tree.selection()
-        if selected_item:
-            values = self.tree.item(selected_item[0])['values']
+    def on_tree_select(self, values):
+        if values:
+            task = self.cache.tasks.get(values[0])
+            self.editing = (values[0], task.version if task is not None else 0)
             self.title_entry.delete(0, tk.END)
             self.title_entry.insert(0, values[1])
             
@@ -231,144 +340,345 @@ class TaskManagerClient:
         status = self.status_combo.get()
         
         if title and description:
-            try:
-                self.status_var.set("Adding task...")
-                request = taskmanager_pb2.Task(
-                    title=title,
-                    description=description,
-                    status=status
-                )
-                response = self.stub.AddTask(request)
+            self.status_var.set("Adding task...")
+            request = taskmanager_pb2.Task(
+                title=title,
+                description=description,
+                status=status
+            )
+            
+            def on_done(response):
                 self.status_var.set(f"Task added successfully: {title}")
                 self.clear_form()
-                self.list_tasks()  # Refresh the list
-            except grpc.RpcError as e:
-                self.status_var.set(f"Error: {str(e)}")
-                messagebox.showerror("Error", f"Failed to add task: {str(e)}")
+                self.refresh_after_write()
+            
+            self.executor.call(self.client.AddTask, request, on_done=on_done,
+                               on_error=self.rpc_error("Failed to add task"))
         else:
             self.status_var.set("Warning: Missing information")
             messagebox.showwarning("Warning", "Please fill in both title and description!")
 
     def update_selected_task(self):
-        selected_item = self.tree.selection()
-        if not selected_item:
+        selected_row = self.view.selected_row()
+        if not selected_row:
             messagebox.showwarning("Warning", "Please select a task to update")
             return
             
-        try:
-            task_id = self.tree.item(selected_item[0])['values'][0]
-            title = self.title_entry.get()
-            description = self.desc_text.get("1.0", tk.END).strip()
-            status = self.status_combo.get()
+        task_id = selected_row[0]
+        title = self.title_entry.get()
+        description = self.desc_text.get("1.0", tk.END).strip()
+        status = self.status_combo.get()
+        
+        if title and description:
+            # Send only the fields that differ from the task as loaded
+            values = {"title": title, "description": description, "status": status}
+            current = self.cache.tasks.get(task_id)
+            if current is not None:
+                values = {name: value for name, value in values.items() if getattr(current, name) != value}
+                if not values:
+                    self.status_var.set("No changes to save")
+                    return
+            self.status_var.set("Updating task...")
+            request = taskmanager_pb2.UpdateTaskRequest(
+                taskId=task_id,
+                task=taskmanager_pb2.Task(**values),
+                expected_version=self.expected_version(task_id)
+            )
+            request.update_mask.paths.extend(values)
             
-            if title and description:
-                request = taskmanager_pb2.Task(
-                    id=task_id,
-                    title=title,
-                    description=description,
-                    status=status
-                )
-                self.stub.UpdateTask(request)
+            def on_done(response):
                 self.status_var.set(f"Task updated successfully: {title}")
-                self.list_tasks()  # Refresh the list
                 self.clear_form()
-            else:
-                messagebox.showwarning("Warning", "Please fill in both title and description!")
-                
-        except grpc.RpcError as e:
-            self.status_var.set(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"Failed to update task: {str(e)}")
+                self.refresh_after_write()
+            
+            self.executor.call(self.client.UpdateTask, request, on_done=on_done,
+                               on_error=self.write_error("Failed to update task", task_id))
+        else:
+            messagebox.showwarning("Warning", "Please fill in both title and description!")
+
+    def expected_version(self, task_id):
+        if self.editing and self.editing[0] == task_id:
+            return self.editing[1]
+        return 0
 
     def clear_form(self):
+        self.editing = None
         self.title_entry.delete(0, tk.END)
         self.desc_text.delete("1.0", tk.END)
         self.status_combo.current(0)
 
     def delete_selected_task(self):
-        selected_item = self.tree.selection()
-        if not selected_item:
+        selected_row = self.view.selected_row()
+        if not selected_row:
             messagebox.showwarning("Warning", "Please select a task to delete")
             return
             
-        try:
-            task_id = self.tree.item(selected_item[0])['values'][0]
-            task_title = self.tree.item(selected_item[0])['values'][1]
-            
-            # Confirm deletion
-            confirm = messagebox.askyesno(
-                "Confirm Deletion", 
-                f"Are you sure you want to delete task: {task_title}?"
-            )
+        task_id = selected_row[0]
+        task_title = selected_row[1]
+        
+        # Confirm deletion
+        confirm = messagebox.askyesno(
+            "Confirm Deletion", 
+            f"Are you sure you want to delete task: {task_title}?"
+        )
+        
+        if confirm:
+            self.status_var.set("Deleting task...")
+            request = taskmanager_pb2.TaskRequest(taskId=task_id, expected_version=self.expected_version(task_id))
             
-            if confirm:
-                request = taskmanager_pb2.TaskRequest(taskId=task_id)
-                self.stub.DeleteTask(request)
-                self.list_tasks()  # Refresh the list
+            def on_done(response):
                 self.clear_form()
                 self.status_var.set(f"Task deleted successfully: {task_title}")
-        except grpc.RpcError as e:
+                self.refresh_after_write()
+            
+            self.executor.call(self.client.DeleteTask, request, on_done=on_done,
+                               on_error=self.write_error("Failed to delete task", task_id))
+
+    def import_tasks(self):
+        path = filedialog.askopenfilename(
+            title="Import Tasks",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+            
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # Accept the tasks.json layout (id -> task) as well as a plain list
+            entries = data.values() if isinstance(data, dict) else data
+            tasks = [taskmanager_pb2.Task(
+                title=str(entry.get("title", "")),
+                description=str(entry.get("description", "")),
+                status=str(entry.get("status", ""))
+            ) for entry in entries]
+        except (OSError, ValueError, AttributeError) as e:
             self.status_var.set(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"Failed to delete task: {str(e)}")
+            messagebox.showerror("Error", f"Failed to read {path}: {str(e)}")
+            return
+        
+        def send(tasks):
+            # Runs on a worker thread; the batcher sends BatchAddTasks calls
+            # instead of one AddTask per task
+            with TaskBatcher(self.client) as batcher:
+                for task in tasks:
+                    batcher.add(task)
+            return batcher.succeeded
+        
+        def on_done(succeeded):
+            self.status_var.set(f"Imported {succeeded} task(s) from {os.path.basename(path)}")
+            self.refresh_after_write()
+        
+        self.status_var.set("Importing tasks...")
+        self.executor.submit(send, tasks, on_done=on_done, on_error=self.rpc_error("Failed to import tasks"),
+                             key="import")
 
     def filter_tasks(self):
-        search_text = self.search_var.get().lower()
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        if self.search_var.get().strip():
+            # Wait for a pause in typing, then ask the server for ranked matches
+            self.search_after_id = self.root.after(SEARCH_DELAY_MS, self.run_search)
+        else:
+            self.search_ids = None
+            self.apply_filter()
+
+    def run_search(self):
+        self.search_after_id = None
         status_filter = self.filter_combo.get()
+        request = taskmanager_pb2.SearchTasksRequest(
+            query=self.search_var.get().strip(),
+            limit=SEARCH_LIMIT,
+            status="" if status_filter == "All" else status_filter
+        )
         
-        for item in self.tree.get_children():
-            values = self.tree.item(item)['values']
-            title = str(values[1]).lower()
-            desc = str(values[2]).lower()
-            status = values[3]
-            
-            # Check if the item matches both search text and status filter
-            match_search = search_text == "" or search_text in title or search_text in desc
-            match_status = status_filter == "All" or status == status_filter
-            
-            if match_search and match_status:
-                self.tree.item(item, tags=())
-            else:
-                self.tree.detach(item)  # Hide items that don't match
+        def on_done(response):
+            self.model.extend(response.tasks)
+            self.search_ids = [task.id for task in response.tasks]
+            self.apply_filter()
+        
+        def on_error(e):
+            self.status_var.set(f"Error: {str(e)}")
+        
+        # Only the latest query matters, so a newer search cancels an older one
+        self.executor.call(self.client.SearchTasks, request, on_done=on_done, on_error=on_error,
+                           key="search", replace=True)
+
+    def apply_filter(self):
+        # Filtering only changes which model rows are shown; nothing is
+        # fetched again and the Treeview itself stays the same size
+        status_filter = self.filter_combo.get()
+        if status_filter == "All":
+            predicate = None
+        else:
+            predicate = lambda row: row[3] == status_filter
+        self.model.set_filter(predicate, self.search_ids)
+        self.view.top = 0
+        self.view.render()
+        self.status_var.set(f"Showing {len(self.model)} of {self.model.total} task(s)")
 
     def list_tasks(self):
-        try:
-            self.status_var.set("Retrieving tasks...")
-            response = self.stub.ListTasks(taskmanager_pb2.Empty())
-            
-            # Clear existing items
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-                
-            # Add new items with status-based styling
-            for task in response.tasks:
-                item_id = self.tree.insert("", tk.END, values=(
-                    task.id,
-                    task.title,
-                    task.description,
-                    task.status
-                ))
-                
-                # Apply different styles based on status
-                if task.status == "Completed":
-                    self.tree.item(item_id, tags=("completed",))
-                elif task.status == "In Progress":
-                    self.tree.item(item_id, tags=("in_progress",))
-            
-            # Configure tag styles
-            self.tree.tag_configure("completed", background="#e8f0fe")
-            self.tree.tag_configure("in_progress", background="#fff8e1")
-            
-            self.status_var.set(f"Found {len(response.tasks)} task(s)")
-            
-        except grpc.RpcError as e:
+        # Asking again while a reload is running joins that reload
+        if self.executor.in_flight("list"):
+            return
+        self.status_var.set("Retrieving tasks...")
+        request = self.cache.begin_refresh()
+        first_page = True
+        
+        def on_page(page):
+            # The server sends only the changes since the cached revision
+            # when it can, otherwise the full list chunk by chunk
+            nonlocal first_page
+            self.cache.apply_page(page)
+            if first_page and not page.delta and not page.not_modified:
+                self.model.replace_all(page.tasks)
+            else:
+                self.model.extend(page.tasks)
+            for task_id in page.deleted_ids:
+                self.model.remove(task_id)
+            first_page = False
+            self.view.render()
+            self.status_var.set(f"Retrieving tasks... {self.model.total} so far")
+        
+        def on_done():
+            self.cache.finish_refresh()
+            if not self.watching:
+                # Follow changes from the revision just loaded instead of
+                # re-downloading every task after each edit
+                self.watching = True
+                threading.Thread(target=self.watch_tasks, args=(self.cache.revision,), daemon=True).start()
+            self.status_var.set(f"Showing {len(self.model)} of {self.model.total} task(s)")
+            self.milestone("listed")
+        
+        def on_error(e):
+            self.cache.finish_refresh(complete=False)
+            self.rpc_error("Failed to list tasks")(e)
+        
+        self.executor.stream(self.client.StreamTasks, request, on_item=on_page, on_done=on_done,
+                             on_error=on_error, key="list")
+
+    def refresh_after_write(self):
+        # Without WatchTasks no change event will show the write
+        if not self.watch_supported:
+            self.list_tasks()
+
+    def rpc_error(self, message):
+        def on_error(e):
             self.status_var.set(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"Failed to list tasks: {str(e)}")
+            messagebox.showerror("Error", f"{message}: {str(e)}")
+        return on_error
+
+    def write_error(self, message, task_id):
+        # A version conflict means someone else changed the task after it
+        # was loaded into the form: show their version instead of failing
+        show_error = self.rpc_error(message)
+
+        def on_error(e):
+            if not (isinstance(e, grpc.RpcError) and e.code() == grpc.StatusCode.ABORTED):
+                show_error(e)
+                return
+            self.status_var.set("Task was changed by someone else")
+            messagebox.showwarning(
+                "Conflict",
+                f"{message}: the task was changed by someone else. Its latest version is now shown; "
+                "review it and try again."
+            )
+
+            def reload(response):
+                self.cache.tasks[task_id] = response.task
+                self.model.upsert(response.task)
+                self.view.render()
+                self.view.see(task_id)
+                self.on_tree_select(self.model.get(task_id))
+
+            self.executor.call(self.client.GetTask, taskmanager_pb2.TaskRequest(taskId=task_id),
+                               on_done=reload, on_error=show_error)
+        return on_error
+
+    def status_tags(self, status):
+        # Apply different styles based on status
+        if status == "Completed":
+            return ("completed",)
+        elif status == "In Progress":
+            return ("in_progress",)
+        return ()
+
+    def watch_tasks(self, since_revision):
+        # Runs on a background thread; it only hands events to the Tk thread
+        # through self.events and never touches widgets itself.
+        while True:
+            try:
+                request = taskmanager_pb2.WatchTasksRequest(since_revision=since_revision)
+                for event in self.client.WatchTasks(request):
+                    self.events.put(event)
+                    # Events of one batch share a revision; resuming just
+                    # before it replays them harmlessly if the stream broke
+                    # halfway through a batch
+                    since_revision = event.revision - 1
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.CANCELLED:
+                    return  # Channel closed on exit
+                if e.code() == grpc.StatusCode.OUT_OF_RANGE:
+                    # Missed changes can't be replayed; the reload starts a
+                    # new watch from the revision it reads
+                    self.events.put(None)
+                    return
+                if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                    # e.g. the sharding router; writes reload the list instead
+                    self.watch_supported = False
+                    return
+            except ValueError:
+                return  # Channel closed on exit
+            time.sleep(1)
+
+    def process_events(self):
+        reload = False
+        changed = False
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event is None:
+                    reload = True
+                else:
+                    self.apply_event(event)
+                    changed = True
+        except queue.Empty:
+            pass
+        
+        if reload:
+            self.watching = False
+            self.list_tasks()
+        elif changed:
+            self.view.render()
+            if self.search_var.get().strip():
+                # Changes can add or reorder matches, so search again
+                self.filter_tasks()
+        self.root.after(100, self.process_events)
+
+    def apply_event(self, event):
+        self.cache.apply_event(event)
+        if event.type == taskmanager_pb2.TaskEvent.DELETED:
+            self.model.remove(event.task.id)
+        else:
+            # The model's filter decides whether the task is shown
+            self.model.upsert(event.task)
 
     def run(self):
         try:
             self.root.mainloop()
         finally:
-            if hasattr(self, 'channel'):
-                self.channel.close()
+            if hasattr(self, 'executor'):
+                self.executor.shutdown()
+            if hasattr(self, 'cache'):
+                try:
+                    self.cache.save()
+                except OSError as e:
+                    print(f"Could not save the task cache: {str(e)}")
+            if self.connecting is not None:
+                self.connecting.cancel()
+            if hasattr(self, 'client'):
+                self.client.close()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,11 @@
+"""Python implementation of the TaskManager gRPC service."""
+import os
+import sys
+
+# The generated modules import each other as top-level modules, so put
+# generated/python on the path the same way main.py does.
+_generated_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'generated', 'python'
+)
+if _generated_path not in sys.path:
+    sys.path.append(_generated_path)
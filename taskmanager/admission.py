@@ -0,0 +1,343 @@
+"""Admission control: concurrency limits and load shedding for the server.
+
+A grpc.aio server runs every handler on one event loop and only takes the
+next call off the connection between handler steps. A burst of ListTasks
+calls (each building and serializing the whole list) keeps the loop busy,
+new calls pile up unseen inside gRPC, and GetTask latency climbs with
+them. AdmissionInterceptor sheds that load early:
+
+- a call whose deadline has already passed, having waited in gRPC's
+  queue or in one of ours, is dropped with DEADLINE_EXCEEDED rather than
+  run for a client that has given up;
+- how late the event loop runs callbacks (LoopMonitor) measures how long
+  calls wait before a handler sees them. Above SHED_DELAYS for their
+  priority, expensive calls (whole-list reads, search, batches) and then
+  single-task writes are rejected with RESOURCE_EXHAUSTED, which costs far
+  less than serving them; cheap point reads (GetTask) are never shed;
+- every call counts against a server-wide concurrency limit, and the
+  expensive methods against a limit of their own as well, which bounds
+  handlers that wait on I/O (streams, the router's shards, a replica's
+  writer). A call over a limit waits in a bounded queue, a call arriving
+  to a full queue is rejected with RESOURCE_EXHAUSTED, and the
+  server-wide queue lets GetTask in first, then writes, then expensive
+  calls; a cheaper call arriving to a full queue takes the place of the
+  newest more expensive one. WatchTasks streams, which stay open, are not
+  limited;
+- limits adapt (AIMD) while at least half in use: a limit starts at its
+  maximum, is cut by BACKOFF when the loop runs late or calls take more
+  than LATENCY_TOLERANCE times their method's lowest recent latency (plus
+  LATENCY_SLACK), and grows back by one per limit's worth of calls that
+  finish in time.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+import grpc
+
+# Lower goes first
+CHEAP, NORMAL, EXPENSIVE = 0, 1, 2
+PRIORITIES = {
+    'GetTask': CHEAP,
+    'AddTask': NORMAL,
+    'UpdateTask': NORMAL,
+    'DeleteTask': NORMAL,
+}
+UNLIMITED_METHODS = ('WatchTasks',)
+# priority: event loop delay in seconds above which its calls are rejected
+SHED_DELAYS = {NORMAL: 0.2, EXPENSIVE: 0.05}
+LOOP_PROBE_INTERVAL = 0.01
+# Weight of the previous estimate when the loop delay falls
+LOOP_DELAY_DECAY = 0.8
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_MAX_QUEUE = 256
+# method: (concurrency limit, queue cap) on top of the server-wide limit
+DEFAULT_METHOD_LIMITS = {
+    'ListTasks': (4, 32),
+    'StreamTasks': (4, 32),
+    'QueryTasks': (8, 64),
+    'SearchTasks': (8, 64),
+    'BatchAddTasks': (4, 32),
+    'BatchUpdateTasks': (4, 32),
+    'BatchDeleteTasks': (4, 32),
+    'ImportTasks': (2, 8),
+}
+MIN_LIMIT = 1
+BACKOFF = 0.9
+LATENCY_TOLERANCE = 2.0
+LATENCY_SLACK = 0.005
+# Samples per window of the latency baseline
+BASELINE_WINDOW = 200
+
+
+class Rejected(Exception):
+    """A call was turned away; code is the grpc.StatusCode to end it with."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def parse_method_limit(text):
+    """Parse "ListTasks=4:32" into ('ListTasks', (4, 32)); the queue cap is optional."""
+    method, _, value = text.partition('=')
+    limit, _, queue = value.partition(':')
+    return method.strip(), (int(limit), int(queue or DEFAULT_MAX_QUEUE))
+
+
+class LoopMonitor:
+    """How late the event loop runs callbacks, sampled every LOOP_PROBE_INTERVAL.
+
+    delay follows a rise at once and a fall gradually, so a burst keeps
+    being shed until the loop has caught up.
+    """
+
+    def __init__(self):
+        self.delay = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._probe())
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + LOOP_PROBE_INTERVAL
+            await asyncio.sleep(LOOP_PROBE_INTERVAL)
+            late = loop.time() - due
+            self.delay = late if late > self.delay else self.delay * LOOP_DELAY_DECAY + late * (1 - LOOP_DELAY_DECAY)
+
+
+class Baseline:
+    """The lowest recent latency of a method, to tell when calls slow down."""
+
+    def __init__(self):
+        self.lowest = math.inf
+        self._window_lowest = math.inf
+        self._samples = 0
+
+    def slow(self, latency):
+        """Record latency; True when it is well above the baseline."""
+        self._window_lowest = min(self._window_lowest, latency)
+        self._samples += 1
+        if self._samples >= BASELINE_WINDOW:
+            # Start over each window so the baseline can rise again
+            self.lowest = self._window_lowest
+            self._window_lowest = math.inf
+            self._samples = 0
+        lowest = min(self.lowest, self._window_lowest)
+        return latency > lowest * LATENCY_TOLERANCE + LATENCY_SLACK
+
+
+class Limiter:
+    """A concurrency limit with a bounded priority queue of waiting calls."""
+
+    def __init__(self, name, max_limit, max_queue, adaptive=True):
+        self.name = name
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.max_queue = max_queue
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.expired = 0
+        self.shed = 0
+        # [priority, sequence, future]; entries whose future is done are stale
+        self._queue = []
+        self._sequence = itertools.count()
+        self._last_cut = 0.0
+
+    async def acquire(self, priority, timeout):
+        """Wait for a slot; raises Rejected if the queue is full or timeout passes first."""
+        if self.in_flight < self.limit and not self.waiting:
+            self.in_flight += 1
+            return
+        if self.waiting >= self.max_queue and not self._evict(priority):
+            self.rejected += 1
+            raise Rejected(grpc.StatusCode.RESOURCE_EXHAUSTED, f'Server overloaded: {self.name} queue is full')
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [priority, next(self._sequence), future])
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            self.expired += 1
+            raise Rejected(grpc.StatusCode.DEADLINE_EXCEEDED, f'Deadline exceeded waiting for {self.name}')
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+
+    def _abandon(self, future):
+        if not future.done():
+            future.cancel()
+            self.waiting -= 1
+        elif not future.cancelled() and future.exception() is None:
+            # Granted a slot just as the wait ended; pass it on
+            self.release()
+
+    def _evict(self, priority):
+        """Reject the newest waiting call of lower priority than priority, if any."""
+        worst = None
+        for entry in self._queue:
+            if not entry[2].done() and (worst is None or entry[:2] > worst[:2]):
+                worst = entry
+        if worst is None or worst[0] <= priority:
+            return False
+        worst[2].set_exception(Rejected(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                        f'Server overloaded: {self.name} queue is full'))
+        self.waiting -= 1
+        self.rejected += 1
+        return True
+
+    def release(self, latency=None, slow=None):
+        """Free a slot taken by acquire; latency and slow, when given, adapt the limit."""
+        if self.adaptive and slow is not None:
+            self._adapt(latency, slow)
+        self.in_flight -= 1
+        while self.waiting and self.in_flight < self.limit:
+            future = heapq.heappop(self._queue)[2]
+            if future.done():
+                continue
+            self.waiting -= 1
+            self.in_flight += 1
+            future.set_result(None)
+        if not self.waiting:
+            self._queue.clear()
+
+    def _adapt(self, latency, slow):
+        # Slow calls with the limit far from reached aren't slow for lack of it
+        if self.in_flight < self.limit / 2:
+            return
+        if not slow:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            return
+        now = time.monotonic()
+        # One cut per burst of slow calls: they were all in flight together
+        if now - self._last_cut >= latency:
+            self._last_cut = now
+            self.limit = max(MIN_LIMIT, self.limit * BACKOFF)
+
+
+class AdmissionInterceptor(grpc.aio.ServerInterceptor):
+    """Limits how many calls run at once, per method and server-wide.
+
+    method_limits ({method: (limit, queue cap)}) are merged over
+    DEFAULT_METHOD_LIMITS; a limit of 0 removes a method's own limit.
+    adaptive=False keeps every limit at its maximum.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE, method_limits=None,
+                 adaptive=True):
+        self.server = Limiter('server', max_concurrency, max_queue, adaptive)
+        limits = {**DEFAULT_METHOD_LIMITS, **(method_limits or {})}
+        self.methods = {method: Limiter(method, limit, queue, adaptive)
+                        for method, (limit, queue) in limits.items() if limit}
+        self.loop = LoopMonitor()
+        self._baselines = {}
+        # method -> (original handler, wrapped handler)
+        self._handlers = {}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        self.loop.start()
+        full_method = handler_call_details.method
+        method = full_method.rpartition('/')[2]
+        if method in UNLIMITED_METHODS:
+            return handler
+        cached = self._handlers.get(full_method)
+        if cached is None or cached[0] is not handler:
+            cached = self._handlers[full_method] = (handler, self._wrap(handler, method))
+        return cached[1]
+
+    def _wrap(self, handler, method):
+        kind = ('unary_unary' if handler.unary_unary else 'stream_unary' if handler.stream_unary
+                else 'unary_stream' if handler.unary_stream else 'stream_stream')
+        behavior = getattr(handler, kind)
+        limiters = [self.methods[method], self.server] if method in self.methods else [self.server]
+        priority = PRIORITIES.get(method, EXPENSIVE)
+        shed_delay = SHED_DELAYS.get(priority)
+        baseline = self._baselines.setdefault(method, Baseline())
+        loop = self.loop
+
+        async def admit(context):
+            if shed_delay is not None and loop.delay > shed_delay:
+                limiters[0].shed += 1
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f'Server overloaded; {method} shed')
+            taken = []
+            try:
+                for limiter in limiters:
+                    remaining = context.time_remaining()
+                    if remaining is not None and remaining <= 0:
+                        limiter.expired += 1
+                        raise Rejected(grpc.StatusCode.DEADLINE_EXCEEDED,
+                                       f'Deadline exceeded waiting for {limiter.name}')
+                    await limiter.acquire(priority, remaining)
+                    taken.append(limiter)
+            except Rejected as e:
+                for limiter in taken:
+                    limiter.release()
+                await context.abort(e.code, str(e))
+            except BaseException:
+                for limiter in taken:
+                    limiter.release()
+                raise
+
+        def finish(started):
+            # Only unary calls adapt the limits: a stream's duration depends on its reader
+            if started is None:
+                for limiter in limiters:
+                    limiter.release()
+                return
+            latency = time.perf_counter() - started
+            slow = baseline.slow(latency) or loop.delay > SHED_DELAYS[EXPENSIVE]
+            for limiter in limiters:
+                limiter.release(latency, slow)
+
+        if kind.endswith('unary'):
+            async def wrapped(request, context):
+                await admit(context)
+                started = time.perf_counter() if kind == 'unary_unary' else None
+                try:
+                    return await behavior(request, context)
+                finally:
+                    finish(started)
+        else:
+            async def wrapped(request, context):
+                await admit(context)
+                try:
+                    async for response in behavior(request, context):
+                        yield response
+                finally:
+                    finish(None)
+
+        return handler._replace(**{kind: wrapped})
+
+    def render(self):
+        """Limiter state in the Prometheus text format, for serve_metrics()."""
+        limiters = [self.server, *self.methods.values()]
+        lines = []
+        for name, kind, help_text, value in (
+                ('limit', 'gauge', 'Current concurrency limit.', lambda limiter: int(limiter.limit)),
+                ('in_flight', 'gauge', 'Calls running.', lambda limiter: limiter.in_flight),
+                ('waiting', 'gauge', 'Calls queued for a slot.', lambda limiter: limiter.waiting),
+                ('rejected_total', 'counter', 'Calls rejected with RESOURCE_EXHAUSTED because the queue was full.',
+                 lambda limiter: limiter.rejected),
+                ('shed_total', 'counter', 'Calls rejected with RESOURCE_EXHAUSTED because the event loop ran late.',
+                 lambda limiter: limiter.shed),
+                ('expired_total', 'counter', 'Calls dropped because their deadline passed while queued.',
+                 lambda limiter: limiter.expired)):
+            lines.append(f'# HELP taskmanager_admission_{name} {help_text}')
+            lines.append(f'# TYPE taskmanager_admission_{name} {kind}')
+            for limiter in limiters:
+                lines.append(f'taskmanager_admission_{name}{{limiter="{limiter.name}"}} {value(limiter)}')
+        lines.append('# HELP taskmanager_admission_loop_delay_seconds How late the event loop runs callbacks.')
+        lines.append('# TYPE taskmanager_admission_loop_delay_seconds gauge')
+        lines.append(f'taskmanager_admission_loop_delay_seconds {self.loop.delay!r}')
+        return '\n'.join(lines) + '\n'
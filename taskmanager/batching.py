@@ -0,0 +1,91 @@
+"""Client helpers that send many task mutations as batch RPCs."""
+import itertools
+
+import taskmanager_pb2
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class TaskBatcher:
+    """Buffers add/update/delete calls and sends them as batch RPCs.
+
+    Works with a blocking TaskManagerStub. Consecutive calls of the same kind
+    are buffered and sent together when the buffer reaches batch_size, when
+    a call of a different kind arrives (so operations keep their order), on
+    flush(), or on leaving a with block.
+    """
+
+    def __init__(self, stub, batch_size=DEFAULT_BATCH_SIZE, timeout=None):
+        self.stub = stub
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.succeeded = 0
+        self.failed = 0
+        self.failures = []
+        self._kind = None
+        self._pending = []
+
+    def add(self, task):
+        self._buffer('add', task)
+
+    def update(self, task_id, task):
+        self._buffer('update', taskmanager_pb2.UpdateTaskRequest(taskId=task_id, task=task))
+
+    def delete(self, task_id):
+        self._buffer('delete', task_id)
+
+    def _buffer(self, kind, item):
+        if kind != self._kind:
+            self.flush()
+            self._kind = kind
+        self._pending.append(item)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send whatever is buffered; returns the BatchResponse or None."""
+        if not self._pending:
+            return None
+        kind, items = self._kind, self._pending
+        self._pending = []
+        if kind == 'add':
+            response = self.stub.BatchAddTasks(
+                taskmanager_pb2.BatchAddTasksRequest(tasks=items), timeout=self.timeout)
+        elif kind == 'update':
+            response = self.stub.BatchUpdateTasks(
+                taskmanager_pb2.BatchUpdateTasksRequest(requests=items), timeout=self.timeout)
+        else:
+            response = self.stub.BatchDeleteTasks(
+                taskmanager_pb2.BatchDeleteTasksRequest(taskIds=items), timeout=self.timeout)
+        self.succeeded += response.succeeded
+        self.failed += response.failed
+        for result in response.results:
+            if not result.success:
+                self.failures.append((kind, items[result.index], result.message))
+        return response
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_tasks(stub, tasks, batch_size=DEFAULT_BATCH_SIZE, timeout=None):
+    """Stream any iterable of Task messages through ImportTasks.
+
+    tasks is consumed lazily, so arbitrarily large imports use constant
+    memory on the client. Returns the server's BatchResponse summary.
+    """
+    requests = (taskmanager_pb2.BatchAddTasksRequest(tasks=chunk) for chunk in chunked(tasks, batch_size))
+    return stub.ImportTasks(requests, timeout=timeout)
@@ -0,0 +1,437 @@
+"""Bulk import and export of tasks over the TaskManager service.
+
+Run with: python -m taskmanager.bulk import tasks.json
+          python -m taskmanager.bulk import tasks.jsonl --field description=body
+          python -m taskmanager.bulk export backup.jsonl
+
+Import reads a JSONL file (one task object per line) or a JSON file (a
+tasks.json map of id -> task, or an array of tasks) a piece at a time and
+streams it through ImportTasks. The file is cut into segments of
+--segment tasks, each sent as one ImportTasks call in chunks of --chunk,
+with at most --window calls in flight, so memory stays bounded however
+big the file is. After each segment the number of tasks known to be
+imported is saved to a checkpoint file next to the source; an interrupted
+import run again resumes from there, and the checkpoint is removed once
+the import completes. Tasks without an id are given one derived from the
+checkpoint and their position in the file, so tasks sent again on resuming
+are reported as already existing instead of being added twice. Imported
+tasks keep their createdAt.
+
+Export streams the store into a JSONL file, or a JSON file in the
+tasks.json layout, in rounds of StreamTasks pages, writing each task as
+it arrives. Tasks added or changed during an export may or may not be in
+it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+import grpc
+
+from taskmanager.batching import DEFAULT_BATCH_SIZE, chunked
+from taskmanager.client import DEFAULT_TARGET, AsyncClient
+from taskmanager.store import TASK_FIELDS, task_to_dict
+
+import taskmanager_pb2
+
+DEFAULT_SEGMENT_SIZE = 20000
+# One call in flight already overlaps reading the next segment with sending
+# this one; more mostly compete for the server's ImportTasks limit
+DEFAULT_WINDOW = 1
+# Tasks per StreamTasks call when exporting
+EXPORT_ROUND_SIZE = 50000
+READ_SIZE = 1 << 20
+# A segment or export round failing with these is sent again
+RETRY_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.RESOURCE_EXHAUSTED)
+ALREADY_EXISTS = grpc.StatusCode.ALREADY_EXISTS.value[0]
+MAX_ATTEMPTS = 10
+INITIAL_BACKOFF = 0.2
+MAX_BACKOFF = 5.0
+PROGRESS_INTERVAL = 2.0
+JSONL_SUFFIXES = ('.jsonl', '.ndjson')
+
+
+def is_jsonl(path):
+    return path.endswith(JSONL_SUFFIXES)
+
+
+def read_jsonl(path):
+    """Yield (key, object) for each non-blank line; key is always None."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield None, json.loads(line)
+
+
+def read_json(path):
+    """Yield (key, value) for the entries of a top-level JSON object or array.
+
+    Values are decoded one at a time from a bounded buffer, so the file is
+    never read whole. Array elements have key None.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        position = 0
+        eof = False
+
+        def skip(chars):
+            # Move past whitespace and the given separators; False at end of input
+            nonlocal buffer, position, eof
+            while True:
+                while position < len(buffer) and (buffer[position].isspace() or buffer[position] in chars):
+                    position += 1
+                if position < len(buffer) or eof:
+                    return position < len(buffer)
+                buffer = f.read(READ_SIZE)
+                position = 0
+                eof = not buffer
+
+        def decode():
+            nonlocal buffer, position, eof
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    more = f.read(READ_SIZE)
+                    eof = not more
+                    buffer = buffer[position:] + more
+                    position = 0
+                    continue
+                position = end
+                return value
+
+        if not skip(''):
+            return
+        opening = buffer[position]
+        if opening not in '{[':
+            raise ValueError(f'{path}: expected a JSON object or array of tasks')
+        position += 1
+        closing = '}' if opening == '{' else ']'
+        while skip(','):
+            if buffer[position] == closing:
+                return
+            key = None
+            if opening == '{':
+                key = decode()
+                skip(':')
+            yield key, decode()
+        raise ValueError(f'{path}: unexpected end of file')
+
+
+def task_from_entry(key, entry, fields):
+    """A Task message from a decoded entry; fields maps task fields to entry keys."""
+    values = {name: str(entry.get(fields.get(name, name)) or '') for name in TASK_FIELDS[:-1]}
+    # In a tasks.json map the key is the id
+    values['id'] = values['id'] or key or ''
+    return taskmanager_pb2.Task(**values)
+
+
+def parse_field(text):
+    """Parse "description=body" into ('description', 'body')."""
+    name, _, key = text.partition('=')
+    if name not in TASK_FIELDS[:-1] or not key:
+        raise ValueError(f'expected FIELD=KEY with FIELD one of {", ".join(TASK_FIELDS[:-1])}')
+    return name, key
+
+
+class Checkpoint:
+    """How much of a source file is imported, saved to path after each change."""
+
+    def __init__(self, path, source):
+        self.path = path
+        stat = os.stat(source)
+        self.source = {'path': os.path.abspath(source), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        self.run = str(uuid.uuid4())
+        self.done = 0
+        self.succeeded = 0
+        self.existing = 0
+        self.failed = 0
+
+    def load(self):
+        """Resume from the saved checkpoint, if any; returns whether there was one."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved['source'] != self.source:
+            raise ValueError(f'{self.path} is for another version of the source file; '
+                             'use --restart to import from the beginning')
+        for name in ('run', 'done', 'succeeded', 'existing', 'failed'):
+            setattr(self, name, saved[name])
+        return True
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({name: getattr(self, name) for name in
+                       ('source', 'run', 'done', 'succeeded', 'existing', 'failed')}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def send_segment(client, tasks, chunk_size, shed=None):
+    """Import tasks as one ImportTasks call, retrying on RETRY_CODES; returns the BatchResponse.
+
+    shed() is called whenever the server rejects the call as overloaded.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await client.ImportTasks(
+                taskmanager_pb2.BatchAddTasksRequest(tasks=chunk) for chunk in chunked(tasks, chunk_size)
+            )
+        except grpc.aio.AioRpcError as e:
+            if e.code() not in RETRY_CODES or attempt == MAX_ATTEMPTS - 1:
+                raise
+            if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED and shed is not None:
+                shed()
+            # Tasks already imported by the failed attempt come back as existing
+            await asyncio.sleep(min(MAX_BACKOFF, INITIAL_BACKOFF * 2 ** attempt))
+
+
+async def import_file(client, source, checkpoint, fields, segment_size=DEFAULT_SEGMENT_SIZE,
+                      chunk_size=DEFAULT_BATCH_SIZE, window=DEFAULT_WINDOW, progress=None):
+    """Import the tasks of source from checkpoint.done on; returns the failure messages."""
+    entries = read_jsonl(source) if is_jsonl(source) else read_json(source)
+    namespace = uuid.UUID(checkpoint.run)
+    failures = []
+    # start -> (end, BatchResponse) of segments finished ahead of checkpoint.done
+    finished = {}
+    in_flight = set()
+    # Calls allowed in flight: one fewer each time the server sheds a segment
+    # (admission control sheds bulk calls while the server is busy, and
+    # that includes our own other segments), one more per segment that
+    # gets through, up to window
+    limit = window
+
+    def shed():
+        nonlocal limit
+        limit = max(1, limit - 1)
+
+    async def run(start, tasks):
+        nonlocal limit
+        response = await send_segment(client, tasks, chunk_size, shed)
+        limit = min(window, limit + 1)
+        return start, start + len(tasks), response
+
+    def record(start, end, response):
+        for result in response.results:
+            if result.code == ALREADY_EXISTS:
+                checkpoint.existing += 1
+            else:
+                checkpoint.failed += 1
+                failures.append(f'task {start + result.index}: {result.message}')
+        checkpoint.succeeded += response.succeeded
+        finished[start] = end
+        advanced = False
+        while checkpoint.done in finished:
+            checkpoint.done = finished.pop(checkpoint.done)
+            advanced = True
+        if advanced:
+            checkpoint.save()
+
+    async def wait(return_when):
+        done, _ = await asyncio.wait(in_flight, return_when=return_when)
+        for segment in done:
+            in_flight.discard(segment)
+            record(*segment.result())
+            if progress is not None:
+                progress(checkpoint)
+
+    async def submit(start, tasks):
+        while len(in_flight) >= limit:
+            await wait(asyncio.FIRST_COMPLETED)
+        in_flight.add(asyncio.ensure_future(run(start, tasks)))
+
+    try:
+        start = checkpoint.done
+        tasks = []
+        for index, (key, entry) in enumerate(entries):
+            if index < checkpoint.done:
+                continue
+            task = task_from_entry(key, entry, fields)
+            if not task.id:
+                task.id = str(uuid.uuid5(namespace, str(index)))
+            tasks.append(task)
+            if len(tasks) == segment_size:
+                await submit(start, tasks)
+                start += len(tasks)
+                tasks = []
+        if tasks:
+            await submit(start, tasks)
+        if in_flight:
+            await wait(asyncio.ALL_COMPLETED)
+    finally:
+        for segment in in_flight:
+            segment.cancel()
+    return failures
+
+
+class JsonlWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, task):
+        self.f.write(json.dumps(task_to_dict(task), ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def mark(self):
+        return self.f.tell(), None
+
+    def rewind(self, mark):
+        self.f.seek(mark[0])
+        self.f.truncate()
+
+    def close(self):
+        pass
+
+
+class JsonMapWriter:
+    """Writes a tasks.json map of id -> task, one entry per line."""
+
+    def __init__(self, f):
+        self.f = f
+        self.first = True
+        f.write(b'{')
+
+    def write(self, task):
+        entry = json.dumps(task.id, ensure_ascii=False) + ': ' + json.dumps(task_to_dict(task), ensure_ascii=False)
+        self.f.write((b'\n  ' if self.first else b',\n  ') + entry.encode('utf-8'))
+        self.first = False
+
+    def mark(self):
+        return self.f.tell(), self.first
+
+    def rewind(self, mark):
+        self.f.seek(mark[0])
+        self.f.truncate()
+        self.first = mark[1]
+
+    def close(self):
+        self.f.write(b'\n}\n')
+
+
+async def export_file(client, destination, round_size=EXPORT_ROUND_SIZE, progress=None):
+    """Stream every task into destination; returns how many were written."""
+    tmp_path = destination + '.tmp'
+    count = 0
+    # Binary, so tell() and truncate() work on plain byte offsets
+    with open(tmp_path, 'wb') as f:
+        writer = JsonlWriter(f) if is_jsonl(destination) else JsonMapWriter(f)
+        token = ''
+        while True:
+            mark, written = writer.mark(), count
+            for attempt in range(MAX_ATTEMPTS):
+                try:
+                    next_token = ''
+                    request = taskmanager_pb2.ListTasksRequest(page_size=round_size, page_token=token)
+                    async for page in client.StreamTasks(request):
+                        for task in page.tasks:
+                            writer.write(task)
+                        count += len(page.tasks)
+                        next_token = page.next_page_token or next_token
+                    break
+                except grpc.aio.AioRpcError as e:
+                    if e.code() not in RETRY_CODES or attempt == MAX_ATTEMPTS - 1:
+                        raise
+                    # Write the round again from its start
+                    writer.rewind(mark)
+                    count = written
+                    await asyncio.sleep(min(MAX_BACKOFF, INITIAL_BACKOFF * 2 ** attempt))
+            if progress is not None:
+                progress(count)
+            if not next_token:
+                break
+            token = next_token
+        writer.close()
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, destination)
+    return count
+
+
+class Progress:
+    """Prints a line to stderr at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, verb, start_count=0):
+        self.verb = verb
+        self.started = time.perf_counter()
+        self.start_count = start_count
+        self.last = self.started
+
+    def __call__(self, count, final=False):
+        now = time.perf_counter()
+        if not final and now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        rate = (count - self.start_count) / (now - self.started) if now > self.started else 0
+        print(f'{self.verb} {count} tasks ({rate:.0f}/s)', file=sys.stderr)
+
+
+async def run_import(args):
+    checkpoint = Checkpoint(args.checkpoint or args.file + '.checkpoint', args.file)
+    if args.restart:
+        checkpoint.remove()
+    elif checkpoint.load():
+        print(f'Resuming after task {checkpoint.done} from {checkpoint.path}', file=sys.stderr)
+    progress = Progress('Imported', checkpoint.done)
+    async with AsyncClient(args.target, pool_size=1, hedge_delay=None) as client:
+        failures = await import_file(client, args.file, checkpoint, dict(args.field), args.segment, args.chunk,
+                                     args.window, lambda state: progress(state.done))
+    progress(checkpoint.done, final=True)
+    checkpoint.remove()
+    for failure in failures[:10]:
+        print(failure, file=sys.stderr)
+    if len(failures) > 10:
+        print(f'... and {len(failures) - 10} more failures', file=sys.stderr)
+    print(f'{checkpoint.succeeded} added, {checkpoint.existing} already present, {checkpoint.failed} failed')
+    return 1 if checkpoint.failed else 0
+
+
+async def run_export(args):
+    progress = Progress('Exported')
+    async with AsyncClient(args.target, pool_size=1, hedge_delay=None) as client:
+        count = await export_file(client, args.file, args.round, progress)
+    progress(count, final=True)
+    print(f'{count} tasks written to {args.file}')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import and export of tasks')
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('file', help='JSONL (.jsonl, .ndjson) or JSON file to read or write')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='host:port of the server')
+    parser.add_argument('--field', type=parse_field, action='append', default=[], metavar='FIELD=KEY',
+                        help='import: read a task field from another key, e.g. description=body')
+    parser.add_argument('--segment', type=int, default=DEFAULT_SEGMENT_SIZE,
+                        help='import: tasks per ImportTasks call, and per checkpoint')
+    parser.add_argument('--chunk', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='import: tasks per streamed message, each stored as one batch')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help='import: ImportTasks calls in flight')
+    parser.add_argument('--checkpoint', help='import: checkpoint file (default: FILE.checkpoint)')
+    parser.add_argument('--restart', action='store_true', help='import: ignore an existing checkpoint')
+    parser.add_argument('--round', type=int, default=EXPORT_ROUND_SIZE,
+                        help='export: tasks per StreamTasks call; a failed call is retried from its start')
+    args = parser.parse_args()
+
+    try:
+        sys.exit(asyncio.run(run_import(args) if args.command == 'import' else run_export(args)))
+    except (OSError, ValueError) as e:
+        parser.exit(1, f'{parser.prog}: {e}\n')
+    except grpc.aio.AioRpcError as e:
+        parser.exit(1, f'{parser.prog}: {e.code().name}: {e.details()}\n')
+    except KeyboardInterrupt:
+        parser.exit(130, 'Interrupted; run the same import again to resume\n' if args.command == 'import' else '')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Client-side task cache kept current by store revision."""
+import os
+
+from google.protobuf.message import DecodeError
+
+import taskmanager_pb2
+
+
+class TaskCache:
+    """Tasks by id as of revision, optionally persisted to path.
+
+    Refresh with StreamTasks(begin_refresh()), hand every page in order to
+    apply_page() and then call finish_refresh(). The server only sends what
+    changed since revision (or a single not_modified page), and the full
+    list only when its change history no longer reaches back that far.
+    revision only advances once a refresh was received completely, so an
+    interrupted one is simply asked for again. Events from a WatchTasks
+    stream started at revision can be applied with apply_event().
+
+    The file is a serialized TaskList, so a client can start from its last
+    known state before the server answers.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.tasks = {}
+        self.revision = 0
+        self._refreshing = False
+        self._pending_revision = None
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def load(self):
+        """Read the cache file; returns False (and stays empty) if there is none."""
+        if not self.path:
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                cached = taskmanager_pb2.TaskList.FromString(f.read())
+        except (OSError, DecodeError):
+            return False
+        self.tasks = {task.id: task for task in cached.tasks}
+        self.revision = cached.revision
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+        data = taskmanager_pb2.TaskList(tasks=self.tasks.values(), revision=self.revision).SerializeToString()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def begin_refresh(self):
+        """Return the StreamTasks request for revalidating the cache."""
+        self._refreshing = True
+        self._pending_revision = None
+        return taskmanager_pb2.ListTasksRequest(if_changed_since=self.revision)
+
+    def apply_page(self, page):
+        if self._pending_revision is None:
+            self._pending_revision = page.revision
+            if not page.delta and not page.not_modified:
+                # A full listing replaces everything; until it is complete
+                # the cache can't be revalidated from any revision
+                self.tasks = {}
+                self.revision = 0
+        for task in page.tasks:
+            self.tasks[task.id] = task
+        for task_id in page.deleted_ids:
+            self.tasks.pop(task_id, None)
+
+    def finish_refresh(self, complete=True):
+        if complete and self._pending_revision is not None:
+            self.revision = max(self.revision, self._pending_revision)
+        self._refreshing = False
+        self._pending_revision = None
+
+    def apply_event(self, event):
+        if event.type == taskmanager_pb2.TaskEvent.DELETED:
+            self.tasks.pop(event.task.id, None)
+        else:
+            self.tasks[event.task.id] = event.task
+        if not self._refreshing and self.revision:
+            self.revision = max(self.revision, event.revision)
@@ -0,0 +1,134 @@
+"""Change events for WatchTasks subscribers."""
+import asyncio
+import collections
+
+ADDED = 'added'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+DEFAULT_HISTORY_SIZE = 10000
+DEFAULT_QUEUE_SIZE = 1000
+
+# last is set on the final event of its revision (a batch publishes several)
+ChangeEvent = collections.namedtuple('ChangeEvent', 'revision kind task last')
+
+
+class RevisionUnavailableError(Exception):
+    """The requested revision is outside the retained history."""
+
+
+class WatcherOverflowError(Exception):
+    """A watcher fell too far behind and was dropped."""
+
+
+class Watcher:
+    """Async iterator over the events after a revision.
+
+    Use as a context manager so the subscription is removed when the
+    consumer goes away.
+    """
+
+    def __init__(self, feed, backlog, queue_size):
+        self._feed = feed
+        self._backlog = collections.deque(backlog)
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        # Set on overflow: the last revision whose events were all queued
+        self._limit = None
+
+    def _push(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Rather than buffer without bound for a slow consumer, drop it
+            # once the queued events are consumed; the client can resume
+            # from the last revision it saw.
+            self._limit = event.revision - 1
+            self._feed.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._backlog:
+            return self._backlog.popleft()
+        if self._limit is None:
+            return await self._queue.get()
+        if not self._queue.empty():
+            event = self._queue.get_nowait()
+            if event.revision <= self._limit:
+                return event
+        raise WatcherOverflowError()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """Recent change history plus live fan-out to watchers.
+
+    Events are published in revision order. History is bounded; floor is
+    the newest revision whose events may no longer all be retained, so a
+    watch can resume from any revision >= floor.
+    """
+
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE, queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.floor = 0
+        self.revision = 0
+        self._history = collections.deque(maxlen=history_size)
+        self._watchers = set()
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call listener(revision, changes) synchronously on every publish.
+
+        changes is None on reset(), when anything may have changed.
+        """
+        self._listeners.append(listener)
+
+    def reset(self, revision):
+        """Start a fresh history at revision, e.g. after loading the store."""
+        self.floor = self.revision = revision
+        self._history.clear()
+        for listener in self._listeners:
+            listener(revision, None)
+
+    def publish(self, revision, changes):
+        """Record (kind, task) changes made at revision and notify watchers."""
+        self.revision = revision
+        for listener in self._listeners:
+            listener(revision, changes)
+        for index, (kind, task) in enumerate(changes, 1):
+            if len(self._history) == self._history.maxlen:
+                self.floor = self._history[0].revision
+            event = ChangeEvent(revision, kind, task, index == len(changes))
+            self._history.append(event)
+            for watcher in list(self._watchers):
+                watcher._push(event)
+
+    def subscribe(self, since_revision=0):
+        if not since_revision:
+            since_revision = self.revision
+        if since_revision < self.floor or since_revision > self.revision:
+            raise RevisionUnavailableError(since_revision)
+        backlog = [event for event in self._history if event.revision > since_revision]
+        watcher = Watcher(self, backlog, self.queue_size)
+        self._watchers.add(watcher)
+        return watcher
+
+    def changes_since(self, since_revision):
+        """Return {task_id: latest ChangeEvent} for changes after since_revision."""
+        if since_revision < self.floor or since_revision > self.revision:
+            raise RevisionUnavailableError(since_revision)
+        latest = {}
+        for event in reversed(self._history):
+            if event.revision <= since_revision:
+                break
+            latest.setdefault(event.task.id, event)
+        return latest
+
+    def unsubscribe(self, watcher):
+        self._watchers.discard(watcher)
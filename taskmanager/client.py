@@ -0,0 +1,353 @@
+"""Client library for the TaskManager service.
+
+Client (blocking, used by main.py) and AsyncClient (grpc.aio, used by
+taskmanager.loadgen) have the methods of a TaskManagerStub, plus:
+
+- a pool of channels, each with its own connection, taken in turn per
+  call, so one HTTP/2 connection's stream limit doesn't cap concurrency;
+- keepalive pings, so a dead connection is noticed while idle instead of
+  failing the next call;
+- a service-config retry policy for the read-only methods: they are
+  retried on UNAVAILABLE, and unary reads wait for the channel to connect,
+  so a server restart delays them rather than failing them;
+- a default deadline on unary calls;
+- hedged GetTask: if an attempt hasn't answered within the hedge delay, a
+  second goes out on the next channel and the first answer wins. The delay
+  is fixed, or with AUTO the 95th percentile of recent GetTask latencies,
+  so about one call in twenty is hedged;
+- optional compression: requests of at least compression_min_bytes are
+  compressed with the channel's algorithm, and the server is asked (see
+  taskmanager.compression) to compress large responses with it. A call
+  can pass compression= to override the choice.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import json
+import threading
+import time
+
+import grpc
+
+from taskmanager.compression import ALGORITHMS, DEFAULT_MIN_BYTES, accept_encoding_metadata, message_size
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+DEFAULT_TARGET = 'localhost:50051'
+DEFAULT_POOL_SIZE = 2
+DEFAULT_TIMEOUT = 10.0
+KEEPALIVE_TIME_MS = 30000
+KEEPALIVE_TIMEOUT_MS = 10000
+# Safe to retry and to hedge: they don't change anything
+READ_METHODS = ('GetTask', 'ListTasks', 'StreamTasks', 'QueryTasks', 'SearchTasks')
+RETRY_POLICY = {
+    'maxAttempts': 4,
+    'initialBackoff': '0.1s',
+    'maxBackoff': '2s',
+    'backoffMultiplier': 2,
+    'retryableStatusCodes': ['UNAVAILABLE'],
+}
+AUTO = 'auto'
+HEDGE_PERCENTILE = 95
+HEDGE_WINDOW = 512
+# Recompute the automatic delay after this many new samples
+HEDGE_RECOMPUTE = 64
+INITIAL_HEDGE_DELAY = 0.05
+MIN_HEDGE_DELAY = 0.001
+# An attempt failing with these leaves the other attempt to answer
+HEDGE_CODES = (grpc.StatusCode.UNAVAILABLE,)
+
+_SERVICE = taskmanager_pb2.DESCRIPTOR.services_by_name['TaskManager']
+
+
+def service_config(retries=True):
+    config = {}
+    if retries:
+        config['methodConfig'] = [{
+            'name': [{'service': _SERVICE.full_name, 'method': name} for name in READ_METHODS],
+            'retryPolicy': RETRY_POLICY,
+        }]
+        # Stop retrying when most calls fail, so retries can't pile onto an
+        # overloaded server
+        config['retryThrottling'] = {'maxTokens': 10, 'tokenRatio': 0.1}
+    return json.dumps(config)
+
+
+def channel_options(keepalive=True, retries=True):
+    """Channel arguments for the pool's channels."""
+    options = [
+        # Without this, channels to the same target share one connection
+        ('grpc.use_local_subchannel_pool', 1),
+        ('grpc.service_config', service_config(retries)),
+        ('grpc.enable_retries', int(retries)),
+    ]
+    if keepalive:
+        options += [
+            ('grpc.keepalive_time_ms', KEEPALIVE_TIME_MS),
+            ('grpc.keepalive_timeout_ms', KEEPALIVE_TIMEOUT_MS),
+            ('grpc.keepalive_permit_without_calls', 1),
+            ('grpc.http2.max_pings_without_data', 0),
+        ]
+    return options
+
+
+class HedgeDelay:
+    """How long GetTask waits before sending a second attempt.
+
+    delay is a number of seconds, or AUTO to follow the HEDGE_PERCENTILE
+    of recent latencies. sent and won count hedges and the ones that
+    answered first.
+    """
+
+    def __init__(self, delay=AUTO):
+        self.auto = delay == AUTO
+        self.delay = INITIAL_HEDGE_DELAY if self.auto else delay
+        self.sent = 0
+        self.won = 0
+        self._samples = collections.deque(maxlen=HEDGE_WINDOW)
+        self._added = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        if not self.auto:
+            return
+        with self._lock:
+            self._samples.append(seconds)
+            self._added += 1
+            if self._added % HEDGE_RECOMPUTE:
+                return
+            ordered = sorted(self._samples)
+        self.delay = max(MIN_HEDGE_DELAY, ordered[len(ordered) * HEDGE_PERCENTILE // 100])
+
+
+class _Method:
+    """A stub method called on the next channel of the pool."""
+
+    def __init__(self, client, name, unary, read, request_streaming=False):
+        self.client = client
+        self.name = name
+        self.unary = unary
+        self.wait = read and unary and client.retries
+        self.request_streaming = request_streaming
+
+    def _arguments(self, timeout, kwargs, request=None):
+        if timeout is None and self.unary:
+            timeout = self.client.timeout
+        if self.wait:
+            kwargs.setdefault('wait_for_ready', True)
+        self.client._compress(None if self.request_streaming else request, kwargs)
+        return timeout, kwargs
+
+    def __call__(self, request, timeout=None, **kwargs):
+        timeout, kwargs = self._arguments(timeout, kwargs, request)
+        return getattr(self.client._stub(), self.name)(request, timeout=timeout, **kwargs)
+
+    def future(self, request, timeout=None, **kwargs):
+        timeout, kwargs = self._arguments(timeout, kwargs, request)
+        return getattr(self.client._stub(), self.name).future(request, timeout=timeout, **kwargs)
+
+
+def remaining(deadline):
+    """Seconds left before a time.monotonic() deadline; None (no deadline) stays None."""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def channel_compression(compression):
+    """The grpc.Compression for an algorithm name from ALGORITHMS, or None."""
+    if compression is None:
+        return None
+    if compression not in ALGORITHMS:
+        raise ValueError(f'unknown compression {compression!r}; use one of {", ".join(ALGORITHMS)}')
+    return ALGORITHMS[compression]
+
+
+class _Pool:
+    def __init__(self, channels, timeout, hedge_delay, retries, compression, compression_min_bytes):
+        self.channels = channels
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = None if hedge_delay is None else HedgeDelay(hedge_delay)
+        self.compression = compression
+        self.compression_min_bytes = compression_min_bytes
+        self._accept = (accept_encoding_metadata((compression,)),) if compression else ()
+        self._stubs = [taskmanager_pb2_grpc.TaskManagerStub(channel) for channel in channels]
+        self._turn = itertools.count()
+        for method in _SERVICE.methods:
+            unary = not (method.client_streaming or method.server_streaming)
+            setattr(self, method.name, _Method(self, method.name, unary, method.name in READ_METHODS,
+                                               method.client_streaming))
+
+    def _stub(self):
+        return self._stubs[next(self._turn) % len(self._stubs)]
+
+    def _compress(self, request, kwargs):
+        """Ask for compressed responses, and leave small requests uncompressed."""
+        if not self.compression:
+            return
+        metadata = kwargs.get('metadata')
+        kwargs['metadata'] = self._accept if metadata is None else tuple(metadata) + self._accept
+        # Streamed requests (request None) use the channel's compression
+        if request is not None and 'compression' not in kwargs \
+                and message_size(request) < self.compression_min_bytes:
+            kwargs['compression'] = grpc.Compression.NoCompression
+
+
+class Client(_Pool):
+    """Blocking TaskManager client over a pool of channels.
+
+    Use it like a TaskManagerStub; method(request) and method.future(request)
+    work as on the stub. hedge_delay is seconds, AUTO, or None to not hedge.
+    compression is 'gzip', 'deflate' or None. interceptors wrap every
+    channel, e.g. metrics.ClientMetricsInterceptor.
+    """
+
+    def __init__(self, target=DEFAULT_TARGET, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 hedge_delay=AUTO, keepalive=True, retries=True, interceptors=(), compression=None,
+                 compression_min_bytes=DEFAULT_MIN_BYTES):
+        self._channels = [grpc.insecure_channel(target, options=channel_options(keepalive, retries),
+                                                compression=channel_compression(compression))
+                          for _ in range(pool_size)]
+        channels = [grpc.intercept_channel(channel, *interceptors) if interceptors else channel
+                    for channel in self._channels]
+        super().__init__(channels, timeout, hedge_delay, retries, compression, compression_min_bytes)
+        if self.hedge is not None:
+            self.GetTask = _HedgedGetTask(self)
+
+    def ready_future(self):
+        """A grpc.Future that completes once the first channel has connected."""
+        return grpc.channel_ready_future(self._channels[0])
+
+    def close(self):
+        for channel in self._channels:
+            channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _HedgedGetTask(_Method):
+    def __init__(self, client):
+        super().__init__(client, 'GetTask', True, True)
+
+    def __call__(self, request, timeout=None, **kwargs):
+        return self.future(request, timeout, **kwargs).result()
+
+    def future(self, request, timeout=None, **kwargs):
+        """A concurrent.futures.Future of the first answer; cancelling it cancels every attempt."""
+        timeout, kwargs = self._arguments(timeout, kwargs, request)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        hedge = self.client.hedge
+        result = concurrent.futures.Future()
+        lock = threading.Lock()
+        calls = []
+
+        def start():
+            with lock:
+                if result.done():
+                    return
+                started = time.perf_counter()
+                call = self.client._stub().GetTask.future(request, timeout=remaining(deadline), **kwargs)
+                calls.append(call)
+                if len(calls) > 1:
+                    hedge.sent += 1
+            call.add_done_callback(lambda done: finish(done, started))
+
+        def finish(call, started):
+            with lock:
+                if result.done():
+                    return
+                error = call.exception()
+                pending = any(not other.done() for other in calls)
+                if error is not None and error.code() in HEDGE_CODES and pending:
+                    return
+                if error is None:
+                    hedge.record(time.perf_counter() - started)
+                    if call is not calls[0]:
+                        hedge.won += 1
+                    result.set_result(call.result())
+                else:
+                    result.set_exception(error)
+            stop()
+
+        def stop():
+            timer.cancel()
+            for call in calls:
+                call.cancel()
+
+        timer = threading.Timer(hedge.delay, start)
+        timer.daemon = True
+        result.add_done_callback(lambda done: done.cancelled() and stop())
+        start()
+        if timeout is None or hedge.delay < timeout:
+            timer.start()
+        return result
+
+
+class AsyncClient(_Pool):
+    """grpc.aio TaskManager client over a pool of channels; see Client."""
+
+    def __init__(self, target=DEFAULT_TARGET, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 hedge_delay=AUTO, keepalive=True, retries=True, compression=None,
+                 compression_min_bytes=DEFAULT_MIN_BYTES):
+        channels = [grpc.aio.insecure_channel(target, options=channel_options(keepalive, retries),
+                                              compression=channel_compression(compression))
+                    for _ in range(pool_size)]
+        super().__init__(channels, timeout, hedge_delay, retries, compression, compression_min_bytes)
+        if self.hedge is not None:
+            self.GetTask = self._hedged_get_task
+
+    async def wait_ready(self, timeout=None):
+        await asyncio.wait_for(asyncio.gather(*(channel.channel_ready() for channel in self.channels)), timeout)
+
+    async def _hedged_get_task(self, request, timeout=None, **kwargs):
+        timeout = self.timeout if timeout is None else timeout
+        if self.retries:
+            kwargs.setdefault('wait_for_ready', True)
+        self._compress(request, kwargs)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        calls = {}
+
+        def start():
+            call = self._stub().GetTask(request, timeout=remaining(deadline), **kwargs)
+            attempt = asyncio.ensure_future(call)
+            calls[attempt] = (call, time.perf_counter())
+            return attempt
+
+        first = start()
+        try:
+            delay = self.hedge.delay if timeout is None or self.hedge.delay < timeout else None
+            done, pending = await asyncio.wait({first}, timeout=delay)
+            if not done:
+                self.hedge.sent += 1
+                pending.add(start())
+            while True:
+                error = None
+                for attempt in done:
+                    error = attempt.exception()
+                    if error is None:
+                        self.hedge.record(time.perf_counter() - calls[attempt][1])
+                        if attempt is not first:
+                            self.hedge.won += 1
+                        return attempt.result()
+                if error is not None and (not pending or error.code() not in HEDGE_CODES):
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for attempt, (call, _) in calls.items():
+                if not attempt.done():
+                    call.cancel()
+
+    async def close(self):
+        for channel in self.channels:
+            await channel.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,175 @@
+"""Multi-process TaskManager server.
+
+Run with: python -m taskmanager.cluster [--workers N] [--address 0.0.0.0:50051]
+          [--store tasks.json] [--metrics-address 127.0.0.1:9464] [--response-cache-mb 64]
+
+A gRPC server in one Python process is bound to one core by the GIL. The
+launcher runs the writer (the only process touching the store files) on a
+private Unix socket and starts N worker processes that all listen on the
+public address with SO_REUSEPORT, so the kernel spreads connections across
+them. Workers serve reads from replicas of the writer's store and forward
+mutations to it (see taskmanager.replica). Workers that exit are restarted.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+
+import grpc
+
+from taskmanager.admission import AdmissionInterceptor
+from taskmanager.compression import ALGORITHMS, DEFAULT_MIN_BYTES, CompressionInterceptor
+from taskmanager.metrics import ServerMetricsInterceptor, serve_metrics
+from taskmanager.replica import ReplicaStore, WriterServicer
+from taskmanager.response_cache import DEFAULT_MAX_BYTES, ResponseCache
+from taskmanager.server import (DEFAULT_ADDRESS, DEFAULT_METRICS_ADDRESS, DEFAULT_STORE, SERVER_OPTIONS,
+                                TaskManagerServicer, add_admission_arguments, add_compression_arguments, add_servicer,
+                                admission_options)
+from taskmanager.store import TaskStore
+
+RESTART_DELAY = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def metrics_address_for(metrics_address, index):
+    """Writer metrics on the given port, worker i on the port + 1 + i."""
+    if not metrics_address:
+        return ''
+    host, _, port = metrics_address.rpartition(':')
+    return f'{host}:{int(port) + 1 + index}'
+
+
+async def start_metrics(sources, metrics_address):
+    if not metrics_address:
+        return None
+    host, _, port = metrics_address.rpartition(':')
+    return await serve_metrics(sources, host, int(port))
+
+
+async def serve_worker(index, address, writer_target, metrics_address, cache_bytes, compression,
+                       compression_min_bytes, admission):
+    store = ReplicaStore(writer_target)
+    await store.start()
+    metrics = ServerMetricsInterceptor()
+    cache = ResponseCache(store.changes, cache_bytes) if cache_bytes else None
+    sources = [metrics.metrics] if cache is None else [metrics.metrics, cache]
+    interceptors = [metrics]
+    if admission is not None:
+        limiter = AdmissionInterceptor(**admission)
+        interceptors.append(limiter)
+        sources.append(limiter)
+    interceptors.append(CompressionInterceptor(compression, compression_min_bytes))
+    server = grpc.aio.server(interceptors=interceptors, options=SERVER_OPTIONS + [('grpc.so_reuseport', 1)])
+    add_servicer(TaskManagerServicer(store, cache), server)
+    if not server.add_insecure_port(address):
+        raise RuntimeError(f'Worker {index} failed to bind {address}')
+    await server.start()
+    metrics_server = await start_metrics(sources, metrics_address)
+    logger.info('Worker %d (pid %d) serving %s from a replica at revision %d',
+                index, os.getpid(), address, store.revision)
+
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await server.stop(grace=5)
+        await store.close()
+
+
+def run_worker(index, address, writer_target, metrics_address, cache_bytes, compression, compression_min_bytes,
+               admission):
+    # Only the launcher reacts to Ctrl-C; it stops workers with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    asyncio.run(serve_worker(index, address, writer_target, metrics_address, cache_bytes, compression,
+                             compression_min_bytes, admission))
+
+
+async def serve_cluster(workers, address=DEFAULT_ADDRESS, store_path=DEFAULT_STORE,
+                        metrics_address=DEFAULT_METRICS_ADDRESS, cache_bytes=DEFAULT_MAX_BYTES,
+                        compression=tuple(ALGORITHMS), compression_min_bytes=DEFAULT_MIN_BYTES, admission=None):
+    store = TaskStore(store_path)
+    store.load()
+    socket_dir = tempfile.mkdtemp(prefix='taskmanager-')
+    writer_target = f'unix:{os.path.join(socket_dir, "writer.sock")}'
+    metrics = ServerMetricsInterceptor()
+    writer = grpc.aio.server(interceptors=[metrics])
+    add_servicer(WriterServicer(store), writer)
+    writer.add_insecure_port(writer_target)
+    await writer.start()
+    metrics_server = await start_metrics([metrics.metrics], metrics_address)
+    logger.info('Writer serving %d task(s) from %s', len(store), store_path)
+
+    # Spawned rather than forked: gRPC's internal threads don't survive fork
+    context = multiprocessing.get_context('spawn')
+
+    def start_worker(index):
+        process = context.Process(
+            target=run_worker,
+            args=(index, address, writer_target, metrics_address_for(metrics_address, index), cache_bytes,
+                  compression, compression_min_bytes, admission),
+            name=f'taskmanager-worker-{index}',
+            daemon=True
+        )
+        process.start()
+        return process
+
+    processes = [start_worker(index) for index in range(workers)]
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    logger.info('gRPC Server running at %s with %d worker process(es)', address, workers)
+    try:
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), RESTART_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            for index, process in enumerate(processes):
+                if not process.is_alive() and not stopping.is_set():
+                    logger.warning('Worker %d exited with code %s; restarting', index, process.exitcode)
+                    processes[index] = start_worker(index)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            await asyncio.to_thread(process.join)
+        if metrics_server is not None:
+            metrics_server.close()
+        await writer.stop(grace=5)
+        await store.close()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-process TaskManager gRPC server')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes to run')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help='host:port to listen on')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='path to the tasks.json snapshot')
+    parser.add_argument('--metrics-address', default=DEFAULT_METRICS_ADDRESS,
+                        help='host:port for the writer\'s /metrics; worker i uses the port + 1 + i. '
+                             'Empty disables metrics endpoints')
+    parser.add_argument('--response-cache-mb', type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help='per-worker memory budget for cached GetTask/ListTasks responses; 0 disables it')
+    add_compression_arguments(parser)
+    add_admission_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    asyncio.run(serve_cluster(args.workers, args.address, args.store, args.metrics_address,
+                              int(args.response_cache_mb * 2**20), args.compression, args.compression_min_bytes,
+                              admission_options(args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Message compression negotiated per call, with a size threshold.
+
+gRPC core compresses whatever the server asks for, whether or not the
+client's grpc-accept-encoding lists it, and handlers can't see that
+header. So clients say which encodings they accept in an accept-encoding
+metadata entry (taskmanager.client sends it when built with compression),
+and CompressionInterceptor compresses responses of at least min_bytes with
+the first of the server's algorithms the client accepts. Smaller messages,
+and every response to a client that sends no accept-encoding, go out
+uncompressed: a TaskResponse or DeleteResponse is a few dozen bytes, which
+gzip only makes bigger and slower.
+"""
+import grpc
+
+ALGORITHMS = {
+    'gzip': grpc.Compression.Gzip,
+    'deflate': grpc.Compression.Deflate,
+}
+ACCEPT_ENCODING = 'accept-encoding'
+# Smaller messages are sent uncompressed
+DEFAULT_MIN_BYTES = 1024
+
+
+def parse_algorithms(text):
+    """Algorithm names from a comma-separated list; 'none' or empty is ()."""
+    names = tuple(name.strip().lower() for name in text.split(',') if name.strip())
+    if names == ('none',):
+        return ()
+    for name in names:
+        if name not in ALGORITHMS:
+            raise ValueError(f'unknown compression {name!r}; use {", ".join(ALGORITHMS)} or none')
+    return names
+
+
+def accept_encoding_metadata(algorithms):
+    """The metadata entry announcing that a client accepts algorithms."""
+    return (ACCEPT_ENCODING, ', '.join(algorithms))
+
+
+def message_size(message):
+    # Responses from the response cache are already serialized
+    return len(message) if isinstance(message, bytes) else message.ByteSize()
+
+
+class CompressionInterceptor(grpc.aio.ServerInterceptor):
+    """Compresses large responses with an algorithm the client accepts.
+
+    algorithms are names from ALGORITHMS in the server's order of
+    preference.
+    """
+
+    def __init__(self, algorithms=tuple(ALGORITHMS), min_bytes=DEFAULT_MIN_BYTES):
+        self.algorithms = tuple(algorithms)
+        self.min_bytes = min_bytes
+        # (method, algorithm) -> (original handler, wrapped handler)
+        self._handlers = {}
+
+    def negotiate(self, metadata):
+        """The preferred algorithm the caller accepts, or None."""
+        for key, value in metadata or ():
+            if key == ACCEPT_ENCODING:
+                accepted = {name.strip().lower() for name in value.split(',')}
+                for name in self.algorithms:
+                    if name in accepted:
+                        return name
+        return None
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or not self.algorithms:
+            return handler
+        algorithm = self.negotiate(handler_call_details.invocation_metadata)
+        if algorithm is None:
+            return handler
+        key = (handler_call_details.method, algorithm)
+        cached = self._handlers.get(key)
+        if cached is None or cached[0] is not handler:
+            cached = self._handlers[key] = (handler, self._wrap(handler, ALGORITHMS[algorithm]))
+        return cached[1]
+
+    def _wrap(self, handler, compression):
+        kind = ('unary_unary' if handler.unary_unary else 'stream_unary' if handler.stream_unary
+                else 'unary_stream' if handler.unary_stream else 'stream_stream')
+        behavior = getattr(handler, kind)
+        min_bytes = self.min_bytes
+
+        if kind.endswith('unary'):
+            async def wrapped(request, context):
+                response = await behavior(request, context)
+                if response is not None and message_size(response) >= min_bytes:
+                    context.set_compression(compression)
+                    # grpc.aio only applies set_compression() to a unary
+                    # response when the initial metadata goes out on its own
+                    await context.send_initial_metadata(())
+                return response
+        else:
+            async def wrapped(request, context):
+                context.set_compression(compression)
+                async for response in behavior(request, context):
+                    if message_size(response) < min_bytes:
+                        context.disable_next_message_compression()
+                    yield response
+
+        return handler._replace(**{kind: wrapped})
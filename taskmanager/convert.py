@@ -0,0 +1,69 @@
+"""Convert a task store between tasks.json and the binary task file format.
+
+Run with: python -m taskmanager.convert import tasks.json tasks.db
+          python -m taskmanager.convert export tasks.db tasks.json
+
+The source is read with its journal, so stop the server first. The
+revision is carried over, so clients' cached revisions stay valid.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from taskmanager.journal import Journal
+from taskmanager.store import TaskStore, journal_path_for, task_to_dict, write_json_tasks
+from taskmanager.taskfile import SUFFIX, TaskFileError, TaskTable, write_task_file
+
+
+def convert(source, destination):
+    """Write the store at source to destination; returns (tasks, revision)."""
+    store = TaskStore(source)
+    store.load(readonly=True)
+    tasks = store._tasks
+    journal_path = journal_path_for(destination)
+    if os.path.exists(journal_path) and os.path.getsize(journal_path):
+        raise TaskFileError(f'{journal_path} exists; remove it or choose another destination')
+
+    if destination.endswith(SUFFIX):
+        if isinstance(tasks, TaskTable):
+            records = tasks.records()
+        else:
+            records = ((task_id, task.to_proto().SerializeToString()) for task_id, task in tasks.items())
+        write_task_file(destination, records, store.revision)
+    else:
+        write_json_tasks(destination, {task_id: task_to_dict(task) for task_id, task in tasks.items()})
+
+        async def checkpoint():
+            # tasks.json has no room for the revision; TaskStore.load reads
+            # it from the journal instead
+            journal = Journal(journal_path)
+            journal.open()
+            await journal.append({'rev': store.revision, 'op': 'checkpoint'})
+            await journal.close()
+
+        asyncio.run(checkpoint())
+    return len(tasks), store.revision
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a task store between tasks.json and the binary format')
+    parser.add_argument('command', choices=('import', 'export'),
+                        help=f'import: JSON to a binary {SUFFIX} file; export: the reverse')
+    parser.add_argument('source', help='store to read')
+    parser.add_argument('destination', help='file to write')
+    args = parser.parse_args()
+
+    if (args.command == 'import') != args.destination.endswith(SUFFIX):
+        parser.error(f'import writes a {SUFFIX} file and export writes JSON')
+    if os.path.abspath(args.source) == os.path.abspath(args.destination):
+        parser.error('source and destination must differ')
+    try:
+        count, revision = convert(args.source, args.destination)
+    except (TaskFileError, OSError, ValueError) as e:
+        sys.exit(f'error: {e}')
+    print(f'Wrote {count} task(s) at revision {revision} to {args.destination}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Runs gRPC calls off the Tk thread and delivers results back onto it.
+
+Tk widgets may only be touched from the thread running the mainloop, and
+a blocking stub call inside a Tk callback freezes the window until the
+server answers. RequestExecutor starts calls without blocking (unary
+calls through the stub's future API, streams and other blocking work on a
+small thread pool) and queues their callbacks, which a root.after poll
+then runs on the Tk thread.
+"""
+import concurrent.futures
+import queue
+
+import grpc
+
+DEFAULT_TIMEOUT = 10.0
+# About one frame at 60 fps
+POLL_INTERVAL_MS = 16
+MAX_WORKERS = 4
+
+
+class Request:
+    """Handle for a call started by RequestExecutor."""
+
+    def __init__(self, executor, key):
+        self.key = key
+        self.cancelled = False
+        self.done = False
+        self._executor = executor
+        self._call = None
+
+    def _attach(self, call):
+        # May run on a worker thread; a cancel() that got in first is
+        # passed on to the call here
+        self._call = call
+        if self.cancelled:
+            call.cancel()
+
+    def cancel(self):
+        """Cancel the call; none of its callbacks will run afterwards."""
+        if self.done or self.cancelled:
+            return False
+        self.cancelled = True
+        call = self._call
+        if call is not None:
+            call.cancel()
+        self._executor._forget(self)
+        return True
+
+
+class RequestExecutor:
+    """Starts calls in the background and runs their callbacks via root.after.
+
+    Every method must be called from the Tk thread, and every callback runs
+    on it. A request made with a key while another request with the same
+    key is in flight is merged into it: the in-flight Request is returned
+    and the new callbacks are dropped, so repeated refreshes cost one call.
+    With replace=True the in-flight request is cancelled instead and the
+    new one started, which suits requests where only the latest answer
+    matters, such as searches. Errors, including DEADLINE_EXCEEDED once
+    timeout seconds have passed, go to on_error; cancelled requests report
+    nothing.
+    """
+
+    def __init__(self, root, poll_interval=POLL_INTERVAL_MS, max_workers=MAX_WORKERS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                           thread_name_prefix='rpc')
+        self._results = queue.Queue()
+        self._inflight = {}
+        self._closed = False
+        self._after_id = self.root.after(self.poll_interval, self._poll)
+
+    def in_flight(self, key):
+        return key in self._inflight
+
+    def call(self, method, request, on_done=None, on_error=None, timeout=DEFAULT_TIMEOUT,
+             key=None, replace=False):
+        """Start a unary call; on_done(response) runs when it completes."""
+        handle, started = self._begin(key, replace)
+        if started:
+            future = method.future(request, timeout=timeout)
+            handle._attach(future)
+            future.add_done_callback(lambda f: self._settle(handle, f.result, on_done, on_error))
+        return handle
+
+    def stream(self, method, request, on_item, on_done=None, on_error=None, timeout=None,
+               key=None, replace=False):
+        """Start a server-streaming call.
+
+        on_item(message) runs for each message as it arrives and on_done()
+        after the last one.
+        """
+        handle, started = self._begin(key, replace)
+        if started:
+            self._pool.submit(self._read_stream, handle, method, request, timeout, on_item, on_done, on_error)
+        return handle
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None, replace=False):
+        """Run a blocking fn(*args) on a worker thread; on_done(result) gets its result.
+
+        Cancelling only suppresses the callbacks; fn itself runs to the end.
+        """
+        handle, started = self._begin(key, replace)
+        if started:
+            self._pool.submit(self._settle, handle, lambda: fn(*args), on_done, on_error)
+        return handle
+
+    def shutdown(self):
+        """Cancel everything in flight and stop polling."""
+        self._closed = True
+        for handle in list(self._inflight.values()):
+            handle.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            self.root.after_cancel(self._after_id)
+        except Exception:
+            pass  # The window is already gone
+
+    def _begin(self, key, replace):
+        existing = self._inflight.get(key) if key is not None else None
+        if existing is not None:
+            if not replace:
+                return existing, False
+            existing.cancel()
+        handle = Request(self, key)
+        if key is not None:
+            self._inflight[key] = handle
+        return handle, True
+
+    def _forget(self, handle):
+        if handle.key is not None and self._inflight.get(handle.key) is handle:
+            del self._inflight[handle.key]
+
+    def _settle(self, handle, result, on_done, on_error):
+        # Runs on a gRPC or worker thread
+        try:
+            value = result()
+        except (grpc.FutureCancelledError, concurrent.futures.CancelledError):
+            return
+        except Exception as e:
+            self._results.put((handle, True, on_error, (e,)))
+        else:
+            self._results.put((handle, True, on_done, (value,)))
+
+    def _read_stream(self, handle, method, request, timeout, on_item, on_done, on_error):
+        # Runs on a worker thread
+        if handle.cancelled:
+            return
+        callback, args = None, ()
+        try:
+            call = method(request, timeout=timeout)
+            handle._attach(call)
+            for message in call:
+                self._results.put((handle, False, on_item, (message,)))
+            callback = on_done
+        except Exception as e:
+            # Not only RpcError: a channel closed under the call, as on
+            # shutdown or reconnect, raises ValueError
+            callback, args = on_error, (e,)
+        finally:
+            # Always settle the handle, or its key would stay in flight and
+            # every later request with that key would be merged into it
+            self._results.put((handle, True, callback, args))
+
+    def _poll(self):
+        try:
+            while True:
+                handle, final, callback, args = self._results.get_nowait()
+                if handle.cancelled:
+                    continue
+                if final:
+                    handle.done = True
+                    self._forget(handle)
+                if callback is not None:
+                    callback(*args)
+        except queue.Empty:
+            pass
+        finally:
+            # Keep polling even if a callback raised
+            if not self._closed:
+                self._after_id = self.root.after(self.poll_interval, self._poll)
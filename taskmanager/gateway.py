@@ -0,0 +1,435 @@
+"""HTTP/JSON gateway for the TaskManager service.
+
+Run with: python -m taskmanager.gateway [--address 0.0.0.0:8080] [--target localhost:50051]
+
+Serves client.html at / and the /api/tasks routes of the Express proxy in
+client.js, with the same JSON shapes, from a pool of grpc.aio channels
+(taskmanager.client.AsyncClient). It speaks HTTP/1.1 with keep-alive on
+plain asyncio streams, like the /metrics endpoint, so it needs nothing
+beyond grpcio. Compared with the proxy:
+
+- messages become JSON by reading their fields directly rather than
+  through json_format, with int64 fields as strings as proto-loader gives
+  them;
+- GET responses carry a weak ETag holding the store revision they were
+  read at. The task list is rendered once per revision and kept, gzipped
+  too, and before serving it the gateway checks for changes since that
+  revision with StreamTasks(if_changed_since), which costs one empty page
+  instead of the whole list; a poll whose If-None-Match is current gets
+  304. Requests arriving while a check runs share the next one. GET of a
+  single task passes the ETag on as GetTask's if_changed_since;
+- responses of at least --compression-min-bytes are gzipped for clients
+  that accept it;
+- POST /api/tasks is a plain AddTask, since the server's journal already
+  group-commits concurrent writes.
+
+Listings through a router carry revision 0; they get no ETag and are
+fetched for every request.
+"""
+import argparse
+import asyncio
+import gzip
+import http
+import json
+import logging
+import os
+import urllib.parse
+
+import grpc
+
+from taskmanager.client import DEFAULT_POOL_SIZE, DEFAULT_TARGET, DEFAULT_TIMEOUT, AsyncClient
+from taskmanager.compression import DEFAULT_MIN_BYTES
+
+import taskmanager_pb2
+
+DEFAULT_ADDRESS = '0.0.0.0:8080'
+CLIENT_PAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'client.html')
+TASKS_PATH = '/api/tasks'
+# Idle keep-alive connections are closed after this many seconds
+IDLE_TIMEOUT = 60.0
+MAX_HEADERS = 100
+MAX_BODY_BYTES = 16 * 2**20
+GZIP_LEVEL = 6
+# String fields of Task accepted in request bodies; version is an int64
+TASK_STRING_FIELDS = ('id', 'title', 'description', 'status', 'createdAt')
+HTTP_STATUSES = {
+    grpc.StatusCode.INVALID_ARGUMENT: 400,
+    grpc.StatusCode.OUT_OF_RANGE: 400,
+    grpc.StatusCode.NOT_FOUND: 404,
+    grpc.StatusCode.ALREADY_EXISTS: 409,
+    grpc.StatusCode.ABORTED: 409,
+    grpc.StatusCode.FAILED_PRECONDITION: 412,
+    grpc.StatusCode.UNIMPLEMENTED: 501,
+    grpc.StatusCode.RESOURCE_EXHAUSTED: 503,
+    grpc.StatusCode.UNAVAILABLE: 503,
+    grpc.StatusCode.DEADLINE_EXCEEDED: 504,
+}
+
+logger = logging.getLogger(__name__)
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def to_json(data):
+    return _encoder.encode(data).encode('utf-8')
+
+
+def task_json(task):
+    return {'id': task.id, 'title': task.title, 'description': task.description, 'status': task.status,
+            'createdAt': task.createdAt, 'version': str(task.version)}
+
+
+def task_response_json(response):
+    return {'task': task_json(response.task) if response.HasField('task') else None,
+            'message': response.message, 'revision': str(response.revision),
+            'not_modified': response.not_modified}
+
+
+def batch_response_json(response):
+    return {'results': [{'index': result.index, 'success': result.success,
+                         'task': task_json(result.task) if result.HasField('task') else None,
+                         'message': result.message, 'code': result.code} for result in response.results],
+            'succeeded': response.succeeded, 'failed': response.failed}
+
+
+def task_from_json(data):
+    """A Task from a request body object; ValueError if it isn't one."""
+    if not isinstance(data, dict):
+        raise ValueError('expected a task object')
+    task = taskmanager_pb2.Task()
+    for name in TASK_STRING_FIELDS:
+        value = data.get(name)
+        if value is not None:
+            if not isinstance(value, str):
+                raise ValueError(f'{name} must be a string')
+            setattr(task, name, value)
+    if data.get('version'):
+        task.version = int(data['version'])
+    return task
+
+
+def revision_etag(revision):
+    return f'W/"{revision}"'
+
+
+def etag_revisions(header):
+    """Revisions named by the ETags of an If-None-Match header."""
+    revisions = []
+    for tag in (header or '').split(','):
+        tag = tag.strip().removeprefix('W/').strip('"')
+        if tag.isdigit():
+            revisions.append(int(tag))
+    return revisions
+
+
+def accepts_gzip(header):
+    for coding in (header or '').split(','):
+        name, _, parameters = coding.partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            quality = parameters.strip().removeprefix('q=')
+            try:
+                return not parameters.strip() or float(quality) > 0
+            except ValueError:
+                return False
+    return False
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, path, version, headers, body):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return 'keep-alive' in connection
+        return 'close' not in connection
+
+    def json(self):
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            raise HttpError(400, 'Invalid JSON body') from None
+
+
+class Response:
+    """A response body, with its gzip form made at most once."""
+
+    def __init__(self, status, body=b'', content_type='application/json; charset=utf-8', etag=None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+        return self._gzipped
+
+
+class Listing(Response):
+    """The rendered task list and the store revision it was read at."""
+
+    def __init__(self, revision, body):
+        super().__init__(200, body, etag=revision_etag(revision) if revision else None)
+        self.revision = revision
+
+
+async def read_request(reader):
+    """The next request on a connection, or None once the client is done."""
+    try:
+        line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if not line.strip():
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+        raise HttpError(400, 'Malformed request line')
+    method, target, version = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        if len(headers) == MAX_HEADERS:
+            raise HttpError(431, 'Too many headers')
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'transfer-encoding' in headers:
+        raise HttpError(411, 'Send the body with a Content-Length')
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HttpError(400, 'Invalid Content-Length') from None
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, 'Request body too large')
+    body = await reader.readexactly(length) if length > 0 else b''
+    path = urllib.parse.urlsplit(target).path
+    return Request(method, path, version, headers, body)
+
+
+class Gateway:
+    """Answers HTTP requests with calls through client, an AsyncClient."""
+
+    def __init__(self, client, compression_min_bytes=DEFAULT_MIN_BYTES, page_path=CLIENT_PAGE):
+        self.client = client
+        self.compression_min_bytes = compression_min_bytes
+        with open(page_path, 'rb') as f:
+            self.page = Response(200, f.read(), 'text/html; charset=utf-8')
+        self.listing = None
+        # Refreshes of listing run one at a time; a request needs one that
+        # started after it arrived, or its own writes might be missing
+        self._refresh = None
+        self._refreshes_started = 0
+        self._refreshes_done = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    writer.write(self.encode(self.error(e.status, str(e)), False, False))
+                    break
+                if request is None:
+                    break
+                response = await self.respond(request)
+                writer.write(self.encode(response, request.keep_alive,
+                                         accepts_gzip(request.headers.get('accept-encoding')),
+                                         request.version == 'HTTP/1.0'))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def encode(self, response, keep_alive, gzip_ok, http_1_0=False):
+        body = response.body
+        headers = [f'HTTP/1.1 {response.status} {http.HTTPStatus(response.status).phrase}']
+        if response.etag is not None:
+            # Browsers keep the body but ask again each time before using it
+            headers += [f'ETag: {response.etag}', 'Cache-Control: no-cache']
+        if body:
+            headers.append(f'Content-Type: {response.content_type}')
+            if len(body) >= self.compression_min_bytes:
+                headers.append('Vary: Accept-Encoding')
+                if gzip_ok:
+                    body = response.gzipped()
+                    headers.append('Content-Encoding: gzip')
+        if response.status != 304:
+            headers.append(f'Content-Length: {len(body)}')
+        if not keep_alive:
+            headers.append('Connection: close')
+        elif http_1_0:
+            headers.append('Connection: keep-alive')
+        return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + (b'' if response.status == 304 else body)
+
+    def error(self, status, message):
+        return Response(status, to_json({'error': message}))
+
+    async def respond(self, request):
+        try:
+            return await self.route(request)
+        except HttpError as e:
+            return self.error(e.status, str(e))
+        except grpc.aio.AioRpcError as e:
+            status = HTTP_STATUSES.get(e.code(), 500)
+            if status == 500:
+                logger.error('%s %s failed: %s %s', request.method, request.path, e.code().name, e.details())
+                return self.error(500, f'{request.method} {request.path} failed')
+            return self.error(status, e.details())
+        except Exception:
+            logger.exception('%s %s failed', request.method, request.path)
+            return self.error(500, f'{request.method} {request.path} failed')
+
+    async def route(self, request):
+        method, path = request.method, request.path
+        if path in ('/', '/client.html'):
+            if method != 'GET':
+                raise HttpError(405, 'Method not allowed')
+            return self.page
+        if path == TASKS_PATH:
+            if method == 'GET':
+                return await self.list_tasks(request)
+            if method == 'POST':
+                return await self.add_task(request)
+        elif path == TASKS_PATH + '/batch' and method == 'POST':
+            return await self.batch_add_tasks(request)
+        elif path.startswith(TASKS_PATH + '/'):
+            task_id = urllib.parse.unquote(path[len(TASKS_PATH) + 1:])
+            if method == 'GET':
+                return await self.get_task(request, task_id)
+            if method == 'PUT':
+                return await self.update_task(request, task_id)
+            if method == 'DELETE':
+                return await self.delete_task(task_id)
+        else:
+            raise HttpError(404, 'Not found')
+        raise HttpError(405, 'Method not allowed')
+
+    async def list_tasks(self, request):
+        listing = await self.current_listing()
+        if listing.etag is not None and listing.revision in etag_revisions(request.headers.get('if-none-match')):
+            return Response(304, etag=listing.etag)
+        return listing
+
+    async def current_listing(self):
+        wanted = self._refreshes_started + 1
+        while self._refreshes_done < wanted:
+            if self._refresh is None:
+                self._refreshes_started += 1
+                self._refresh = asyncio.ensure_future(self._refresh_listing(self._refreshes_started))
+            # Shielded: one caller going away must not cancel it for the others
+            await asyncio.shield(self._refresh)
+        return self.listing
+
+    async def _refresh_listing(self, number):
+        try:
+            listing = self.listing
+            if listing is not None and listing.revision:
+                call = self.client.StreamTasks(taskmanager_pb2.ListTasksRequest(if_changed_since=listing.revision))
+                try:
+                    page = await call.read()
+                finally:
+                    # Anything but not_modified is read again in full by ListTasks
+                    call.cancel()
+                if page is not grpc.aio.EOF and page.not_modified:
+                    return
+            response = await self.client.ListTasks(taskmanager_pb2.Empty())
+            body = to_json({'tasks': [task_json(task) for task in response.tasks],
+                            'revision': str(response.revision)})
+            self.listing = Listing(response.revision, body)
+        finally:
+            self._refreshes_done = number
+            self._refresh = None
+
+    async def get_task(self, request, task_id):
+        revisions = etag_revisions(request.headers.get('if-none-match'))
+        since = max(revisions, default=0)
+        response = await self.client.GetTask(taskmanager_pb2.TaskRequest(taskId=task_id, if_changed_since=since))
+        if response.not_modified:
+            return Response(304, etag=revision_etag(since))
+        return Response(200, to_json(task_response_json(response)), etag=revision_etag(response.revision))
+
+    async def add_task(self, request):
+        try:
+            task = task_from_json(request.json())
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+        response = await self.client.AddTask(task)
+        return Response(200, to_json(task_response_json(response)))
+
+    async def batch_add_tasks(self, request):
+        data = request.json()
+        items = data.get('tasks') or [] if isinstance(data, dict) else None
+        try:
+            if not isinstance(items, list):
+                raise ValueError('expected {"tasks": [...]}')
+            tasks = [task_from_json(item) for item in items]
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+        response = await self.client.BatchAddTasks(taskmanager_pb2.BatchAddTasksRequest(tasks=tasks))
+        return Response(200, to_json(batch_response_json(response)))
+
+    async def update_task(self, request, task_id):
+        try:
+            task = task_from_json(request.json())
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+        response = await self.client.UpdateTask(taskmanager_pb2.UpdateTaskRequest(taskId=task_id, task=task))
+        return Response(200, to_json(task_response_json(response)))
+
+    async def delete_task(self, task_id):
+        response = await self.client.DeleteTask(taskmanager_pb2.TaskRequest(taskId=task_id))
+        return Response(200, to_json({'success': response.success, 'message': response.message}))
+
+
+async def serve(address=DEFAULT_ADDRESS, target=DEFAULT_TARGET, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                compression_min_bytes=DEFAULT_MIN_BYTES):
+    """Run the gateway until cancelled."""
+    client = AsyncClient(target, pool_size=pool_size, timeout=timeout)
+    gateway = Gateway(client, compression_min_bytes)
+    host, _, port = address.rpartition(':')
+    server = await asyncio.start_server(gateway.handle_connection, host or None, int(port))
+    logger.info('HTTP gateway running at http://%s for %s', address, target)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TaskManager HTTP/JSON gateway')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help='host:port to listen on')
+    parser.add_argument('--target', default=os.environ.get('TASKMANAGER_TARGET', DEFAULT_TARGET),
+                        help='host:port of the TaskManager server')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE, help='gRPC channels to the server')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='deadline of each gRPC call')
+    parser.add_argument('--compression-min-bytes', type=int, default=DEFAULT_MIN_BYTES,
+                        help='responses smaller than this are sent uncompressed')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(serve(args.address, args.target, args.pool_size, args.timeout, args.compression_min_bytes))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Secondary indexes over the task store."""
+import bisect
+import itertools
+
+
+class SortedIndex:
+    """Sorted (key, task_id) pairs supporting range scans in key order."""
+
+    def __init__(self, entries=()):
+        self._entries = sorted(entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, task_id):
+        bisect.insort(self._entries, (key, task_id))
+
+    def remove(self, key, task_id):
+        index = bisect.bisect_left(self._entries, (key, task_id))
+        if index < len(self._entries) and self._entries[index] == (key, task_id):
+            del self._entries[index]
+
+    def range(self, low=None, high=None):
+        """Yield task ids with low <= key < high; a None bound is open."""
+        start = bisect.bisect_left(self._entries, (low, '')) if low is not None else 0
+        end = bisect.bisect_left(self._entries, (high, '')) if high is not None else len(self._entries)
+        for index in range(start, end):
+            yield self._entries[index][1]
+
+
+class TaskIndexes:
+    """createdAt order over all tasks and per status.
+
+    Keys are created_ms, the TaskRecord's integer createdAt.
+    """
+
+    def __init__(self):
+        self.by_created = SortedIndex()
+        self.by_status = {}
+
+    def rebuild(self, tasks):
+        self.by_created = SortedIndex((task.created_ms, task.id) for task in tasks)
+        by_status = {}
+        for task in tasks:
+            by_status.setdefault(task.status, []).append((task.created_ms, task.id))
+        self.by_status = {status: SortedIndex(entries) for status, entries in by_status.items()}
+
+    def add(self, task):
+        self.by_created.add(task.created_ms, task.id)
+        self.by_status.setdefault(task.status, SortedIndex()).add(task.created_ms, task.id)
+
+    def remove(self, task):
+        self.by_created.remove(task.created_ms, task.id)
+        index = self.by_status.get(task.status)
+        if index is not None:
+            index.remove(task.created_ms, task.id)
+            if not index:
+                del self.by_status[task.status]
+
+    def replace(self, old, new):
+        if old.status != new.status or old.created_ms != new.created_ms:
+            self.remove(old)
+            self.add(new)
+
+    def query(self, status='', created_after=None, created_before=None, limit=None):
+        """Return matching task ids in createdAt order.
+
+        Cost is O(log n + k) for k results: the status index narrows the
+        candidates and the createdAt range is located by binary search.
+        """
+        if status:
+            index = self.by_status.get(status)
+            if index is None:
+                return []
+        else:
+            index = self.by_created
+        return list(itertools.islice(index.range(created_after, created_before), limit))
@@ -0,0 +1,373 @@
+"""Headless load generator for the TaskManager service.
+
+Run with: python -m taskmanager.loadgen [--target localhost:50051 | --spawn]
+          [--scenario read-heavy] [--rps 500 | --concurrency 32] [--duration 30]
+
+Sends a weighted mix of GetTask/AddTask/ListTasks/UpdateTask/DeleteTask
+calls through a taskmanager.client.AsyncClient and prints latency
+percentiles, throughput and error rates as JSON. Retries and hedging are
+off unless asked for, so errors and slow calls show in the report.
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import itertools
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import grpc
+
+from taskmanager.client import AUTO, AsyncClient
+from taskmanager.compression import ALGORITHMS
+
+import taskmanager_pb2
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METHODS = ('GetTask', 'AddTask', 'ListTasks', 'UpdateTask', 'DeleteTask')
+STATUSES = ('Not Started', 'In Progress', 'Completed')
+# Mixes are relative weights; tasks is how many tasks the store should hold
+# before measuring
+SCENARIOS = {
+    'read-heavy': {
+        'mix': {'GetTask': 90, 'ListTasks': 1, 'AddTask': 4, 'UpdateTask': 4, 'DeleteTask': 1},
+        'tasks': 1000,
+    },
+    'write-heavy': {
+        'mix': {'GetTask': 10, 'AddTask': 40, 'UpdateTask': 40, 'DeleteTask': 10},
+        'tasks': 1000,
+    },
+    'large-list': {
+        'mix': {'ListTasks': 100},
+        'tasks': 50000,
+    },
+}
+DEFAULT_TIMEOUT = 5.0
+PRELOAD_BATCH_SIZE = 500
+PERCENTILES = (50, 95, 99)
+# Calls that need an existing task; they become AddTask while none is known
+TARGETED = ('GetTask', 'UpdateTask', 'DeleteTask')
+
+
+def parse_mix(text):
+    """Parse "GetTask=80,AddTask=20" into a {method: weight} dict."""
+    mix = {}
+    for item in text.split(','):
+        method, _, weight = item.partition('=')
+        method = method.strip()
+        if method not in METHODS:
+            raise ValueError(f'Unknown method {method!r}; expected one of {", ".join(METHODS)}')
+        mix[method] = float(weight or 1)
+    return mix
+
+
+def parse_hedge_delay(text):
+    """Milliseconds, or "auto", as the hedge_delay of an AsyncClient."""
+    return AUTO if text == AUTO else float(text) / 1000
+
+
+def percentile(ordered, p):
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def latency_summary(samples):
+    ordered = sorted(samples)
+    summary = {f'p{p}': round(percentile(ordered, p) * 1000, 3) for p in PERCENTILES}
+    summary['max'] = round(ordered[-1] * 1000, 3) if ordered else 0.0
+    summary['mean'] = round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0
+    return summary
+
+
+class LoadGenerator:
+    """Issues requests from a weighted mix and records their outcomes.
+
+    Ids of existing tasks are tracked so GetTask, UpdateTask and DeleteTask
+    target real tasks; when none are known those calls become AddTask and
+    are recorded as AddTask. A GetTask or UpdateTask whose task was deleted
+    by a concurrent DeleteTask fails with NOT_FOUND through no fault of the
+    server; those are counted as raced rather than as errors.
+    Latency is measured from when a request was due, so in open-loop runs
+    time spent waiting behind a slow server is included.
+    """
+
+    def __init__(self, stub, mix, timeout=DEFAULT_TIMEOUT, seed=None):
+        self.stub = stub
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self._methods = [method for method in mix if mix[method] > 0]
+        self._cum_weights = list(itertools.accumulate(mix[method] for method in self._methods))
+        self.task_ids = []
+        # The same ids as a set, to tell a raced NOT_FOUND from a lost task
+        self._live_ids = set()
+        self.recording = False
+        self.reset()
+
+    def reset(self):
+        self.latencies = {method: [] for method in METHODS}
+        self.codes = {method: collections.Counter() for method in METHODS}
+        self.raced = collections.Counter()
+        self.dropped = 0
+
+    async def load_existing(self):
+        request = taskmanager_pb2.ListTasksRequest(field_mask={'paths': ['id']})
+        async for page in self.stub.StreamTasks(request):
+            self._add_ids(task.id for task in page.tasks)
+
+    async def preload(self, count):
+        for start in range(0, count, PRELOAD_BATCH_SIZE):
+            tasks = [self._new_task() for _ in range(min(PRELOAD_BATCH_SIZE, count - start))]
+            response = await self.stub.BatchAddTasks(taskmanager_pb2.BatchAddTasksRequest(tasks=tasks))
+            self._add_ids(result.task.id for result in response.results if result.success)
+
+    def _new_task(self):
+        n = self.rng.randrange(1 << 30)
+        return taskmanager_pb2.Task(
+            title=f'Load test task {n}',
+            description=f'Generated by taskmanager.loadgen ({n})',
+            status=self.rng.choice(STATUSES)
+        )
+
+    def _add_ids(self, task_ids):
+        for task_id in task_ids:
+            self.task_ids.append(task_id)
+            self._live_ids.add(task_id)
+
+    def _take_id(self):
+        # Swap-remove so deletes stay O(1)
+        index = self.rng.randrange(len(self.task_ids))
+        self.task_ids[index], self.task_ids[-1] = self.task_ids[-1], self.task_ids[index]
+        task_id = self.task_ids.pop()
+        self._live_ids.discard(task_id)
+        return task_id
+
+    async def _call(self, method, task_id):
+        if method == 'GetTask':
+            await self.stub.GetTask(taskmanager_pb2.TaskRequest(taskId=task_id), timeout=self.timeout)
+        elif method == 'AddTask':
+            response = await self.stub.AddTask(self._new_task(), timeout=self.timeout)
+            self._add_ids((response.task.id,))
+        elif method == 'ListTasks':
+            await self.stub.ListTasks(taskmanager_pb2.Empty(), timeout=self.timeout)
+        elif method == 'UpdateTask':
+            request = taskmanager_pb2.UpdateTaskRequest(
+                taskId=task_id, task=taskmanager_pb2.Task(status=self.rng.choice(STATUSES))
+            )
+            await self.stub.UpdateTask(request, timeout=self.timeout)
+        else:
+            await self.stub.DeleteTask(taskmanager_pb2.TaskRequest(taskId=task_id), timeout=self.timeout)
+
+    async def one(self, due=None):
+        method = self.rng.choices(self._methods, cum_weights=self._cum_weights)[0]
+        if method in TARGETED and not self.task_ids:
+            method = 'AddTask'
+        task_id = None
+        if method == 'DeleteTask':
+            # Taken out of the pool first so no other request targets it
+            task_id = self._take_id()
+        elif method in TARGETED:
+            task_id = self.rng.choice(self.task_ids)
+        start = time.perf_counter() if due is None else due
+        try:
+            await self._call(method, task_id)
+            code = grpc.StatusCode.OK
+        except grpc.aio.AioRpcError as e:
+            code = e.code()
+        if self.recording:
+            self.latencies[method].append(time.perf_counter() - start)
+            if code == grpc.StatusCode.NOT_FOUND and method != 'DeleteTask' and task_id not in self._live_ids:
+                self.raced[method] += 1
+            else:
+                self.codes[method][code.name] += 1
+
+    async def run_closed(self, concurrency, duration):
+        """Keep concurrency requests outstanding for duration seconds."""
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.one()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_open(self, rps, duration, max_in_flight):
+        """Start rps requests per second regardless of how fast they finish.
+
+        Requests that would exceed max_in_flight outstanding calls are not
+        sent and are counted as dropped.
+        """
+        start = time.perf_counter()
+        in_flight = set()
+        for n in itertools.count():
+            due = start + n / rps
+            if due - start >= duration:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                if self.recording:
+                    self.dropped += 1
+                continue
+            task = asyncio.ensure_future(self.one(due))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    def report(self, elapsed):
+        methods = {}
+        all_latencies = []
+        total = errors = 0
+        for method in METHODS:
+            count = sum(self.codes[method].values()) + self.raced[method]
+            if not count:
+                continue
+            failed = count - self.codes[method]['OK'] - self.raced[method]
+            methods[method] = {
+                'requests': count,
+                'errors': failed,
+                'error_rate': round(failed / count, 5),
+                'status_codes': dict(self.codes[method]),
+                'latency_ms': latency_summary(self.latencies[method]),
+            }
+            if method in ('GetTask', 'UpdateTask'):
+                # NOT_FOUND because a concurrent DeleteTask got there first
+                methods[method]['raced_not_found'] = self.raced[method]
+            all_latencies.extend(self.latencies[method])
+            total += count
+            errors += failed
+        return {
+            'duration_s': round(elapsed, 3),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+            'errors': errors,
+            'error_rate': round(errors / total, 5) if total else 0.0,
+            'raced_not_found': sum(self.raced.values()),
+            'dropped': self.dropped,
+            'latency_ms': latency_summary(all_latencies),
+            'methods': methods,
+        }
+
+
+@contextlib.contextmanager
+def spawn_server():
+    """Start python -m taskmanager.server on a free port with an empty store."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    with tempfile.TemporaryDirectory(prefix='loadgen-') as store_dir:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'taskmanager.server',
+             '--address', f'127.0.0.1:{port}', '--store', os.path.join(store_dir, 'tasks.json'),
+             '--metrics-address', ''],
+            cwd=REPO_ROOT
+        )
+        try:
+            yield f'127.0.0.1:{port}'
+        finally:
+            process.terminate()
+            process.wait()
+
+
+async def run(target, mix, tasks, duration, warmup, rps=None, concurrency=None,
+              max_in_flight=1000, timeout=DEFAULT_TIMEOUT, seed=None, channels=1, hedge_delay=None,
+              retries=False, compression=None):
+    async with AsyncClient(target, channels, timeout, hedge_delay, retries=retries,
+                           compression=compression) as client:
+        await client.wait_ready(timeout=10)
+        generator = LoadGenerator(client, mix, timeout, seed)
+        await generator.load_existing()
+        await generator.preload(max(0, tasks - len(generator.task_ids)))
+
+        async def phase(seconds):
+            if rps:
+                await generator.run_open(rps, seconds, max_in_flight)
+            else:
+                await generator.run_closed(concurrency, seconds)
+
+        if warmup > 0:
+            await phase(warmup)
+        generator.reset()
+        generator.recording = True
+        start = time.perf_counter()
+        if client.hedge is not None:
+            client.hedge.sent = client.hedge.won = 0
+        await phase(duration)
+        report = generator.report(time.perf_counter() - start)
+        if client.hedge is not None:
+            report['hedging'] = {'delay_ms': round(client.hedge.delay * 1000, 3), 'sent': client.hedge.sent,
+                                 'won': client.hedge.won}
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TaskManager load generator')
+    parser.add_argument('--target', default='localhost:50051', help='host:port of the server')
+    parser.add_argument('--spawn', action='store_true',
+                        help='start a local server with an empty store instead of using --target')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='read-heavy')
+    parser.add_argument('--mix', type=parse_mix, help='custom weights, e.g. GetTask=80,AddTask=20')
+    parser.add_argument('--tasks', type=int, help="tasks to have in the store first (default: the scenario's)")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--rps', type=float, help='open loop: requests started per second')
+    load.add_argument('--concurrency', type=int, default=16, help='closed loop: requests kept in flight')
+    parser.add_argument('--max-in-flight', type=int, default=1000, help='open loop: cap on outstanding requests')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to measure')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds to run before measuring')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='per-call deadline in seconds')
+    parser.add_argument('--channels', type=int, default=1, help='connections to spread calls over')
+    parser.add_argument('--hedge-delay-ms', type=parse_hedge_delay, metavar='MS|auto',
+                        help='hedge GetTask calls not answered within MS, or the recent p95 with "auto"')
+    parser.add_argument('--retries', action='store_true',
+                        help='retry read-only calls on UNAVAILABLE and wait for the connection')
+    parser.add_argument('--compression', choices=sorted(ALGORITHMS),
+                        help='compress large requests and ask the server to compress large responses')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--max-p99-ms', type=float, help='exit with status 1 if overall p99 is above this')
+    parser.add_argument('--max-error-rate', type=float, help='exit with status 1 if the error rate is above this')
+    args = parser.parse_args()
+
+    scenario = SCENARIOS[args.scenario]
+    mix = args.mix or scenario['mix']
+    tasks = scenario['tasks'] if args.tasks is None else args.tasks
+
+    with contextlib.ExitStack() as stack:
+        target = stack.enter_context(spawn_server()) if args.spawn else args.target
+        report = asyncio.run(run(
+            target, mix, tasks, args.duration, args.warmup, rps=args.rps, concurrency=args.concurrency,
+            max_in_flight=args.max_in_flight, timeout=args.timeout, seed=args.seed, channels=args.channels,
+            hedge_delay=args.hedge_delay_ms, retries=args.retries, compression=args.compression
+        ))
+
+    report = {
+        'scenario': args.scenario if args.mix is None else 'custom',
+        'target': 'spawned' if args.spawn else args.target,
+        'mix': mix,
+        'load': {'rps': args.rps} if args.rps else {'concurrency': args.concurrency},
+        **report,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    failed = ((args.max_p99_ms is not None and report['latency_ms']['p99'] > args.max_p99_ms) or
+              (args.max_error_rate is not None and report['error_rate'] > args.max_error_rate))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
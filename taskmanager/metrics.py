@@ -0,0 +1,305 @@
+"""Per-RPC metrics in the Prometheus text format.
+
+ServerMetricsInterceptor (for grpc.aio servers) and ClientMetricsInterceptor
+(for channels wrapped with grpc.intercept_channel) record, per method,
+a latency histogram, the number of calls in flight, histograms of
+serialized request and response message sizes, and a count of calls by
+status code. RpcMetrics.render() produces the text that serve_metrics()
+exposes at /metrics.
+
+Message sizes come from wrapping the method's serializers, so they are the
+real wire sizes and cost no extra serialization. Wrapped server handlers
+are built once per method and reused, so a call only adds two clock reads
+and a few integer updates.
+"""
+import asyncio
+import bisect
+import collections
+import time
+
+import grpc
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds in bytes
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DEFAULT_METRICS_PORT = 9464
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MethodMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.request_bytes = Histogram(SIZE_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self.in_flight = 0
+        self.codes = collections.Counter()
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RpcMetrics:
+    """Metrics for every method seen on one side ('server' or 'client')."""
+
+    def __init__(self, side):
+        self.side = side
+        self.methods = {}
+
+    def method(self, full_method):
+        stats = self.methods.get(full_method)
+        if stats is None:
+            stats = self.methods[full_method] = MethodMetrics()
+        return stats
+
+    def render(self):
+        prefix = f'grpc_{self.side}'
+        # Copy first: a new method may be added while rendering
+        methods = sorted(self.methods.items())
+        lines = []
+
+        def labels_for(full_method, **extra):
+            service, _, method = full_method.lstrip('/').rpartition('/')
+            labels = {'grpc_service': service, 'grpc_method': method, **extra}
+            return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+        lines.append(f'# HELP {prefix}_handled_total Completed RPCs by status code.')
+        lines.append(f'# TYPE {prefix}_handled_total counter')
+        for full_method, stats in methods:
+            for code, count in sorted(stats.codes.items()):
+                lines.append(f'{prefix}_handled_total{{{labels_for(full_method, grpc_code=code)}}} {count}')
+
+        lines.append(f'# HELP {prefix}_in_flight RPCs currently in progress.')
+        lines.append(f'# TYPE {prefix}_in_flight gauge')
+        for full_method, stats in methods:
+            lines.append(f'{prefix}_in_flight{{{labels_for(full_method)}}} {stats.in_flight}')
+
+        for name, attribute, help_text in (
+                ('handling_seconds', 'latency', 'RPC latency in seconds.'),
+                ('request_bytes', 'request_bytes', 'Serialized request message sizes.'),
+                ('response_bytes', 'response_bytes', 'Serialized response message sizes.')):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} histogram')
+            for full_method, stats in methods:
+                histogram = getattr(stats, attribute)
+                labels = labels_for(full_method)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_{name}_sum{{{labels}}} {_format_value(histogram.sum)}')
+                lines.append(f'{prefix}_{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _sized_deserializer(deserializer, histogram):
+    def deserialize(data):
+        histogram.observe(len(data))
+        return deserializer(data) if deserializer is not None else data
+    return deserialize
+
+
+def _sized_serializer(serializer, histogram):
+    def serialize(message):
+        data = serializer(message) if serializer is not None else message
+        histogram.observe(len(data))
+        return data
+    return serialize
+
+
+def _server_code(context, error):
+    if isinstance(error, asyncio.CancelledError):
+        return 'CANCELLED'
+    code = context.code()
+    if code is None:
+        return 'OK' if error is None else 'UNKNOWN'
+    # code() may be a StatusCode or its integer value depending on how it was set
+    if isinstance(code, grpc.StatusCode):
+        return code.name
+    for status in grpc.StatusCode:
+        if status.value[0] == code:
+            return status.name
+    return 'UNKNOWN'
+
+
+class ServerMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Records RpcMetrics('server') for every call handled by the server."""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics or RpcMetrics('server')
+        # method -> (original handler, wrapped handler)
+        self._handlers = {}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method
+        cached = self._handlers.get(method)
+        if cached is None or cached[0] is not handler:
+            cached = self._handlers[method] = (handler, self._wrap(handler, self.metrics.method(method)))
+        return cached[1]
+
+    def _wrap(self, handler, stats):
+        kind = ('unary_unary' if handler.unary_unary else 'stream_unary' if handler.stream_unary
+                else 'unary_stream' if handler.unary_stream else 'stream_stream')
+        behavior = getattr(handler, kind)
+
+        def start():
+            stats.in_flight += 1
+            return time.perf_counter()
+
+        def finish(started, context, error):
+            stats.in_flight -= 1
+            stats.latency.observe(time.perf_counter() - started)
+            stats.codes[_server_code(context, error)] += 1
+
+        if kind.endswith('unary'):
+            async def wrapped(request, context):
+                started = start()
+                error = None
+                try:
+                    return await behavior(request, context)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    finish(started, context, error)
+        else:
+            async def wrapped(request, context):
+                started = start()
+                error = None
+                try:
+                    async for response in behavior(request, context):
+                        yield response
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    finish(started, context, error)
+
+        return handler._replace(
+            request_deserializer=_sized_deserializer(handler.request_deserializer, stats.request_bytes),
+            response_serializer=_sized_serializer(handler.response_serializer, stats.response_bytes),
+            **{kind: wrapped}
+        )
+
+
+class _StreamingResponse:
+    """Wraps a response iterator so the call is recorded when it ends."""
+
+    def __init__(self, call, on_done):
+        self._call = call
+        self._on_done = on_done
+
+    def _finish(self, code):
+        if self._on_done is not None:
+            self._on_done(code)
+            self._on_done = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._call)
+        except StopIteration:
+            self._finish(grpc.StatusCode.OK)
+            raise
+        except grpc.RpcError as e:
+            self._finish(e.code())
+            raise
+
+    def __getattr__(self, name):
+        # cancel(), code(), trailing_metadata() etc. of the underlying call
+        return getattr(self._call, name)
+
+
+class ClientMetricsInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor):
+    """Records RpcMetrics('client') for unary and server-streaming calls.
+
+    Use with grpc.intercept_channel(channel, ClientMetricsInterceptor()).
+    A streaming call is recorded once its iterator is exhausted or fails.
+    Message sizes are taken from the serialized request and, for unary
+    calls, from ByteSize() of the response, since the client interceptor
+    API has no hook into response deserialization.
+    """
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics or RpcMetrics('client')
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        stats = self.metrics.method(client_call_details.method)
+        stats.request_bytes.observe(request.ByteSize())
+        stats.in_flight += 1
+        started = time.perf_counter()
+        call = continuation(client_call_details, request)
+
+        def done(future):
+            stats.in_flight -= 1
+            stats.latency.observe(time.perf_counter() - started)
+            code = future.code()
+            stats.codes[code.name if code is not None else 'UNKNOWN'] += 1
+            if code == grpc.StatusCode.OK:
+                stats.response_bytes.observe(future.result().ByteSize())
+
+        call.add_done_callback(done)
+        return call
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        stats = self.metrics.method(client_call_details.method)
+        stats.request_bytes.observe(request.ByteSize())
+        stats.in_flight += 1
+        started = time.perf_counter()
+        call = continuation(client_call_details, request)
+
+        def done(code):
+            stats.in_flight -= 1
+            stats.latency.observe(time.perf_counter() - started)
+            stats.codes[code.name] += 1
+
+        return _StreamingResponse(call, done)
+
+
+async def serve_metrics(metrics_sources, host='127.0.0.1', port=DEFAULT_METRICS_PORT):
+    """Serve the concatenated render() of metrics_sources at http://host:port/metrics.
+
+    A tiny asyncio HTTP/1.0 responder so no extra dependency is needed;
+    returns the asyncio server.
+    """
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass  # Skip headers
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                body = ''.join(source.render() for source in metrics_sources).encode('utf-8')
+                status = '200 OK'
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                body = b'Not found\n'
+                status = '404 Not Found'
+                content_type = 'text/plain'
+            writer.write(f'HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
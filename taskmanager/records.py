@@ -0,0 +1,98 @@
+"""Compact in-memory task records for the server store.
+
+A protobuf message or a dict per task costs hundreds of bytes before the
+strings themselves. TaskRecord is a __slots__ object with the same field
+names, so code reading task.title or task.createdAt works on either, but
+statuses are interned (every record shares the few distinct strings) and
+createdAt is kept as integer milliseconds since the epoch. Records are
+converted to taskmanager_pb2.Task only at the RPC boundary.
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+
+import taskmanager_pb2
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MILLISECOND = timedelta(milliseconds=1)
+
+
+def parse_timestamp(text):
+    """Milliseconds since the epoch for an ISO 8601 time; naive times are UTC."""
+    value = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // MILLISECOND
+
+
+def format_timestamp(ms):
+    # Same format as JavaScript's Date.toISOString() used by server.js
+    return (EPOCH + ms * MILLISECOND).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def encode_created(text):
+    """The created slot value for a createdAt string.
+
+    Empty is 0. A value that wouldn't format back to the same text (not a
+    millisecond UTC time from toISOString) is kept as the string.
+    """
+    if not text:
+        return 0
+    try:
+        ms = parse_timestamp(text)
+    except ValueError:
+        return text
+    return ms if ms and format_timestamp(ms) == text else text
+
+
+class TaskRecord:
+    __slots__ = ('id', 'title', 'description', 'status', 'created', 'version')
+
+    def __init__(self, id, title='', description='', status='', created=0, version=1):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.status = sys.intern(status)
+        self.created = created
+        self.version = version
+
+    @classmethod
+    def from_fields(cls, id, title, description, status, createdAt, version=1):
+        return cls(id, title, description, status, encode_created(createdAt), version)
+
+    @classmethod
+    def from_proto(cls, task):
+        return cls.from_fields(task.id, task.title, task.description, task.status, task.createdAt,
+                               task.version or 1)
+
+    def to_proto(self):
+        return taskmanager_pb2.Task(id=self.id, title=self.title, description=self.description,
+                                    status=self.status, createdAt=self.createdAt, version=self.version)
+
+    @property
+    def createdAt(self):
+        created = self.created
+        if created.__class__ is int:
+            return format_timestamp(created) if created else ''
+        return created
+
+    @property
+    def created_ms(self):
+        """createdAt in milliseconds for ordering; 0 when unknown."""
+        created = self.created
+        return created if created.__class__ is int else 0
+
+    def replace(self, **changes):
+        """A new record with the given fields changed."""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return TaskRecord(**values)
+
+    def __eq__(self, other):
+        if not isinstance(other, TaskRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'TaskRecord(id={self.id!r}, title={self.title!r}, status={self.status!r})'
@@ -0,0 +1,297 @@
+"""Read replicas of a writer process's store, for multi-process serving.
+
+The writer owns the TaskStore and its journal. Each replica holds a full
+in-memory copy, kept current through the writer's WatchTasks stream, and
+serves every read itself. Mutations are forwarded to the writer, whose
+responses carry its committed revision in trailing metadata; the replica
+returns once it has applied that revision, so a client always reads its
+own writes.
+"""
+import asyncio
+import logging
+
+import grpc
+
+from taskmanager import changefeed
+from taskmanager.records import TaskRecord
+from taskmanager.server import TaskManagerServicer
+from taskmanager.store import TaskExistsError, TaskNotFoundError, TaskState, VersionConflictError
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+REVISION_METADATA_KEY = 'x-taskmanager-revision'
+# How long a forwarded mutation waits for the replica to catch up before
+# returning anyway; the write itself has already succeeded
+CATCH_UP_TIMEOUT = 5.0
+RECONNECT_DELAY = 0.5
+
+KINDS = {
+    taskmanager_pb2.TaskEvent.ADDED: changefeed.ADDED,
+    taskmanager_pb2.TaskEvent.UPDATED: changefeed.UPDATED,
+    taskmanager_pb2.TaskEvent.DELETED: changefeed.DELETED,
+}
+
+# Store errors by BatchResult.code, as the writer's batch_response() sets it
+BATCH_ERRORS = {
+    grpc.StatusCode.NOT_FOUND.value[0]: TaskNotFoundError,
+    grpc.StatusCode.ABORTED.value[0]: VersionConflictError,
+    grpc.StatusCode.ALREADY_EXISTS.value[0]: TaskExistsError,
+}
+STATUS_CODES = {code.value[0]: code for code in grpc.StatusCode}
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItemError(Exception):
+    """A forwarded batch item failed for a reason the store has no error for."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def update_request(task_id, task, expected_version=0, paths=None):
+    request = taskmanager_pb2.UpdateTaskRequest(taskId=task_id, task=task, expected_version=expected_version)
+    if paths:
+        request.update_mask.paths.extend(paths)
+    return request
+
+
+class WriterServicer(TaskManagerServicer):
+    """Servicer for the writer: mutation responses report the committed revision."""
+
+    def _report_revision(self, context):
+        context.set_trailing_metadata(((REVISION_METADATA_KEY, str(self.store.committed_revision)),))
+
+    async def AddTask(self, request, context):
+        response = await super().AddTask(request, context)
+        self._report_revision(context)
+        return response
+
+    async def UpdateTask(self, request, context):
+        response = await super().UpdateTask(request, context)
+        self._report_revision(context)
+        return response
+
+    async def DeleteTask(self, request, context):
+        response = await super().DeleteTask(request, context)
+        self._report_revision(context)
+        return response
+
+    async def BatchAddTasks(self, request, context):
+        response = await super().BatchAddTasks(request, context)
+        self._report_revision(context)
+        return response
+
+    async def BatchUpdateTasks(self, request, context):
+        response = await super().BatchUpdateTasks(request, context)
+        self._report_revision(context)
+        return response
+
+    async def BatchDeleteTasks(self, request, context):
+        response = await super().BatchDeleteTasks(request, context)
+        self._report_revision(context)
+        return response
+
+    # Replicas need the stored task for every import, as for BatchAddTasks
+    import_failures_only = False
+
+    async def ImportTasks(self, request_iterator, context):
+        response = await super().ImportTasks(request_iterator, context)
+        self._report_revision(context)
+        return response
+
+
+class ReplicaStore(TaskState):
+    """A TaskState mirroring the writer at writer_target.
+
+    Revisions match the writer's, so WatchTasks and if_changed_since work
+    against a replica exactly as against the writer. A batch becomes
+    visible all at once, when its last event arrives.
+    """
+
+    def __init__(self, writer_target):
+        super().__init__()
+        self.writer_target = writer_target
+        self._channel = None
+        self._writer = None
+        self._follow_task = None
+        self._pending = []
+        self._waiters = []
+
+    async def start(self):
+        """Copy the writer's tasks, then follow its changes in the background."""
+        self._channel = grpc.aio.insecure_channel(self.writer_target)
+        self._writer = taskmanager_pb2_grpc.TaskManagerStub(self._channel)
+        latest = await self._resync()
+        self._follow_task = asyncio.create_task(self._follow())
+        # Serve only once the changes made while copying have been applied
+        await self.wait_for(latest)
+
+    async def close(self):
+        if self._follow_task is not None:
+            self._follow_task.cancel()
+            await asyncio.gather(self._follow_task, return_exceptions=True)
+        if self._channel is not None:
+            await self._channel.close()
+
+    async def wait_for(self, revision, timeout=None):
+        """Wait until changes up to revision have been applied; False on timeout."""
+        if self.revision >= revision:
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((revision, waiter))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _advance(self, revision, changes):
+        self.revision = revision
+        self.changes.publish(revision, changes)
+        waiting = []
+        for waiter_revision, waiter in self._waiters:
+            if waiter_revision <= revision:
+                if not waiter.done():
+                    waiter.set_result(None)
+            else:
+                waiting.append((waiter_revision, waiter))
+        self._waiters = waiting
+
+    async def _resync(self):
+        """Replace the local copy with a full listing; returns the last chunk's revision."""
+        tasks = {}
+        first_revision = latest = None
+        async for page in self._writer.StreamTasks(taskmanager_pb2.ListTasksRequest(), wait_for_ready=True):
+            if first_revision is None:
+                first_revision = page.revision
+            latest = page.revision
+            for task in page.tasks:
+                tasks[task.id] = TaskRecord.from_proto(task)
+
+        if first_revision < self.revision or not self._tasks:
+            # First copy, or the writer's history restarted: begin afresh
+            self._tasks = tasks
+            self.revision = first_revision
+            self._rebuild()
+        else:
+            # Publish the difference, so local watchers stay consistent
+            changes = []
+            for task_id, task in tasks.items():
+                current = self._tasks.get(task_id)
+                if current != task:
+                    changes.append((changefeed.UPDATED if current is not None else changefeed.ADDED, task))
+                    self._insert(task)
+            for task_id in [task_id for task_id in self._tasks if task_id not in tasks]:
+                changes.append((changefeed.DELETED, self._tasks[task_id]))
+                self._remove(task_id)
+            self._advance(first_revision, changes)
+        self._pending = []
+        return latest
+
+    async def _follow(self):
+        while True:
+            try:
+                request = taskmanager_pb2.WatchTasksRequest(since_revision=self.revision)
+                async for event in self._writer.WatchTasks(request, wait_for_ready=True):
+                    self._apply(event)
+            except grpc.aio.AioRpcError as e:
+                # Events of a half-received batch are replayed on reconnecting
+                self._pending = []
+                if e.code() == grpc.StatusCode.OUT_OF_RANGE:
+                    # Fell behind the writer's history; copy everything again
+                    logger.warning('Replica fell behind the writer; resynchronizing')
+                    try:
+                        await self._resync()
+                        continue
+                    except grpc.aio.AioRpcError:
+                        logger.exception('Replica resync failed')
+                else:
+                    logger.warning('Lost the writer change stream (%s); reconnecting', e.code().name)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _apply(self, event):
+        if event.revision <= self.revision:
+            return  # Replayed after a reconnect
+        self._pending.append((KINDS[event.type], TaskRecord.from_proto(event.task)))
+        if not event.last_in_revision:
+            return
+        for kind, task in self._pending:
+            if kind == changefeed.DELETED:
+                if task.id in self._tasks:
+                    self._remove(task.id)
+            else:
+                self._insert(task)
+        changes, self._pending = self._pending, []
+        self._advance(event.revision, changes)
+
+    async def _forward(self, method, request):
+        call = method(request)
+        try:
+            response = await call
+        except grpc.aio.AioRpcError as e:
+            if e.code() == grpc.StatusCode.NOT_FOUND:
+                raise TaskNotFoundError(e.details()) from None
+            if e.code() == grpc.StatusCode.ABORTED:
+                raise VersionConflictError(e.details()) from None
+            if e.code() == grpc.StatusCode.ALREADY_EXISTS:
+                raise TaskExistsError(e.details()) from None
+            raise
+        for key, value in await call.trailing_metadata():
+            if key == REVISION_METADATA_KEY:
+                if not await self.wait_for(int(value), CATCH_UP_TIMEOUT):
+                    logger.warning('Replica did not reach revision %s in time', value)
+        return response
+
+    async def add(self, task):
+        response = await self._forward(self._writer.AddTask, task)
+        return TaskRecord.from_proto(response.task)
+
+    async def update(self, task_id, task, expected_version=0, paths=None):
+        response = await self._forward(self._writer.UpdateTask, update_request(task_id, task, expected_version, paths))
+        return TaskRecord.from_proto(response.task)
+
+    async def delete(self, task_id, expected_version=0):
+        await self._forward(
+            self._writer.DeleteTask, taskmanager_pb2.TaskRequest(taskId=task_id, expected_version=expected_version)
+        )
+
+    async def batch(self, operations):
+        """Forward runs of same-kind operations as Batch* calls; results as TaskStore.batch."""
+        results = []
+        start = 0
+        while start < len(operations):
+            op = operations[start][0]
+            end = start
+            while end < len(operations) and operations[end][0] == op:
+                end += 1
+            run = operations[start:end]
+            if op == 'add':
+                response = await self._forward(
+                    self._writer.BatchAddTasks, taskmanager_pb2.BatchAddTasksRequest(tasks=[task for _, task in run])
+                )
+            elif op == 'import':
+                request = taskmanager_pb2.BatchAddTasksRequest(tasks=[task for _, task in run])
+                response = await self._forward(self._writer.ImportTasks, iter([request]))
+            elif op == 'update':
+                requests = [update_request(*item[1:]) for item in run]
+                response = await self._forward(
+                    self._writer.BatchUpdateTasks, taskmanager_pb2.BatchUpdateTasksRequest(requests=requests)
+                )
+            else:
+                response = await self._forward(
+                    self._writer.BatchDeleteTasks,
+                    taskmanager_pb2.BatchDeleteTasksRequest(taskIds=[task_id for _, task_id in run])
+                )
+            for result in response.results:
+                if result.success:
+                    results.append(TaskRecord.from_proto(result.task))
+                elif result.code in BATCH_ERRORS:
+                    results.append(BATCH_ERRORS[result.code](result.message))
+                else:
+                    code = STATUS_CODES.get(result.code, grpc.StatusCode.UNKNOWN)
+                    results.append(BatchItemError(code, result.message))
+            start = end
+        return results
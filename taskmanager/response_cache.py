@@ -0,0 +1,113 @@
+"""Serialized responses for repeated reads.
+
+GetTask and ListTasks responses are cached as the bytes sent on the wire,
+so a hit skips both building the message and serializing it (the server
+registers serializers that pass bytes through, see server.add_servicer).
+Each entry records the tasks it depends on, or all of them for a
+listing; when the store publishes a change, exactly the entries that
+depend on a changed task are dropped. A cached response carries the
+revision it was built at, and its tasks are unchanged since. Entries are
+evicted least recently used first to stay within max_bytes.
+"""
+import collections
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Rough bookkeeping cost of an entry, counted against the budget
+ENTRY_OVERHEAD = 200
+
+
+class ResponseCache:
+    def __init__(self, changes, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # key -> (data, task_ids); task_ids None means every task
+        self._entries = collections.OrderedDict()
+        self._by_task = {}
+        self._whole = set()
+        changes.add_listener(self._invalidate)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The cached bytes for key, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, response, task_ids=None):
+        """Serialize response, cache it under key and return the bytes.
+
+        task_ids are the tasks the response depends on; None means all.
+        """
+        data = response.SerializeToString()
+        cost = len(data) + ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return data
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (data, task_ids)
+        self.size += cost
+        if task_ids is None:
+            self._whole.add(key)
+        else:
+            for task_id in task_ids:
+                self._by_task.setdefault(task_id, set()).add(key)
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+        return data
+
+    def clear(self):
+        self._entries.clear()
+        self._by_task.clear()
+        self._whole.clear()
+        self.size = 0
+
+    def _drop(self, key):
+        data, task_ids = self._entries.pop(key)
+        self.size -= len(data) + ENTRY_OVERHEAD
+        if task_ids is None:
+            self._whole.discard(key)
+            return
+        for task_id in task_ids:
+            keys = self._by_task.get(task_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_task[task_id]
+
+    def _invalidate(self, revision, changes):
+        if changes is None:
+            self.invalidations += len(self._entries)
+            self.clear()
+            return
+        stale = set(self._whole)
+        for _, task in changes:
+            stale.update(self._by_task.get(task.id, ()))
+        for key in stale:
+            self._drop(key)
+        self.invalidations += len(stale)
+
+    def render(self):
+        """Counters in the Prometheus text format, for serve_metrics()."""
+        lines = []
+        for name, kind, help_text, value in (
+                ('hits_total', 'counter', 'Responses served from the cache.', self.hits),
+                ('misses_total', 'counter', 'Cacheable requests not in the cache.', self.misses),
+                ('evictions_total', 'counter', 'Entries evicted to stay within the budget.', self.evictions),
+                ('invalidations_total', 'counter', 'Entries dropped because a task changed.', self.invalidations),
+                ('entries', 'gauge', 'Cached responses.', len(self._entries)),
+                ('bytes', 'gauge', 'Bytes counted against the budget.', self.size)):
+            lines.append(f'# HELP taskmanager_response_cache_{name} {help_text}')
+            lines.append(f'# TYPE taskmanager_response_cache_{name} {kind}')
+            lines.append(f'taskmanager_response_cache_{name} {value}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,408 @@
+"""Sharded TaskManager: a router in front of several servers.
+
+Run with: python -m taskmanager.router --shard 127.0.0.1:50061 --shard 127.0.0.1:50062
+          [--address 0.0.0.0:50051] [--metrics-address 127.0.0.1:9464]
+      or: python -m taskmanager.router --spawn 3 [--store-dir shards] [--shard-port 50061]
+
+Each task lives on one shard, a TaskManager server of its own, chosen by
+consistent hashing of the task id; adding a shard to the ring takes over
+only about 1/N of the ids (moving those tasks is not automated). The router
+serves the TaskManager service itself. It picks the id of a new task so it
+knows the owner, forwards single-task calls to the owner, splits batches by
+owner, and merges listings from every shard. Revisions are per shard, so
+merged listings carry revision 0 and always list in full, and WatchTasks is
+not available; GetTask with if_changed_since works as the owner's revision
+is what the client holds. --spawn starts N local `taskmanager.server`
+processes on consecutive ports, for running a sharded setup on one machine.
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import signal
+import subprocess
+import sys
+import uuid
+
+import grpc
+
+from taskmanager.client import channel_options
+from taskmanager.admission import AdmissionInterceptor
+from taskmanager.compression import ALGORITHMS, DEFAULT_MIN_BYTES, CompressionInterceptor
+from taskmanager.metrics import ServerMetricsInterceptor, serve_metrics
+from taskmanager.records import encode_created
+from taskmanager.server import (DEFAULT_ADDRESS, DEFAULT_METRICS_ADDRESS, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT,
+                                SERVER_OPTIONS, STREAM_CHUNK_SIZE, add_admission_arguments, add_compression_arguments,
+                                add_servicer, admission_options, encode_page_token)
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+# Points per shard on the ring; more spread ids more evenly
+DEFAULT_VIRTUAL_NODES = 160
+DEFAULT_SHARD_PORT = 50061
+SHARD_READY_TIMEOUT = 10.0
+SERVICE_PREFIX = '/taskmanager.TaskManager/'
+
+logger = logging.getLogger(__name__)
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hashing of task ids onto nodes."""
+
+    def __init__(self, nodes, virtual_nodes=DEFAULT_VIRTUAL_NODES):
+        points = sorted((ring_hash(f'{node}#{i}'), node) for node in nodes for i in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._hashes, ring_hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+
+def created_key(task):
+    # Same order as the shards' created index: unknown times sort first
+    created = encode_created(task.createdAt)
+    return created if created.__class__ is int else 0
+
+
+async def page_tasks(call):
+    async for page in call:
+        for task in page.tasks:
+            yield task
+
+
+async def merge_by_id(streams):
+    """Merge async iterators of tasks, each in id order, into id order."""
+    heads = await asyncio.gather(*(anext(stream, None) for stream in streams))
+    heap = [(task.id, index, task) for index, task in enumerate(heads) if task is not None]
+    heapq.heapify(heap)
+    while heap:
+        _, index, task = heap[0]
+        yield task
+        following = await anext(streams[index], None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following.id, index, following))
+
+
+def merge_batch_responses(groups, responses, offset=0):
+    """One BatchResponse from per-shard responses to the items at groups' indexes."""
+    merged = taskmanager_pb2.BatchResponse()
+    results = []
+    for indexes, response in zip(groups, responses):
+        merged.succeeded += response.succeeded
+        merged.failed += response.failed
+        for result in response.results:
+            result.index = indexes[result.index] + offset
+            results.append(result)
+    results.sort(key=lambda result: result.index)
+    merged.results.extend(results)
+    return merged
+
+
+class RouterServicer(taskmanager_pb2_grpc.TaskManagerServicer):
+    """TaskManager service over shards at targets; register it with add_servicer()."""
+
+    def __init__(self, targets, virtual_nodes=DEFAULT_VIRTUAL_NODES):
+        self.targets = list(targets)
+        self.ring = HashRing(self.targets, virtual_nodes)
+        self.channels = {target: grpc.aio.insecure_channel(target, options=channel_options())
+                         for target in self.targets}
+        self.stubs = {target: taskmanager_pb2_grpc.TaskManagerStub(channel)
+                      for target, channel in self.channels.items()}
+        # Single-task calls return the owner's response bytes untouched
+        self.forward = {
+            target: {
+                name: channel.unary_unary(SERVICE_PREFIX + name, request_serializer=request_type.SerializeToString)
+                for name, request_type in (('GetTask', taskmanager_pb2.TaskRequest),
+                                           ('AddTask', taskmanager_pb2.Task),
+                                           ('DeleteTask', taskmanager_pb2.TaskRequest),
+                                           ('UpdateTask', taskmanager_pb2.UpdateTaskRequest))
+            }
+            for target, channel in self.channels.items()
+        }
+
+    async def wait_for_shards(self, timeout=SHARD_READY_TIMEOUT):
+        """Wait until every shard is connected; returns the ones that are not."""
+        async def ready(target):
+            try:
+                await asyncio.wait_for(self.channels[target].channel_ready(), timeout)
+                return None
+            except asyncio.TimeoutError:
+                return target
+
+        return [target for target in await asyncio.gather(*map(ready, self.targets)) if target]
+
+    async def close(self):
+        for channel in self.channels.values():
+            await channel.close()
+
+    async def _call(self, context, call):
+        # Shard failures reach the client with the shard's status
+        try:
+            return await call
+        except grpc.aio.AioRpcError as e:
+            await context.abort(e.code(), e.details())
+
+    async def _forward(self, name, task_id, request, context):
+        method = self.forward[self.ring.node_for(task_id)][name]
+        return await self._call(context, method(request, timeout=context.time_remaining()))
+
+    async def GetTask(self, request, context):
+        return await self._forward('GetTask', request.taskId, request, context)
+
+    async def AddTask(self, request, context):
+        if not request.id:
+            request.id = str(uuid.uuid4())
+        return await self._forward('AddTask', request.id, request, context)
+
+    async def DeleteTask(self, request, context):
+        return await self._forward('DeleteTask', request.taskId, request, context)
+
+    async def UpdateTask(self, request, context):
+        return await self._forward('UpdateTask', request.taskId, request, context)
+
+    async def _merged(self, request, context):
+        """Tasks from StreamTasks on every shard for request, in id order."""
+        calls = [stub.StreamTasks(request, timeout=context.time_remaining()) for stub in self.stubs.values()]
+        try:
+            async for task in merge_by_id([page_tasks(call) for call in calls]):
+                yield task
+        except grpc.aio.AioRpcError as e:
+            await context.abort(e.code(), e.details())
+        finally:
+            for call in calls:
+                call.cancel()
+
+    async def ListTasks(self, request, context):
+        tasks = [task async for task in self._merged(taskmanager_pb2.ListTasksRequest(), context)]
+        return taskmanager_pb2.TaskList(tasks=tasks)
+
+    async def StreamTasks(self, request, context):
+        # Every shard pages by id after the same token, so the first
+        # page_size of the merge are the page; asking each shard for one
+        # more tells whether another page follows
+        shard_request = taskmanager_pb2.ListTasksRequest(
+            page_size=request.page_size + 1 if request.page_size else 0, page_token=request.page_token
+        )
+        paths = list(request.field_mask.paths)
+        strip_id = bool(paths) and 'id' not in paths
+        if paths:
+            # The merge orders by id, so shards must send it
+            shard_request.field_mask.paths.extend(paths + ['id'] if strip_id else paths)
+
+        remaining = request.page_size or None
+        page = taskmanager_pb2.TaskPage()
+        first = True
+        last_id = None
+        tasks = self._merged(shard_request, context)
+        try:
+            async for task in tasks:
+                if remaining == 0:
+                    page.next_page_token = encode_page_token(last_id)
+                    break
+                last_id = task.id
+                if strip_id:
+                    task.ClearField('id')
+                page.tasks.append(task)
+                if remaining is not None:
+                    remaining -= 1
+                if len(page.tasks) == STREAM_CHUNK_SIZE:
+                    yield page
+                    page = taskmanager_pb2.TaskPage()
+                    first = False
+        finally:
+            await tasks.aclose()
+        if page.tasks or page.next_page_token or first:
+            yield page
+
+    async def WatchTasks(self, request, context):
+        await context.abort(grpc.StatusCode.UNIMPLEMENTED, 'WatchTasks is not available through the sharding router')
+        yield
+
+    async def _fan_out(self, method, request, context):
+        return await asyncio.gather(*(
+            self._call(context, getattr(stub, method)(request, timeout=context.time_remaining()))
+            for stub in self.stubs.values()
+        ))
+
+    async def QueryTasks(self, request, context):
+        responses = await self._fan_out('QueryTasks', request, context)
+        tasks = heapq.merge(*(response.tasks for response in responses), key=created_key)
+        if request.limit:
+            tasks = itertools.islice(tasks, request.limit)
+        return taskmanager_pb2.TaskList(tasks=tasks)
+
+    async def SearchTasks(self, request, context):
+        # Shards don't send scores; interleaving their rankings puts each
+        # shard's best matches first
+        responses = await self._fan_out('SearchTasks', request, context)
+        ranked = (task for tasks in itertools.zip_longest(*(response.tasks for response in responses))
+                  for task in tasks if task is not None)
+        limit = min(request.limit or DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        return taskmanager_pb2.TaskList(tasks=itertools.islice(ranked, limit))
+
+    async def _scatter(self, items, key, send, context, offset=0):
+        """Send items to their owners with send(stub, items); merged BatchResponse."""
+        groups = {}
+        for index, item in enumerate(items):
+            groups.setdefault(self.ring.node_for(key(item)), []).append(index)
+        responses = await asyncio.gather(*(
+            self._call(context, send(self.stubs[target], [items[index] for index in indexes]))
+            for target, indexes in groups.items()
+        ))
+        return merge_batch_responses(groups.values(), responses, offset)
+
+    def _assign_ids(self, tasks):
+        for task in tasks:
+            if not task.id:
+                task.id = str(uuid.uuid4())
+        return tasks
+
+    async def BatchAddTasks(self, request, context):
+        timeout = context.time_remaining()
+        return await self._scatter(
+            self._assign_ids(request.tasks), lambda task: task.id,
+            lambda stub, tasks: stub.BatchAddTasks(taskmanager_pb2.BatchAddTasksRequest(tasks=tasks), timeout=timeout),
+            context
+        )
+
+    async def BatchUpdateTasks(self, request, context):
+        timeout = context.time_remaining()
+        return await self._scatter(
+            request.requests, lambda update: update.taskId,
+            lambda stub, requests: stub.BatchUpdateTasks(
+                taskmanager_pb2.BatchUpdateTasksRequest(requests=requests), timeout=timeout
+            ),
+            context
+        )
+
+    async def BatchDeleteTasks(self, request, context):
+        timeout = context.time_remaining()
+        return await self._scatter(
+            request.taskIds, lambda task_id: task_id,
+            lambda stub, task_ids: stub.BatchDeleteTasks(
+                taskmanager_pb2.BatchDeleteTasksRequest(taskIds=task_ids), timeout=timeout
+            ),
+            context
+        )
+
+    async def ImportTasks(self, request_iterator, context):
+        response = taskmanager_pb2.BatchResponse()
+        offset = 0
+        async for request in request_iterator:
+            # Each message goes to every owner as a one-message import, which
+            # reports failures only
+            chunk = await self._scatter(
+                self._assign_ids(request.tasks), lambda task: task.id,
+                lambda stub, tasks: stub.ImportTasks(iter([taskmanager_pb2.BatchAddTasksRequest(tasks=tasks)])),
+                context, offset
+            )
+            response.results.extend(chunk.results)
+            response.succeeded += chunk.succeeded
+            response.failed += chunk.failed
+            offset += len(request.tasks)
+        return response
+
+
+def spawn_shards(count, store_dir, base_port):
+    """Start count local servers; returns (processes, targets)."""
+    os.makedirs(store_dir, exist_ok=True)
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (root, env.get('PYTHONPATH'))))
+    processes = []
+    targets = []
+    for index in range(count):
+        target = f'127.0.0.1:{base_port + index}'
+        processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'taskmanager.server', '--address', target,
+             '--store', os.path.join(os.path.abspath(store_dir), f'shard-{index}.json'), '--metrics-address', ''],
+            env=env
+        ))
+        targets.append(target)
+    return processes, targets
+
+
+async def serve_router(targets, address=DEFAULT_ADDRESS, metrics_address=DEFAULT_METRICS_ADDRESS,
+                       compression=tuple(ALGORITHMS), compression_min_bytes=DEFAULT_MIN_BYTES, admission=None):
+    servicer = RouterServicer(targets)
+    missing = await servicer.wait_for_shards()
+    if missing:
+        logger.warning('Shard(s) not reachable yet: %s', ', '.join(missing))
+    metrics = ServerMetricsInterceptor()
+    sources = [metrics.metrics]
+    interceptors = [metrics]
+    if admission is not None:
+        limiter = AdmissionInterceptor(**admission)
+        interceptors.append(limiter)
+        sources.append(limiter)
+    interceptors.append(CompressionInterceptor(compression, compression_min_bytes))
+    server = grpc.aio.server(interceptors=interceptors, options=SERVER_OPTIONS)
+    add_servicer(servicer, server)
+    if not server.add_insecure_port(address):
+        raise RuntimeError(f'Failed to bind gRPC server to {address}')
+    await server.start()
+    logger.info('gRPC router running at %s over %d shard(s): %s', address, len(targets), ', '.join(targets))
+    metrics_server = None
+    if metrics_address:
+        host, _, metrics_port = metrics_address.rpartition(':')
+        metrics_server = await serve_metrics(sources, host, int(metrics_port))
+        logger.info('Metrics at http://%s/metrics', metrics_address)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await server.stop(grace=5)
+        await servicer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharding router for TaskManager gRPC servers')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help='host:port to listen on')
+    parser.add_argument('--shard', action='append', default=[], metavar='HOST:PORT',
+                        help='a shard server; repeat for each. The list, in any order, defines task placement')
+    parser.add_argument('--spawn', type=int, default=0, metavar='N', help='start N local shard servers')
+    parser.add_argument('--store-dir', default='shards', help='directory for the stores of spawned shards')
+    parser.add_argument('--shard-port', type=int, default=DEFAULT_SHARD_PORT,
+                        help='port of the first spawned shard; the others follow it')
+    parser.add_argument('--metrics-address', default=DEFAULT_METRICS_ADDRESS,
+                        help='host:port for the Prometheus /metrics endpoint; empty disables it')
+    add_compression_arguments(parser)
+    add_admission_arguments(parser)
+    args = parser.parse_args()
+    if bool(args.shard) == bool(args.spawn):
+        parser.error('give either --shard addresses or --spawn N')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    processes = []
+    targets = args.shard
+    if args.spawn:
+        processes, targets = spawn_shards(args.spawn, args.store_dir, args.shard_port)
+    try:
+        asyncio.run(serve_router(targets, args.address, args.metrics_address, args.compression,
+                                 args.compression_min_bytes, admission_options(args)))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
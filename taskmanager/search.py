@@ -0,0 +1,170 @@
+"""Inverted index for full-text search over task titles and descriptions."""
+import bisect
+import heapq
+import math
+import re
+
+TOKEN_RE = re.compile(r'\w+')
+TITLE_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+# Prefix matches score lower than whole-word matches
+PREFIX_PENALTY = 0.5
+# Cap on vocabulary terms a single query word may expand to, so very short
+# prefixes can't turn into a scan of the whole vocabulary
+MAX_PREFIX_TERMS = 64
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """Maps terms to the tasks containing them, weighted by field.
+
+    The vocabulary is also kept sorted so prefixes can be expanded with a
+    binary search. Each term's postings are additionally grouped by weight
+    (weights are small sums of field weights, so there are few groups),
+    which lets single-word queries take the top results in weight order
+    without scoring every task that contains a common word.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._impacts = {}
+        self._terms = []
+        self._doc_terms = {}
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def rebuild(self, tasks):
+        self._postings = {}
+        self._impacts = {}
+        self._doc_terms = {}
+        for task in tasks:
+            self._index(task)
+        self._terms = sorted(self._postings)
+
+    def _weights(self, task):
+        weights = {}
+        for term in tokenize(task.title):
+            weights[term] = weights.get(term, 0.0) + TITLE_WEIGHT
+        for term in tokenize(task.description):
+            weights[term] = weights.get(term, 0.0) + DESCRIPTION_WEIGHT
+        return weights
+
+    def _index(self, task):
+        new_terms = []
+        weights = self._weights(task)
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._impacts[term] = {}
+                new_terms.append(term)
+            postings[task.id] = weight
+            self._impacts[term].setdefault(weight, set()).add(task.id)
+        self._doc_terms[task.id] = tuple(weights)
+        return new_terms
+
+    def add(self, task):
+        for term in self._index(task):
+            bisect.insort(self._terms, term)
+
+    def remove(self, task_id):
+        for term in self._doc_terms.pop(task_id, ()):
+            postings = self._postings[term]
+            impacts = self._impacts[term]
+            weight = postings.pop(task_id)
+            impacts[weight].discard(task_id)
+            if not impacts[weight]:
+                del impacts[weight]
+            if not postings:
+                del self._postings[term]
+                del self._impacts[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def replace(self, old, new):
+        if old.title != new.title or old.description != new.description:
+            self.remove(old.id)
+            self.add(new)
+
+    def _expand(self, word):
+        """Yield (term, factor) for word itself and terms it prefixes."""
+        start = bisect.bisect_left(self._terms, word)
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(word):
+                break
+            yield term, 1.0 if term == word else PREFIX_PENALTY
+
+    def search(self, query, limit, accept=None):
+        """Return up to limit task ids matching every word in query, best first.
+
+        Each word matches whole terms and, at a lower score, terms it is a
+        prefix of. accept, if given, is a predicate on task ids.
+        """
+        total = len(self._doc_terms)
+        words = set(tokenize(query))
+        if len(words) == 1:
+            return self._search_word(words.pop(), total, limit, accept)
+
+        expansions = []
+        for word in words:
+            # (postings, idf * factor) for every term the word matches
+            matches = [(self._postings[term], math.log(1 + total / len(self._postings[term])) * factor)
+                       for term, factor in self._expand(word)]
+            if not matches:
+                return []
+            expansions.append(matches)
+        if not expansions:
+            return []
+
+        # Score the most selective word over its postings, then only look up
+        # those candidates in the other words' postings.
+        expansions.sort(key=lambda matches: sum(len(postings) for postings, _ in matches))
+        scores = {}
+        for postings, boost in expansions[0]:
+            for task_id, weight in postings.items():
+                score = weight * boost
+                if score > scores.get(task_id, 0.0):
+                    scores[task_id] = score
+        for matches in expansions[1:]:
+            narrowed = {}
+            for task_id, score in scores.items():
+                best = 0.0
+                for postings, boost in matches:
+                    weight = postings.get(task_id)
+                    if weight is not None and weight * boost > best:
+                        best = weight * boost
+                if best:
+                    narrowed[task_id] = score + best
+            scores = narrowed
+            if not scores:
+                return []
+
+        candidates = scores.items()
+        if accept is not None:
+            candidates = [(task_id, score) for task_id, score in candidates if accept(task_id)]
+        best = heapq.nlargest(limit, candidates, key=lambda item: item[1])
+        return [task_id for task_id, _ in best]
+
+    def _search_word(self, word, total, limit, accept):
+        # Walk weight groups from the highest score down; the first time a
+        # task is seen is its best score, so stop after limit tasks.
+        groups = []
+        for term, factor in self._expand(word):
+            boost = math.log(1 + total / len(self._postings[term])) * factor
+            groups.extend((weight * boost, task_ids) for weight, task_ids in self._impacts[term].items())
+        groups.sort(key=lambda group: group[0], reverse=True)
+        results = []
+        seen = set()
+        for _, task_ids in groups:
+            for task_id in task_ids:
+                if task_id in seen:
+                    continue
+                seen.add(task_id)
+                if accept is None or accept(task_id):
+                    results.append(task_id)
+                    if len(results) == limit:
+                        return results
+        return results
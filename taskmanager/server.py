@@ -0,0 +1,430 @@
+"""asyncio gRPC server for the TaskManager service.
+
+Run with: python -m taskmanager.server [--address 0.0.0.0:50051] [--store tasks.json]
+          [--metrics-address 127.0.0.1:9464] [--response-cache-mb 64]
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import logging
+import os
+
+import grpc
+
+from taskmanager import changefeed
+from taskmanager.admission import (DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_QUEUE, AdmissionInterceptor,
+                                   parse_method_limit)
+from taskmanager.compression import ALGORITHMS, DEFAULT_MIN_BYTES, CompressionInterceptor, parse_algorithms
+from taskmanager.metrics import ServerMetricsInterceptor, serve_metrics
+from taskmanager.response_cache import DEFAULT_MAX_BYTES, ResponseCache
+from taskmanager.store import (UPDATABLE_FIELDS, TaskExistsError, TaskNotFoundError, TaskStore,
+                               VersionConflictError)
+
+import taskmanager_pb2
+import taskmanager_pb2_grpc
+
+DEFAULT_ADDRESS = '0.0.0.0:50051'
+DEFAULT_METRICS_ADDRESS = '127.0.0.1:9464'
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tasks.json')
+# Tasks per StreamTasks message; keeps each message far below the 4 MB limit
+STREAM_CHUNK_SIZE = 200
+DEFAULT_SEARCH_LIMIT = 50
+UPDATE_MASK_ERROR = 'update_mask may only list ' + ', '.join(UPDATABLE_FIELDS)
+MAX_SEARCH_LIMIT = 1000
+# Accept keepalive pings from taskmanager.client, which sends them even
+# between calls, instead of closing the connection as abusive
+SERVER_OPTIONS = [
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.min_ping_interval_without_data_ms', 10000),
+]
+
+logger = logging.getLogger(__name__)
+
+
+def encode_page_token(task_id):
+    return base64.urlsafe_b64encode(task_id.encode('utf-8')).decode('ascii')
+
+
+def decode_page_token(token):
+    return base64.b64decode(token.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+
+
+# BatchResult.code of the store's failures; any other error carries its own
+# code attribute (a grpc.StatusCode), or is UNKNOWN
+BATCH_ERROR_CODES = {
+    TaskNotFoundError: grpc.StatusCode.NOT_FOUND,
+    VersionConflictError: grpc.StatusCode.ABORTED,
+    TaskExistsError: grpc.StatusCode.ALREADY_EXISTS,
+}
+
+
+def batch_response(results, offset=0, failures_only=False):
+    response = taskmanager_pb2.BatchResponse()
+    for index, result in enumerate(results, offset):
+        if isinstance(result, Exception):
+            response.failed += 1
+            code = BATCH_ERROR_CODES.get(type(result)) or getattr(result, 'code', grpc.StatusCode.UNKNOWN)
+            # str() of a KeyError is the quoted id
+            message = 'Task not found' if isinstance(result, TaskNotFoundError) else str(result)
+            response.results.add(index=index, success=False, code=code.value[0], message=message)
+        else:
+            response.succeeded += 1
+            if not failures_only:
+                response.results.add(index=index, success=True, task=result.to_proto())
+    return response
+
+
+EVENT_TYPES = {
+    changefeed.ADDED: taskmanager_pb2.TaskEvent.ADDED,
+    changefeed.UPDATED: taskmanager_pb2.TaskEvent.UPDATED,
+    changefeed.DELETED: taskmanager_pb2.TaskEvent.DELETED,
+}
+
+
+def masked_task(task, paths):
+    return taskmanager_pb2.Task(**{path: getattr(task, path) for path in paths})
+
+
+def to_protos(tasks, paths=None):
+    """Task messages for store records, with only the paths fields if given."""
+    if paths:
+        return [masked_task(task, paths) for task in tasks]
+    return [task.to_proto() for task in tasks]
+
+
+def delta_pages(changed, revision, paths):
+    """TaskPages carrying the changes in changed ({task_id: ChangeEvent})."""
+    if not changed:
+        yield taskmanager_pb2.TaskPage(revision=revision, not_modified=True)
+        return
+    events = list(changed.values())
+    for start in range(0, len(events), STREAM_CHUNK_SIZE):
+        page = taskmanager_pb2.TaskPage(revision=revision, delta=True)
+        for event in events[start:start + STREAM_CHUNK_SIZE]:
+            if event.kind == changefeed.DELETED:
+                page.deleted_ids.append(event.task.id)
+            else:
+                page.tasks.append(masked_task(event.task, paths) if paths else event.task.to_proto())
+        yield page
+
+
+def update_paths(request):
+    """The update_mask paths of an UpdateTaskRequest, or None if any is not updatable."""
+    paths = list(request.update_mask.paths)
+    if any(path not in UPDATABLE_FIELDS for path in paths):
+        return None
+    return paths
+
+
+def serialize_response(response):
+    # Responses from a ResponseCache are already serialized
+    return response if response.__class__ is bytes else response.SerializeToString()
+
+
+_HANDLER_FACTORIES = {
+    (False, False): grpc.unary_unary_rpc_method_handler,
+    (False, True): grpc.unary_stream_rpc_method_handler,
+    (True, False): grpc.stream_unary_rpc_method_handler,
+    (True, True): grpc.stream_stream_rpc_method_handler,
+}
+
+
+def add_servicer(servicer, server):
+    """Like add_TaskManagerServicer_to_server, but servicer methods may
+    return serialized bytes as well as messages."""
+    service = taskmanager_pb2.DESCRIPTOR.services_by_name['TaskManager']
+    handlers = {}
+    for method in service.methods:
+        factory = _HANDLER_FACTORIES[(method.client_streaming, method.server_streaming)]
+        handlers[method.name] = factory(
+            getattr(servicer, method.name),
+            request_deserializer=getattr(taskmanager_pb2, method.input_type.name).FromString,
+            response_serializer=serialize_response
+        )
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(service.full_name, handlers),))
+    server.add_registered_method_handlers(service.full_name, handlers)
+
+
+class TaskManagerServicer(taskmanager_pb2_grpc.TaskManagerServicer):
+    """Servicer over a store; register it with add_servicer().
+
+    With a ResponseCache, GetTask and ListTasks may return cached bytes.
+    """
+
+    # ImportTasks reports only the failed items
+    import_failures_only = True
+
+    def __init__(self, store, cache=None):
+        self.store = store
+        self.cache = cache
+
+    async def GetTask(self, request, context):
+        cacheable = self.cache is not None and not request.if_changed_since
+        if cacheable:
+            cached = self.cache.get(('GetTask', request.taskId))
+            if cached is not None:
+                return cached
+        try:
+            task = self.store.get(request.taskId)
+        except TaskNotFoundError:
+            await context.abort(grpc.StatusCode.NOT_FOUND, 'Task not found')
+        revision = self.store.committed_revision
+        if request.if_changed_since:
+            changed = self.changes_since(request.if_changed_since)
+            if changed is not None and request.taskId not in changed:
+                return taskmanager_pb2.TaskResponse(revision=revision, not_modified=True, message='Task not modified')
+        response = taskmanager_pb2.TaskResponse(task=task.to_proto(), revision=revision, message='Task found')
+        if cacheable:
+            return self.cache.put(('GetTask', request.taskId), response, task_ids=(request.taskId,))
+        return response
+
+    async def AddTask(self, request, context):
+        try:
+            task = await self.store.add(request)
+        except TaskExistsError as e:
+            await context.abort(grpc.StatusCode.ALREADY_EXISTS, str(e))
+        return taskmanager_pb2.TaskResponse(task=task.to_proto(), message='Task added successfully')
+
+    async def ListTasks(self, request, context):
+        if self.cache is not None:
+            cached = self.cache.get(('ListTasks',))
+            if cached is not None:
+                return cached
+        response = taskmanager_pb2.TaskList(tasks=to_protos(self.store.list()), revision=self.store.committed_revision)
+        if self.cache is not None:
+            return self.cache.put(('ListTasks',), response)
+        return response
+
+    async def DeleteTask(self, request, context):
+        try:
+            await self.store.delete(request.taskId, request.expected_version)
+        except TaskNotFoundError:
+            await context.abort(grpc.StatusCode.NOT_FOUND, 'Task not found')
+        except VersionConflictError as e:
+            await context.abort(grpc.StatusCode.ABORTED, str(e))
+        return taskmanager_pb2.DeleteResponse(success=True, message='Task deleted')
+
+    async def UpdateTask(self, request, context):
+        paths = update_paths(request)
+        if paths is None:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, UPDATE_MASK_ERROR)
+        try:
+            task = await self.store.update(request.taskId, request.task, request.expected_version, paths)
+        except TaskNotFoundError:
+            await context.abort(grpc.StatusCode.NOT_FOUND, 'Task not found')
+        except VersionConflictError as e:
+            await context.abort(grpc.StatusCode.ABORTED, str(e))
+        return taskmanager_pb2.TaskResponse(task=task.to_proto(), message='Task updated successfully')
+
+    async def StreamTasks(self, request, context):
+        try:
+            after_id = decode_page_token(request.page_token) if request.page_token else ''
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'Invalid page_token')
+        paths = list(request.field_mask.paths)
+        if paths and not request.field_mask.IsValidForDescriptor(taskmanager_pb2.Task.DESCRIPTOR):
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'Invalid field_mask')
+
+        if request.if_changed_since:
+            if request.page_size or request.page_token:
+                await context.abort(
+                    grpc.StatusCode.INVALID_ARGUMENT, 'if_changed_since cannot be combined with paging'
+                )
+            revision = self.store.committed_revision
+            changed = self.changes_since(request.if_changed_since)
+            if changed is not None:
+                for page in delta_pages(changed, revision, paths):
+                    yield page
+                return
+
+        remaining = request.page_size or None
+        first = True
+        while remaining is None or remaining > 0:
+            limit = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+            # Each chunk is read synchronously, so it is consistent even though
+            # the store may change between chunks.
+            tasks = self.store.page(after_id, limit)
+            if not tasks:
+                if first:
+                    yield taskmanager_pb2.TaskPage(revision=self.store.committed_revision)
+                return
+            first = False
+            after_id = tasks[-1].id
+            if remaining is not None:
+                remaining -= len(tasks)
+            page = taskmanager_pb2.TaskPage(tasks=to_protos(tasks, paths), revision=self.store.committed_revision)
+            if remaining == 0 and self.store.page(after_id, 1):
+                page.next_page_token = encode_page_token(after_id)
+            yield page
+
+    def changes_since(self, revision):
+        """Latest change event per task id after revision, or None if it is too old."""
+        try:
+            return self.store.changes.changes_since(revision)
+        except changefeed.RevisionUnavailableError:
+            return None
+
+    async def WatchTasks(self, request, context):
+        try:
+            watcher = self.store.changes.subscribe(request.since_revision)
+        except changefeed.RevisionUnavailableError:
+            await context.abort(
+                grpc.StatusCode.OUT_OF_RANGE,
+                f'Revision {request.since_revision} is no longer available; list tasks and watch again'
+            )
+        with watcher:
+            try:
+                async for event in watcher:
+                    yield taskmanager_pb2.TaskEvent(
+                        type=EVENT_TYPES[event.kind], task=event.task.to_proto(), revision=event.revision,
+                        last_in_revision=event.last
+                    )
+            except changefeed.WatcherOverflowError:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'Watcher fell too far behind')
+
+    async def QueryTasks(self, request, context):
+        try:
+            tasks = self.store.query(
+                status=request.status,
+                created_after=request.created_after,
+                created_before=request.created_before,
+                limit=request.limit or None
+            )
+        except ValueError:
+            await context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT, 'created_after and created_before must be ISO 8601 times'
+            )
+        return taskmanager_pb2.TaskList(tasks=to_protos(tasks), revision=self.store.committed_revision)
+
+    async def SearchTasks(self, request, context):
+        limit = min(request.limit or DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        tasks = self.store.search(request.query, limit, status=request.status)
+        return taskmanager_pb2.TaskList(tasks=to_protos(tasks), revision=self.store.committed_revision)
+
+    async def BatchAddTasks(self, request, context):
+        results = await self.store.batch([('add', task) for task in request.tasks])
+        return batch_response(results)
+
+    async def BatchUpdateTasks(self, request, context):
+        operations = []
+        for update in request.requests:
+            paths = update_paths(update)
+            if paths is None:
+                await context.abort(grpc.StatusCode.INVALID_ARGUMENT, UPDATE_MASK_ERROR)
+            operations.append(('update', update.taskId, update.task, update.expected_version, paths))
+        return batch_response(await self.store.batch(operations))
+
+    async def BatchDeleteTasks(self, request, context):
+        results = await self.store.batch([('delete', task_id) for task_id in request.taskIds])
+        return batch_response(results)
+
+    async def ImportTasks(self, request_iterator, context):
+        response = taskmanager_pb2.BatchResponse()
+        offset = 0
+        async for request in request_iterator:
+            results = await self.store.batch([('import', task) for task in request.tasks])
+            chunk = batch_response(results, offset, failures_only=self.import_failures_only)
+            response.results.extend(chunk.results)
+            response.succeeded += chunk.succeeded
+            response.failed += chunk.failed
+            offset += len(results)
+        return response
+
+
+async def create_server(store, address=DEFAULT_ADDRESS, interceptors=(), cache=None):
+    """Build a grpc.aio server for store; returns (server, bound_port)."""
+    server = grpc.aio.server(interceptors=list(interceptors), options=SERVER_OPTIONS)
+    add_servicer(TaskManagerServicer(store, cache), server)
+    port = server.add_insecure_port(address)
+    if not port:
+        raise RuntimeError(f'Failed to bind gRPC server to {address}')
+    return server, port
+
+
+async def serve(address=DEFAULT_ADDRESS, store_path=DEFAULT_STORE, metrics_address=DEFAULT_METRICS_ADDRESS,
+                cache_bytes=DEFAULT_MAX_BYTES, compression=tuple(ALGORITHMS), compression_min_bytes=DEFAULT_MIN_BYTES,
+                admission=None):
+    """Run the server until cancelled.
+
+    admission is a dict of AdmissionInterceptor arguments, or None to
+    accept every call.
+    """
+    store = TaskStore(store_path)
+    store.load()
+    metrics = ServerMetricsInterceptor()
+    cache = ResponseCache(store.changes, cache_bytes) if cache_bytes else None
+    sources = [metrics.metrics] if cache is None else [metrics.metrics, cache]
+    interceptors = [metrics]
+    if admission is not None:
+        limiter = AdmissionInterceptor(**admission)
+        interceptors.append(limiter)
+        sources.append(limiter)
+    interceptors.append(CompressionInterceptor(compression, compression_min_bytes))
+    server, port = await create_server(store, address, interceptors=interceptors, cache=cache)
+    await server.start()
+    logger.info('gRPC Server running at %s (%d task(s) loaded from %s)', address, len(store), store_path)
+    metrics_server = None
+    if metrics_address:
+        host, _, metrics_port = metrics_address.rpartition(':')
+        metrics_server = await serve_metrics(sources, host, int(metrics_port))
+        logger.info('Metrics at http://%s/metrics', metrics_address)
+    try:
+        await server.wait_for_termination()
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await server.stop(grace=5)
+        await store.close()
+
+
+def add_compression_arguments(parser):
+    parser.add_argument('--compression', type=parse_algorithms, default=tuple(ALGORITHMS), metavar='ALGORITHMS',
+                        help='response compression in order of preference, e.g. gzip,deflate, or none; '
+                             'used for clients that accept it')
+    parser.add_argument('--compression-min-bytes', type=int, default=DEFAULT_MIN_BYTES,
+                        help='responses smaller than this are sent uncompressed')
+
+
+def add_admission_arguments(parser):
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help='calls run at once before more are queued; 0 turns admission control off')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help='calls queued before more are rejected with RESOURCE_EXHAUSTED')
+    parser.add_argument('--method-limit', type=parse_method_limit, action='append', default=[],
+                        metavar='METHOD=LIMIT[:QUEUE]',
+                        help='a limit of its own for a method, e.g. ListTasks=4:32; LIMIT 0 removes the default one')
+    parser.add_argument('--fixed-limits', action='store_true',
+                        help="keep limits at their maximum instead of lowering them when latency rises")
+
+
+def admission_options(args):
+    """AdmissionInterceptor arguments from add_admission_arguments(), or None when it is off."""
+    if not args.max_concurrency:
+        return None
+    return {'max_concurrency': args.max_concurrency, 'max_queue': args.max_queue,
+            'method_limits': dict(args.method_limit), 'adaptive': not args.fixed_limits}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TaskManager gRPC server')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help='host:port to listen on')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='path to the tasks.json snapshot')
+    parser.add_argument('--metrics-address', default=DEFAULT_METRICS_ADDRESS,
+                        help='host:port for the Prometheus /metrics endpoint; empty disables it')
+    parser.add_argument('--response-cache-mb', type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help='memory budget for cached GetTask/ListTasks responses; 0 disables the cache')
+    add_compression_arguments(parser)
+    add_admission_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(serve(args.address, args.store, args.metrics_address, int(args.response_cache_mb * 2**20),
+                          args.compression, args.compression_min_bytes, admission_options(args)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,482 @@
+"""Task store persisted as a snapshot plus a journal.
+
+The snapshot is tasks.json, or a memory-mapped binary task file (see
+taskmanager.taskfile) when the store path ends in .db.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+import uuid
+
+from taskmanager.changefeed import ADDED, DELETED, UPDATED, ChangeFeed
+from taskmanager.indexes import TaskIndexes
+from taskmanager.journal import Journal, read_records
+from taskmanager.records import TaskRecord, encode_created, parse_timestamp
+from taskmanager.search import SearchIndex
+from taskmanager.taskfile import SUFFIX, TaskFile, TaskTable, write_task_file
+
+TASK_FIELDS = ('id', 'title', 'description', 'status', 'createdAt', 'version')
+DEFAULT_STATUS = 'Pending'
+# Fields an update may change
+UPDATABLE_FIELDS = ('title', 'description', 'status')
+# Compact once the journal grows past this many bytes (or past the size of
+# the last snapshot, whichever is larger, so compaction cost stays amortized
+# O(1) per write as the store grows).
+DEFAULT_COMPACT_BYTES = 16 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class TaskNotFoundError(KeyError):
+    pass
+
+
+class VersionConflictError(Exception):
+    """A conditional update or delete found the task at another version."""
+
+
+class TaskExistsError(Exception):
+    """An add named the id of a task that already exists."""
+
+
+class StoreFailedError(Exception):
+    """A journal write failed, so memory is ahead of disk; no more writes are accepted."""
+
+
+def now_ms():
+    return time.time_ns() // 1_000_000
+
+
+def task_from_dict(data):
+    # Tasks saved before versions existed start at 1
+    return TaskRecord.from_fields(*(str(data.get(name) or '') for name in TASK_FIELDS[:-1]),
+                                  version=int(data.get('version') or 1))
+
+
+def task_to_dict(task):
+    return {name: getattr(task, name) for name in TASK_FIELDS}
+
+
+def read_json_tasks(path):
+    """Read a tasks.json file (a map of id -> task) into a dict of id -> TaskRecord."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    tasks = {}
+    for task_id, entry in data.items():
+        task = task_from_dict(entry)
+        task.id = task.id or task_id
+        tasks[task.id] = task
+    return tasks
+
+
+def write_json_tasks(path, tasks):
+    """Atomically replace path with the given map of id -> task dict."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(tasks, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def journal_path_for(path):
+    base, extension = os.path.splitext(path)
+    # tasks.json and tasks.db side by side, as when converting, must not
+    # share a journal
+    if extension == SUFFIX:
+        return base + '.db.journal.jsonl'
+    return base + '.journal.jsonl'
+
+
+class TaskState:
+    """Tasks indexed by id, with the indexes behind the read RPCs.
+
+    Tasks are slotted TaskRecords, which callers convert to messages with
+    to_proto(). They are never mutated in place: updates store a new
+    record, so a reference handed out by get() or list() stays a
+    consistent snapshot.
+    A sorted list of ids backs paging in id order, TaskIndexes keeps
+    status and createdAt indexes for queries, and SearchIndex is the
+    inverted index behind full-text search. Each is built on first use
+    when _rebuild() is lazy, so a store that only serves point reads
+    never pays for them. Subclasses decide where changes come from and
+    publish them to changes (a ChangeFeed) in revision order.
+    """
+
+    def __init__(self):
+        self.revision = 0
+        self.changes = ChangeFeed()
+        self._tasks = {}
+        self._order = []
+        self._indexes = TaskIndexes()
+        self._search = SearchIndex()
+
+    def _rebuild(self, lazy=False):
+        """Rebuild every index from _tasks and restart the change history."""
+        self._order = self._indexes = self._search = None
+        if not lazy:
+            self._ordered()
+            self._task_indexes()
+            self._search_index()
+        self.changes.reset(self.revision)
+
+    # None means not built yet; _insert and _remove skip those
+
+    def _ordered(self):
+        if self._order is None:
+            self._order = sorted(self._tasks)
+        return self._order
+
+    def _task_indexes(self):
+        if self._indexes is None:
+            self._indexes = TaskIndexes()
+            self._indexes.rebuild(self._tasks.values())
+        return self._indexes
+
+    def _search_index(self):
+        if self._search is None:
+            self._search = SearchIndex()
+            self._search.rebuild(self._tasks.values())
+        return self._search
+
+    @property
+    def committed_revision(self):
+        """Revision of the newest published change; for TaskStore, also on disk."""
+        return self.changes.revision
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def get(self, task_id):
+        try:
+            return self._tasks[task_id]
+        except KeyError:
+            raise TaskNotFoundError(task_id) from None
+
+    def list(self):
+        return list(self._tasks.values())
+
+    def page(self, after_id='', limit=None):
+        """Return up to limit tasks with ids greater than after_id, in id order."""
+        order = self._ordered()
+        start = bisect.bisect_right(order, after_id)
+        end = len(order) if limit is None else start + limit
+        return [self._tasks[task_id] for task_id in order[start:end]]
+
+    def query(self, status='', created_after='', created_before='', limit=None):
+        """Tasks matching status and created_after <= createdAt < created_before.
+
+        Bounds are ISO 8601 times; an empty bound is open. Raises ValueError
+        for a bound that isn't a valid time.
+        """
+        task_ids = self._task_indexes().query(
+            status,
+            parse_timestamp(created_after) if created_after else None,
+            parse_timestamp(created_before) if created_before else None,
+            limit
+        )
+        return [self._tasks[task_id] for task_id in task_ids]
+
+    def search(self, query, limit, status=''):
+        """Tasks matching every word of query (as word or prefix), best first."""
+        accept = None
+        if status:
+            accept = lambda task_id: self._tasks[task_id].status == status
+        return [self._tasks[task_id] for task_id in self._search_index().search(query, limit, accept)]
+
+    def _insert(self, task):
+        current = self._tasks.get(task.id)
+        if current is None:
+            if self._order is not None:
+                bisect.insort(self._order, task.id)
+            if self._indexes is not None:
+                self._indexes.add(task)
+            if self._search is not None:
+                self._search.add(task)
+        else:
+            if self._indexes is not None:
+                self._indexes.replace(current, task)
+            if self._search is not None:
+                self._search.replace(current, task)
+        self._tasks[task.id] = task
+
+    def _remove(self, task_id):
+        task = self._tasks.pop(task_id)
+        if self._order is not None:
+            index = bisect.bisect_left(self._order, task_id)
+            del self._order[index]
+        if self._indexes is not None:
+            self._indexes.remove(task)
+        if self._search is not None:
+            self._search.remove(task_id)
+
+
+class TaskStore(TaskState):
+    """The task store, loaded once at startup and persisted.
+
+    Every mutation is applied in memory on the event loop and appended to
+    the journal; it returns once the journal record is fsynced. When the
+    journal grows large enough it is rotated and the state at that point is
+    written to the snapshot in the background. Startup loads the snapshot
+    and replays the journal over it.
+
+    With a binary snapshot (a path ending in .db), tasks stay in the
+    memory-mapped file and are decoded when read, only changes since the
+    snapshot are held in memory, and the indexes are built on first use.
+
+    Committed changes are published to changes (a ChangeFeed) in revision
+    order for WatchTasks.
+    """
+
+    def __init__(self, path, journal_path=None, compact_bytes=DEFAULT_COMPACT_BYTES):
+        super().__init__()
+        self.path = path
+        self.journal_path = journal_path or journal_path_for(path)
+        self.compacting_path = self.journal_path + '.compacting'
+        self.compact_bytes = compact_bytes
+        self.binary = path.endswith(SUFFIX)
+        self._journal = Journal(self.journal_path)
+        self._snapshot_bytes = 0
+        self._compact_task = None
+        # The first journal write error, after which mutations are refused
+        self._failure = None
+
+    def load(self, readonly=False):
+        """Load the snapshot and journal; readonly leaves the files untouched."""
+        if self.binary:
+            task_file = TaskFile(self.path) if os.path.exists(self.path) else None
+            self._tasks = TaskTable(task_file)
+            self.revision = task_file.revision if task_file is not None else 0
+        else:
+            self._tasks = read_json_tasks(self.path)
+        if os.path.exists(self.path):
+            self._snapshot_bytes = os.path.getsize(self.path)
+        # A leftover .compacting segment means a compaction was interrupted;
+        # its records predate the current journal. Replaying records that the
+        # snapshot already contains is harmless because they are full puts
+        # and deletes.
+        interrupted, _ = read_records(self.compacting_path)
+        records, valid_length = read_records(self.journal_path)
+        for record in interrupted + records:
+            self._apply_record(record)
+        self._rebuild(lazy=self.binary)
+        if readonly:
+            return
+        self._journal.open(valid_length)
+        if os.path.exists(self.compacting_path):
+            # As in _compact(), the checkpoint keeps the revision counter
+            # once the segment is gone; a JSON snapshot doesn't hold it
+            self._journal.write({'rev': self.revision, 'op': 'checkpoint'})
+            tasks = self._snapshot_tasks()
+            written = self._write_snapshot(tasks, self.revision)
+            self._snapshot_written(tasks, written)
+
+    def _apply_record(self, record):
+        self.revision = max(self.revision, record.get('rev', 0))
+        op = record['op']
+        if op == 'put':
+            task = task_from_dict(record['task'])
+            self._tasks[task.id] = task
+        elif op == 'patch':
+            # Values are absolute, so replaying a patch twice is harmless; the
+            # task is missing only if a later record in the replay deletes it
+            task = self._tasks.get(record['id'])
+            if task is not None:
+                self._tasks[task.id] = task.replace(version=record['version'], **record['set'])
+        elif op == 'delete':
+            self._tasks.pop(record['id'], None)
+        elif op == 'batch':
+            for sub_record in record['ops']:
+                self._apply_record(sub_record)
+
+    def _check_writable(self):
+        if self._failure is not None:
+            raise StoreFailedError(f'Journal write failed: {self._failure}')
+
+    async def add(self, task):
+        self._check_writable()
+        new_task, record = self._add(task)
+        await self._log(record, [(ADDED, new_task)])
+        return new_task
+
+    async def update(self, task_id, task, expected_version=0, paths=None):
+        self._check_writable()
+        updated, record = self._update(task_id, task, expected_version, paths)
+        await self._log(record, [(UPDATED, updated)])
+        return updated
+
+    async def delete(self, task_id, expected_version=0):
+        self._check_writable()
+        task, record = self._delete(task_id, expected_version)
+        await self._log(record, [(DELETED, task)])
+        return task
+
+    async def batch(self, operations):
+        """Apply many mutations as one journal record.
+
+        operations is a list of ('add', task), ('import', task), ('update',
+        task_id, task[, expected_version[, paths]]) or ('delete', task_id[,
+        expected_version]) tuples. An import is an add that keeps the
+        task's createdAt, if it has one. Returns one result per operation: the resulting task, or the
+        TaskNotFoundError, VersionConflictError or TaskExistsError that made
+        that item fail.
+        Failed items don't stop the rest of the batch.
+        """
+        self._check_writable()
+        results = []
+        records = []
+        changes = []
+        for op, *args in operations:
+            try:
+                task, record = self._mutations[op](self, *args)
+            except (TaskNotFoundError, VersionConflictError, TaskExistsError) as e:
+                results.append(e)
+            else:
+                results.append(task)
+                records.append(record)
+                changes.append((self._change_kinds[op], task))
+        if records:
+            await self._log({'op': 'batch', 'ops': records}, changes)
+        return results
+
+    # The helpers below change memory only and return the journal record
+    # describing the change; callers log it. They run on the event loop
+    # without awaiting, so each version check and its write are atomic
+    # with no locking.
+
+    def _add(self, task, created=0):
+        # Clients may choose the id, e.g. a sharding router that must know
+        # it to pick the shard; otherwise the server assigns one
+        if task.id and task.id in self._tasks:
+            raise TaskExistsError(f'Task {task.id} already exists')
+        new_task = TaskRecord(
+            id=task.id or str(uuid.uuid4()),
+            title=task.title,
+            description=task.description,
+            status=task.status or DEFAULT_STATUS,
+            created=created or now_ms()
+        )
+        self._insert(new_task)
+        return new_task, {'op': 'put', 'task': task_to_dict(new_task)}
+
+    def _import(self, task):
+        return self._add(task, encode_created(task.createdAt))
+
+    def _check_version(self, task, expected_version):
+        if expected_version and task.version != expected_version:
+            raise VersionConflictError(f'Task is at version {task.version}, not {expected_version}')
+
+    def _update(self, task_id, task, expected_version=0, paths=None):
+        """Set the paths fields of task, or without paths its non-empty ones.
+
+        Only fields whose value changes are journaled.
+        """
+        current = self.get(task_id)
+        self._check_version(current, expected_version)
+        if paths:
+            values = {name: getattr(task, name) for name in paths}
+        else:
+            # proto3 strings can't be unset, so an empty field means "keep"
+            values = {name: getattr(task, name) for name in UPDATABLE_FIELDS if getattr(task, name)}
+        changes = {name: value for name, value in values.items() if getattr(current, name) != value}
+        updated = current.replace(version=current.version + 1, **changes)
+        self._insert(updated)
+        return updated, {'op': 'patch', 'id': task_id, 'set': changes, 'version': updated.version}
+
+    def _delete(self, task_id, expected_version=0):
+        task = self.get(task_id)
+        self._check_version(task, expected_version)
+        self._remove(task_id)
+        return task, {'op': 'delete', 'id': task_id}
+
+    _mutations = {'add': _add, 'import': _import, 'update': _update, 'delete': _delete}
+    _change_kinds = {'add': ADDED, 'import': ADDED, 'update': UPDATED, 'delete': DELETED}
+
+    async def _log(self, record, changes):
+        self.revision += 1
+        revision = record['rev'] = self.revision
+        committed = self._journal.append(record)
+        # Published by the commit itself rather than by the caller, which may
+        # be cancelled (a deadline, a client going away) while the fsync runs.
+        # Journal futures resolve in append order and run their callbacks in
+        # that order, before any waiter resumes, so watchers see revisions in
+        # order and callers read their own writes.
+        committed.add_done_callback(lambda future: self._committed(future, revision, changes))
+        if (self._compact_task is None
+                and self._journal.size > max(self.compact_bytes, self._snapshot_bytes)):
+            self._compact_task = asyncio.create_task(self._compact())
+        # Shielded, so cancelling the caller doesn't cancel the commit
+        await asyncio.shield(committed)
+
+    def _committed(self, future, revision, changes):
+        if future.cancelled() or self._failure is not None:
+            return
+        error = future.exception()
+        if error is None:
+            self.changes.publish(revision, changes)
+        else:
+            # The change is in memory but not on disk and can't be unpicked
+            # from later ones; stop taking writes instead of letting memory,
+            # the journal and the change feed drift further apart
+            logger.error('Journal write failed at revision %d; refusing further writes: %s', revision, error)
+            self._failure = error
+
+    def _snapshot_dicts(self, tasks=None):
+        tasks = self._tasks if tasks is None else tasks
+        return {task_id: task_to_dict(task) for task_id, task in tasks.items()}
+
+    async def _compact(self):
+        try:
+            await self._journal.rotate(self.compacting_path)
+            # No mutation can run between the rotation and here, so the new
+            # journal starts exactly at this state. The checkpoint keeps the
+            # revision counter once the old segment is gone, and since task
+            # records are never mutated a shallow copy is a stable snapshot.
+            checkpoint = self._journal.append({'rev': self.revision, 'op': 'checkpoint'})
+            tasks = self._snapshot_tasks()
+            written = await asyncio.to_thread(self._write_snapshot, tasks, self.revision)
+            self._snapshot_written(tasks, written)
+            await checkpoint
+        except Exception:
+            logger.exception('Journal compaction failed')
+        finally:
+            self._compact_task = None
+
+    def _snapshot_tasks(self):
+        if self.binary:
+            return self._tasks.snapshot()
+        return dict(self._tasks)
+
+    def _write_snapshot(self, tasks, revision):
+        """Write the snapshot; a binary one is left aside for _snapshot_written to move into place."""
+        if self.binary:
+            return write_task_file(self.path, tasks.records(), revision, replace=False)
+        write_json_tasks(self.path, self._snapshot_dicts(tasks))
+        return self.path
+
+    def _snapshot_written(self, tasks, written):
+        if self.binary:
+            # Reads use the old file until here, but Windows can't replace it
+            # while it is mapped; nothing runs between closing it and the rebase
+            if self._tasks.file is not None:
+                self._tasks.file.close()
+            try:
+                os.replace(written, self.path)
+            except OSError:
+                if self._tasks.file is not None:
+                    self._tasks.file = TaskFile(self.path)
+                raise
+            # Read from the new file and drop the changes it now contains
+            self._tasks.rebase(TaskFile(self.path), tasks)
+        self._snapshot_bytes = os.path.getsize(self.path)
+        os.remove(self.compacting_path)
+
+    async def close(self):
+        if self._compact_task is not None:
+            await self._compact_task
+        await self._journal.close()
@@ -0,0 +1,246 @@
+"""Compact binary task snapshots, read through mmap.
+
+Layout (integers little-endian):
+
+    header   magic b'TMTASKS2', count u64, revision u64, index offset u64
+    records  count x (length u32, serialized taskmanager_pb2.Task)
+    index    count x (id u8[ID_WIDTH], record offset u64), sorted by id
+
+Index ids are UTF-8 padded with NUL bytes, or truncated to ID_WIDTH when
+longer; lookups then check the decoded record's id. Files with magic
+b'TMTASKS1' have 36-byte ids, which a UUID fills with no NUL left to show
+it is whole, so every lookup in them decodes the record; they are still
+read, and the next compaction rewrites them in the current layout. A TaskFile decodes
+only the records it is asked for, so opening one costs nothing per task.
+TaskStore uses this format for store paths ending in SUFFIX; see
+taskmanager.convert to convert to and from tasks.json.
+"""
+import bisect
+import collections.abc
+import mmap
+import os
+import struct
+
+from taskmanager.records import TaskRecord
+
+import taskmanager_pb2
+
+SUFFIX = '.db'
+MAGIC = b'TMTASKS2'
+HEADER = struct.Struct('<8sQQQ')
+LENGTH = struct.Struct('<I')
+OFFSET = struct.Struct('<Q')
+# Room for a UUID string plus the NUL that marks the key as the whole id
+ID_WIDTH = 37
+# Index id width by magic
+ID_WIDTHS = {MAGIC: ID_WIDTH, b'TMTASKS1': 36}
+
+
+class TaskFileError(Exception):
+    pass
+
+
+def index_key(task_id, width=ID_WIDTH):
+    return task_id.encode('utf-8')[:width].ljust(width, b'\0')
+
+
+def write_task_file(path, records, revision=0, replace=True):
+    """Atomically replace path with a task file.
+
+    records is an iterable of (task_id, serialized Task) pairs in any order.
+    With replace=False the file is left at the returned temporary path for
+    the caller to move once path is no longer mapped: Windows can't replace
+    a file that is.
+    """
+    tmp_path = path + '.tmp'
+    entries = []
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, 0))
+        offset = HEADER.size
+        for task_id, data in records:
+            entries.append((task_id, offset))
+            f.write(LENGTH.pack(len(data)))
+            f.write(data)
+            offset += LENGTH.size + len(data)
+        entries.sort()
+        for task_id, record_offset in entries:
+            f.write(index_key(task_id))
+            f.write(OFFSET.pack(record_offset))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(entries), revision, offset))
+        f.flush()
+        os.fsync(f.fileno())
+    if replace:
+        os.replace(tmp_path, path)
+    return tmp_path
+
+
+class _Keys(collections.abc.Sequence):
+    """The index ids as a sequence, for bisect."""
+
+    def __init__(self, task_file):
+        self._file = task_file
+
+    def __len__(self):
+        return self._file.count
+
+    def __getitem__(self, position):
+        start = self._file.index_offset + position * self._file.entry_size
+        return self._file._map[start:start + self._file.id_width]
+
+
+class TaskFile:
+    """A read-only, memory-mapped task file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise TaskFileError(f'{path} is not a task file')
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.revision, self.index_offset = HEADER.unpack_from(self._map)
+        self.id_width = ID_WIDTHS.get(magic, 0)
+        self.entry_size = self.id_width + OFFSET.size
+        if not self.id_width or self.index_offset + self.count * self.entry_size != size:
+            self._map.close()
+            raise TaskFileError(f'{path} is not a task file or is truncated')
+        self._keys = _Keys(self)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+    def _offset_at(self, position):
+        return OFFSET.unpack_from(self._map, self.index_offset + position * self.entry_size + self.id_width)[0]
+
+    def _record(self, offset):
+        (length,) = LENGTH.unpack_from(self._map, offset)
+        start = offset + LENGTH.size
+        return self._map[start:start + length]
+
+    def raw(self, task_id):
+        """The serialized task with task_id, or None."""
+        key = index_key(task_id, self.id_width)
+        position = bisect.bisect_left(self._keys, key)
+        while position < self.count and self._keys[position] == key:
+            data = self._record(self._offset_at(position))
+            if key[-1] == 0:
+                return data  # The key holds the whole id
+            if taskmanager_pb2.Task.FromString(data).id == task_id:
+                return data
+            position += 1
+        return None
+
+    def get(self, task_id):
+        """The TaskRecord with task_id, or None."""
+        data = self.raw(task_id)
+        return None if data is None else TaskRecord.from_proto(taskmanager_pb2.Task.FromString(data))
+
+    def _id_at(self, position):
+        key = self._keys[position]
+        if key[-1] == 0:
+            return key.rstrip(b'\0').decode('utf-8')
+        return taskmanager_pb2.Task.FromString(self._record(self._offset_at(position))).id
+
+    def ids(self):
+        """All ids, in id order."""
+        for position in range(self.count):
+            yield self._id_at(position)
+
+    def records(self):
+        """(task_id, serialized Task) for every task, in id order."""
+        for position in range(self.count):
+            yield self._id_at(position), self._record(self._offset_at(position))
+
+
+class TaskTable(collections.abc.MutableMapping):
+    """Mapping of id -> TaskRecord over a TaskFile plus in-memory changes.
+
+    Tasks in the file are decoded on each access and never held; tasks
+    added or replaced since the file was written live in a dict, and
+    deleted ids are remembered in a set until a rebase onto a file without
+    them.
+    """
+
+    def __init__(self, task_file=None):
+        self.file = task_file
+        self._changed = {}
+        self._deleted = set()
+        self._count = task_file.count if task_file is not None else 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, task_id):
+        if task_id in self._changed:
+            return True
+        return (self.file is not None and task_id not in self._deleted
+                and self.file.raw(task_id) is not None)
+
+    def __getitem__(self, task_id):
+        task = self._changed.get(task_id)
+        if task is not None:
+            return task
+        if self.file is None or task_id in self._deleted:
+            raise KeyError(task_id)
+        task = self.file.get(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def __setitem__(self, task_id, task):
+        if task_id not in self:
+            self._count += 1
+        self._changed[task_id] = task
+        self._deleted.discard(task_id)
+
+    def __delitem__(self, task_id):
+        if task_id not in self:
+            raise KeyError(task_id)
+        self._count -= 1
+        self._changed.pop(task_id, None)
+        # Recorded even when the current file lacks the id: a snapshot being
+        # written may hold it, and rebase() drops what the new file lacks
+        self._deleted.add(task_id)
+
+    def __iter__(self):
+        # File ids come out in id order, so sorting the result is cheap
+        if self.file is not None:
+            for task_id in self.file.ids():
+                if task_id not in self._deleted and task_id not in self._changed:
+                    yield task_id
+        yield from list(self._changed)
+
+    def snapshot(self):
+        """A frozen copy, cheap because the file part is shared."""
+        copy = TaskTable(self.file)
+        copy._changed = dict(self._changed)
+        copy._deleted = set(self._deleted)
+        copy._count = self._count
+        return copy
+
+    def records(self):
+        """(task_id, serialized Task) for every task, without decoding file records."""
+        if self.file is not None:
+            for task_id, data in self.file.records():
+                if task_id not in self._deleted and task_id not in self._changed:
+                    yield task_id, data
+        for task_id, task in self._changed.items():
+            yield task_id, task.to_proto().SerializeToString()
+
+    def rebase(self, task_file, snapshot):
+        """Switch to task_file, which holds the state of snapshot.
+
+        Changes made after snapshot was taken are kept in memory; tasks are
+        never mutated in place, so an unchanged entry is the same object.
+        The previous file is closed.
+        """
+        self._changed = {task_id: task for task_id, task in self._changed.items()
+                         if snapshot._changed.get(task_id) is not task}
+        self._deleted = {task_id for task_id in self._deleted if task_file.raw(task_id) is not None}
+        if self.file is not None and self.file is not task_file:
+            self.file.close()
+        self.file = task_file
@@ -0,0 +1,214 @@
+"""Virtualized task list for the Tk client.
+
+TaskListModel keeps every task as a compact tuple; VirtualTreeview shows it
+through a ttk.Treeview that only ever holds enough items to fill the visible
+area. Scrolling rewrites the values of those few items instead of creating
+one widget item per task.
+"""
+import tkinter as tk
+
+# Extra rows rendered below the visible area, so a partly visible last row
+# and small resizes don't leave gaps
+BUFFER_ROWS = 2
+
+
+class TaskListModel:
+    """Tasks as (id, title, description, status) tuples in display order.
+
+    The view is either every task, in load order, filtered by an optional
+    predicate on rows, or an explicit ordered list of ids (search results).
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._predicate = None
+        self._view_ids = None
+        self._visible = []
+        self._dirty = False
+
+    def __len__(self):
+        self._refresh()
+        return len(self._visible)
+
+    @property
+    def total(self):
+        return len(self._rows)
+
+    def row(self, index):
+        self._refresh()
+        return self._rows[self._visible[index]]
+
+    def get(self, task_id):
+        return self._rows.get(task_id)
+
+    def index_of(self, task_id):
+        self._refresh()
+        try:
+            return self._visible.index(task_id)
+        except ValueError:
+            return None
+
+    def replace_all(self, tasks):
+        self._rows = {task.id: (task.id, task.title, task.description, task.status) for task in tasks}
+        self._dirty = True
+
+    def extend(self, tasks):
+        for task in tasks:
+            self._rows[task.id] = (task.id, task.title, task.description, task.status)
+        self._dirty = True
+
+    def upsert(self, task):
+        self._rows[task.id] = (task.id, task.title, task.description, task.status)
+        self._dirty = True
+
+    def remove(self, task_id):
+        if self._rows.pop(task_id, None) is not None:
+            self._dirty = True
+
+    def set_filter(self, predicate=None, ids=None):
+        """Show rows matching predicate, or exactly ids in that order."""
+        self._predicate = predicate
+        self._view_ids = ids
+        self._dirty = True
+
+    def _refresh(self):
+        if not self._dirty:
+            return
+        if self._view_ids is not None:
+            visible = [task_id for task_id in self._view_ids if task_id in self._rows]
+        else:
+            visible = list(self._rows)
+        if self._predicate is not None:
+            visible = [task_id for task_id in visible if self._predicate(self._rows[task_id])]
+        self._visible = visible
+        self._dirty = False
+
+
+class VirtualTreeview:
+    """Renders a TaskListModel through a fixed pool of Treeview items.
+
+    tree must have show="headings" and the (ID, Title, Description, Status)
+    columns; yscrollbar is driven by this class instead of the Treeview.
+    tags_for(row) returns the tags for a row, and on_select(row) is called
+    when the user selects a different task. Selection follows the task, not
+    the pool item, so re-rendering never reports a new selection.
+    """
+
+    def __init__(self, tree, yscrollbar, model, tags_for=lambda row: (), on_select=None, row_height=30):
+        self.tree = tree
+        self.yscrollbar = yscrollbar
+        self.model = model
+        self.tags_for = tags_for
+        self.on_select = on_select
+        self.row_height = row_height
+        self.top = 0
+        self.selected_id = None
+        self._pool = []
+        self._pool_ids = {}
+
+        yscrollbar.config(command=self._on_scrollbar)
+        tree.bind("<Configure>", lambda e: self.render())
+        tree.bind("<MouseWheel>", self._on_mousewheel)
+        tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        tree.bind("<Button-5>", lambda e: self.scroll(3))
+        tree.bind("<Up>", lambda e: self._move_selection(-1))
+        tree.bind("<Down>", lambda e: self._move_selection(1))
+        tree.bind("<Prior>", lambda e: self.scroll(-self.page_size))
+        tree.bind("<Next>", lambda e: self.scroll(self.page_size))
+        tree.bind("<<TreeviewSelect>>", self._on_select)
+
+    @property
+    def page_size(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            # Not mapped yet; use the requested height in rows
+            return max(1, int(self.tree.cget("height")))
+        # Leave room for the heading row
+        return max(1, height // self.row_height - 1)
+
+    def selected_row(self):
+        return self.model.get(self.selected_id) if self.selected_id else None
+
+    def scroll(self, rows):
+        self.top += rows
+        self.render()
+        return "break"
+
+    def see(self, task_id):
+        index = self.model.index_of(task_id)
+        if index is not None and not self.top <= index < self.top + self.page_size:
+            self.top = index
+            self.render()
+
+    def render(self):
+        total = len(self.model)
+        page = self.page_size
+        self.top = max(0, min(self.top, total - page))
+        wanted = page + BUFFER_ROWS
+
+        # Grow or shrink the item pool to fit the visible area
+        while len(self._pool) < wanted:
+            self._pool.append(self.tree.insert("", tk.END))
+        while len(self._pool) > wanted:
+            self.tree.delete(self._pool.pop())
+
+        self._pool_ids = {}
+        selected_item = None
+        for offset, item in enumerate(self._pool):
+            index = self.top + offset
+            if index < total:
+                row = self.model.row(index)
+                self.tree.item(item, values=row, tags=self.tags_for(row))
+                self.tree.reattach(item, "", offset)
+                self._pool_ids[item] = row[0]
+                if row[0] == self.selected_id:
+                    selected_item = item
+            else:
+                self.tree.detach(item)
+
+        if selected_item is not None:
+            if self.tree.selection() != (selected_item,):
+                self.tree.selection_set(selected_item)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        if total:
+            self.yscrollbar.set(self.top / total, min(1.0, (self.top + page) / total))
+        else:
+            self.yscrollbar.set(0.0, 1.0)
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if not selection or selection[0] not in self._pool_ids:
+            return
+        task_id = self._pool_ids[selection[0]]
+        if task_id != self.selected_id:
+            self.selected_id = task_id
+            if self.on_select is not None:
+                self.on_select(self.model.get(task_id))
+
+    def _on_scrollbar(self, action, value, unit=None):
+        total = len(self.model)
+        if action == "moveto":
+            self.top = int(float(value) * total)
+        elif unit == "pages":
+            self.top += int(value) * self.page_size
+        else:
+            self.top += int(value)
+        self.render()
+
+    def _on_mousewheel(self, event):
+        # Windows/macOS report multiples of 120 per notch
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def _move_selection(self, step):
+        if not len(self.model):
+            return "break"
+        index = self.model.index_of(self.selected_id) if self.selected_id else None
+        index = 0 if index is None else max(0, min(len(self.model) - 1, index + step))
+        self.selected_id = self.model.row(index)[0]
+        self.see(self.selected_id)
+        self.render()
+        if self.on_select is not None:
+            self.on_select(self.model.get(self.selected_id))
+        return "break"